@@ -1,164 +1,127 @@
-from flask import Flask, render_template, jsonify
-import requests
+from flask import Flask, render_template, jsonify, Response, stream_with_context, request, g
 import time
-import yfinance as yf
+import json
+import asyncio
 import datetime
+from array import array
+from collector import Collector, background_enabled
+import shared_snapshots
+from fanout import fetch_pool
+import upstream
+import async_upstream
+from breaker import CircuitOpen
+import sina_parser
+from orderbook import DepthStream, stream_enabled, aggregate
+from stream import StreamClient, StreamSlots, DepthDeltas, sse
+from history_store import HistoryStore, COLUMNS as HISTORY_COLUMNS, RESOLUTIONS, RETENTION, date_to_ts, ts_to_date
+from registry import Registry, batches
+from binance_quotes import QuoteEngine
+from stablecoins import StablecoinFeed
+from liquidations import LiquidationStore, LiquidationStream, SIMULATION, stream_enabled as liquidation_stream_enabled
+import cache
+import news
+import metrics
 
 app = Flask(__name__)
+collector = Collector(background=background_enabled(), shared=shared_snapshots.from_env())
+depth_stream = DepthStream()
+history_store = HistoryStore()
+stablecoin_feed = StablecoinFeed()
+liquidation_store = LiquidationStore()
+news_store = news.NewsStore()
+liquidation_stream = LiquidationStream(liquidation_store)
 
-# Mapping from internal code to display name
-ASSET_NAMES = {
-    'hf_GC': '黄金 (Gold)',
-    'hf_SI': '白银 (Silver)',
-    'fx_susdcny': '美元/人民币 (USD/CNY)',
-    'BTCUSDT': '比特币 (BTC)',
-    'ETHUSDT': '以太坊 (ETH)',
-    'hk03690': '美团 (Meituan)',
-    'hk01024': '快手 (Kuaishou)',
-    'sh600519': '茅台 (Moutai)',
-    'sh688775': '影石创新 (Insta360)',
-    'gb_crcl': 'Circle (CRCL)',
-    'liberty-cats': 'Liberty Cats NFT'
-}
+# /metrics (see also upstream.py and collector.py)
+route_seconds = metrics.histogram('http_request_seconds', 'Time to produce each response, by route', ['route', 'method', 'status'])
+history_seconds = metrics.histogram('history_provider_seconds', 'Duration of history downloads, by provider', ['provider'])
+history_errors = metrics.counter('history_provider_errors_total', 'Failed history downloads, by provider', ['provider'])
+fallbacks = metrics.counter('fallback_responses_total', 'Results built from fallback or simulated data instead of an upstream', ['source', 'kind'])
+source_age = metrics.gauge('collector_source_age_seconds', 'Age of the value each source is serving', ['source'])
+source_stale = metrics.gauge('collector_source_stale', '1 while a source serves its last good value after a failed refresh', ['source'])
+breaker_state = metrics.gauge('upstream_circuit_state', 'Circuit breaker state per host: 0 closed, 1 half open, 2 open', ['host'])
 
-# Mapping from internal code to yfinance ticker
-YFINANCE_MAPPING = {
-    'hf_GC': 'GC=F',
-    'hf_SI': 'SI=F',
-    'fx_susdcny': 'CNY=X',
-    'BTCUSDT': 'BTC-USD',
-    'ETHUSDT': 'ETH-USD',
-    'hk03690': '3690.HK',
-    'hk01024': '1024.HK',
-    'sh600519': '600519.SS',
-    'sh688775': '688775.SS',
-    'gb_crcl': 'CRCL'
-    # Liberty Cats has no yfinance ticker
-}
+# Watched symbols (display name, quote source, currency suffix, history
+# provider, ...) live in symbols.json
+symbols = Registry.load()
+crypto_quotes = QuoteEngine(symbols.aliases('binance'))
+
+# hq.sinajs.cn takes a comma-separated list; keep each request's code list
+# within these limits and run at most SINA_MAX_PARALLEL requests at once
+SINA_BATCH_SIZE = 200
+SINA_MAX_URL_CHARS = 4000
+SINA_MAX_PARALLEL = 8
 
 def fetch_sina_data():
-    # Sina Finance API
-    # Stocks: sh600519 (Moutai), sh688775 (Insta360), hk03690 (Meituan), hk01024 (Kuaishou)
-    # US Stocks: gb_crcl (Circle)
-    # Futures: hf_GC (Gold), hf_SI (Silver)
-    # Forex: fx_susdcny (USD/CNY)
-    
-    codes = "sh600519,sh688775,hk03690,hk01024,hf_GC,hf_SI,fx_susdcny,gb_crcl"
-    url = f"http://hq.sinajs.cn/list={codes}"
-    headers = {"Referer": "https://finance.sina.com.cn/"}
-    
+    # Sina Finance API: A-shares (sh/sz), HK (hk), US (gb_), futures (hf_), forex (fx_)
+    # The watchlist is split into batches that are fetched in parallel.
+    shards = list(batches(symbols.codes('sina'), SINA_BATCH_SIZE, SINA_MAX_URL_CHARS))
     results = {}
-    try:
-        response = requests.get(url, headers=headers, timeout=5)
-        if response.status_code == 200:
-            # Decode using GBK/GB18030
-            content = response.content.decode('gb18030')
-            lines = content.strip().split('\n')
-            
-            for line in lines:
-                if not line: continue
-                parts = line.split('=')
-                if len(parts) < 2: continue
-                
-                code = parts[0].split('_')[-1] # e.g. var hq_str_sh600519 -> sh600519
-                # Handle special case for hf_GC, fx_susdcny where code might be parsed differently
-                if 'hf_GC' in parts[0]: code = 'hf_GC'
-                elif 'hf_SI' in parts[0]: code = 'hf_SI'
-                elif 'fx_susdcny' in parts[0]: code = 'fx_susdcny'
-                elif 'sh688775' in parts[0]: code = 'sh688775'
-                elif 'sh600519' in parts[0]: code = 'sh600519'
-                elif 'hk03690' in parts[0]: code = 'hk03690'
-                elif 'hk01024' in parts[0]: code = 'hk01024'
-                elif 'gb_crcl' in parts[0]: code = 'gb_crcl'
-
-                data_str = parts[1].strip('";')
-                data_parts = data_str.split(',')
-                
-                # Parse based on type
-                if code in ['sh600519', 'sh688775']: # A-Share
-                    # index 3: current price, index 2: prev close
-                    if len(data_parts) > 3:
-                        price = float(data_parts[3])
-                        prev_close = float(data_parts[2])
-                        results[code] = {'price': price, 'prev_close': prev_close}
-                elif code in ['hk03690', 'hk01024']: # HK Share
-                    # index 6: current price, index 3: prev close
-                    if len(data_parts) > 6:
-                        price = float(data_parts[6])
-                        prev_close = float(data_parts[3])
-                        results[code] = {'price': price, 'prev_close': prev_close}
-                elif code == 'gb_crcl': # US Share
-                    # index 1: current price, index 26: prev close (need to verify)
-                    # US stock format: name, price, change, pct, date, time, ..., prev_close, ...
-                    # Actually index 1 is price, index 26 is prev close usually.
-                    # Let's verify US stock format with curl later if needed, but standard is:
-                    # var hq_str_gb_aapl="Apple Inc.,180.00,..."
-                    # index 1 is price, index 26 is prev close.
-                    if len(data_parts) > 26:
-                        price = float(data_parts[1])
-                        prev_close = float(data_parts[26])
-                        results[code] = {'price': price, 'prev_close': prev_close}
-                elif code in ['hf_GC', 'hf_SI']: # Futures
-                    # index 0: current price, index 7: prev close (sometimes index 7 is prev close, need verify)
-                    # hf_GC="4454.9, , 4456.3, 4456.6, ..."
-                    # Let's assume index 0 is price. Change calculation might be tricky if prev_close not clear.
-                    # Usually index 7 is Yesterday Close.
-                    if len(data_parts) > 0:
-                        price = float(data_parts[0])
-                        prev_close = float(data_parts[7]) if len(data_parts) > 7 and data_parts[7] else price
-                        results[code] = {'price': price, 'prev_close': prev_close}
-                elif code == 'fx_susdcny': # Forex
-                    # 22:52:54, 6.9932, 6.9950, ...
-                    # index 1: Bid? index 2: Ask? index 3: Last?
-                    # Let's use index 1 as price.
-                    if len(data_parts) > 1:
-                        price = float(data_parts[1])
-                        prev_close = float(data_parts[3]) if len(data_parts) > 3 else price # Just a guess for prev_close
-                        results[code] = {'price': price, 'prev_close': prev_close}
+    for start in range(0, len(shards), SINA_MAX_PARALLEL):
+        group = shards[start:start + SINA_MAX_PARALLEL]
+        jobs = {f"sina:{start + i}": (lambda codes=codes: fetch_sina_batch(codes), 4) for i, codes in enumerate(group)}
+        for result in fetch_pool.run(jobs).values():
+            if result.status == 'ok':
+                results.update(result.data)
+            else:
+                print(f"Error fetching Sina batch {result.name}: {result.error or result.status}")
+    return results
 
+def fetch_sina_batch(codes):
+    try:
+        return sina_batch_quotes(upstream.get(*sina_batch_request(codes)))
     except Exception as e:
         print(f"Error fetching Sina data: {e}")
-        
+        return {}
+
+def sina_batch_request(codes):
+    url = f"http://hq.sinajs.cn/list={','.join(codes)}"
+    headers = {"Referer": "https://finance.sina.com.cn/"}
+    return url, None, headers
+
+def sina_batch_quotes(response):
+    results = {}
+    if response.status_code == 200:
+        # Field positions per market live in sina_parser.SCHEMAS
+        for code, quote in sina_parser.parse(response.content).items():
+            results[code] = {'price': quote.price, 'prev_close': quote.prev_close}
     return results
 
-def fetch_crypto_data():
-    # Binance API
-    # BTCUSDT, ETHUSDT, POLUSDT
+# Async variants of the frequently refreshed sources, awaited by the collector
+# when it runs on the ASGI server's event loop (asgi.py); the other sources run
+# their sync fetch on a worker thread there.
+
+async def afetch_sina_data():
+    shards = list(batches(symbols.codes('sina'), SINA_BATCH_SIZE, SINA_MAX_URL_CHARS))
+    limit = asyncio.Semaphore(SINA_MAX_PARALLEL)
+    async def batch(codes):
+        async with limit:
+            try:
+                return sina_batch_quotes(await asyncio.wait_for(async_upstream.get(*sina_batch_request(codes)), 4))
+            except Exception as e:
+                print(f"Error fetching Sina batch: {e or type(e).__name__}")
+                return {}
     results = {}
+    for quotes in await asyncio.gather(*[batch(codes) for codes in shards]):
+        results.update(quotes)
+    return results
+
+def fetch_crypto_data():
+    # Binance API: every 'binance' symbol in the registry (POLUSDT is hidden,
+    # it only converts the NFT floor price). Price and 24h stats for all of
+    # them come from one batched ticker request; renamed symbols (POL, formerly
+    # MATIC) are resolved through the registry's aliases.
     try:
-        symbols = ["BTCUSDT", "ETHUSDT", "POLUSDT"]
-        for symbol in symbols:
-            url = f"https://api.binance.com/api/v3/ticker/price?symbol={symbol}"
-            # Also get 24h stats for change
-            stats_url = f"https://api.binance.com/api/v3/ticker/24hr?symbol={symbol}"
-            
-            # Fetch price
-            r = requests.get(url, timeout=5)
-            if r.status_code == 200:
-                price = float(r.json()['price'])
-                
-                # Fetch stats for prev close (or open price of 24h)
-                r_stats = requests.get(stats_url, timeout=5)
-                prev_close = price # Default
-                if r_stats.status_code == 200:
-                    prev_close = float(r_stats.json()['prevClosePrice'])
-                
-                results[symbol] = {'price': price, 'prev_close': prev_close}
-            else:
-                print(f"Binance error {symbol}: {r.status_code}")
-                # Fallback for POLUSDT if not found (e.g. if ticker is MATICUSDT)
-                if symbol == "POLUSDT":
-                     # Try MATICUSDT
-                     url = f"https://api.binance.com/api/v3/ticker/price?symbol=MATICUSDT"
-                     r = requests.get(url, timeout=5)
-                     if r.status_code == 200:
-                         price = float(r.json()['price'])
-                         results[symbol] = {'price': price, 'prev_close': price} # Simplified
-                         
+        return crypto_quotes.fetch(symbols.codes('binance'))
     except Exception as e:
         print(f"Error fetching Crypto data: {e}")
-        
-    return results
+        return {}
+
+async def afetch_crypto_data():
+    try:
+        return await crypto_quotes.afetch(symbols.codes('binance'))
+    except Exception as e:
+        print(f"Error fetching Crypto data: {e}")
+        return {}
 
 def fetch_nft_data():
     # Liberty Cats on Polygon
@@ -177,7 +140,7 @@ def fetch_nft_data():
         headers = {
             "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
         }
-        r = requests.get(url, headers=headers, timeout=5)
+        r = upstream.get(url, headers=headers)
         
         if r.status_code == 200:
             data = r.json()
@@ -201,166 +164,161 @@ def fetch_nft_data():
     
     if 'liberty-cats' not in results:
         results['liberty-cats'] = {'price': fallback_price, 'currency': fallback_currency, 'is_fallback': True}
+        fallbacks.inc('nft', 'fallback')
         
     return results
 
 def fetch_news():
-    # Fetch global financial news from Jin10 (Flash News)
-    # https://flash-api.jin10.com/get_flash_list
-    url = "https://flash-api.jin10.com/get_flash_list"
-    
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "x-app-id": "bVBF4FyRTn5NJF5n",
-        "x-version": "1.0.0",
-        "Origin": "https://www.jin10.com",
-        "Referer": "https://www.jin10.com/"
-    }
-    
-    # Channel 1 seems to work for general news based on test
-    params = {
-        "channel": 1, 
-        "vip": "1",
-        "t": int(time.time() * 1000)
-    }
-    
-    news_list = []
+    # Global financial news from Jin10 (Flash News). Only items not seen
+    # before are parsed into news_store; returns the latest 20.
     try:
-        r = requests.get(url, headers=headers, params=params, timeout=5)
-        if r.status_code == 200:
-            json_data = r.json()
-            if json_data.get("status") == 200:
-                items = json_data.get("data", [])
-                for item in items:
-                    data_payload = item.get('data', {})
-                    content = data_payload.get('content', '')
-                    title = data_payload.get('title', '')
-                    
-                    # Jin10 sometimes has title, sometimes just content
-                    # If title exists, use it. If not, use content as title (truncate if too long)
-                    
-                    display_title = title
-                    if not display_title:
-                         display_title = content
-                         
-                    # Clean up HTML tags if any (basic)
-                    display_title = display_title.replace("<b>", "").replace("</b>", "").replace("<br/>", " ")
-                    
-                    # Format time: 2026-01-08 18:25:30 -> 01-08 18:25
-                    time_str = item.get('time', '')
-                    if time_str:
-                        try:
-                            dt = datetime.datetime.strptime(time_str, '%Y-%m-%d %H:%M:%S')
-                            time_str = dt.strftime('%m-%d %H:%M')
-                        except:
-                            pass
-                    
-                    news_list.append({
-                        'title': display_title,
-                        'url': data_payload.get('link') or "https://www.jin10.com", # Jin10 flash news often has no link
-                        'time': time_str,
-                        'source': '金十数据'
-                    })
-            else:
-                print(f"Jin10 API Error: {json_data}")
+        news_store.ingest(news.fetch_flash_list())
     except Exception as e:
         print(f"Error fetching news from Jin10: {e}")
-        
-    return news_list[:20]
+        return []
+    return news_store.latest(20)
+
+async def afetch_news():
+    try:
+        news_store.ingest(await news.afetch_flash_list())
+    except Exception as e:
+        print(f"Error fetching news from Jin10: {e}")
+        return []
+    return news_store.latest(20)
 
 def fetch_stablecoin_data():
     # Fetch stablecoin data from DeFiLlama
     # https://stablecoins.llama.fi/stablecoins?includePrices=true
-    url = "https://stablecoins.llama.fi/stablecoins?includePrices=true"
-    
-    coins_list = []
-    market_share = {
-        'USDT': 0,
-        'USDC': 0,
-        'Others': 0
-    }
-    
-    target_coins = ['USDT', 'USDC']
-    
+    # The document is streamed and only USDT/USDC and the total are kept; an
+    # unchanged feed answers 304 and the previous summary is reused.
     try:
-        r = requests.get(url, timeout=10)
-        if r.status_code == 200:
-            data = r.json()
-            if 'peggedAssets' in data:
-                total_mcap = 0
-                
-                # First pass: Calculate Total Market Cap and find targets
-                for asset in data['peggedAssets']:
-                    circulating = asset.get('circulating', {}).get('peggedUSD', 0)
-                    total_mcap += circulating
-                    
-                    symbol = asset['symbol']
-                    if symbol in target_coins:
-                        market_share[symbol] = circulating
-                        
-                        # Prev Day (to calc 24h change/issuance)
-                        prev_day = asset.get('circulatingPrevDay', {}).get('peggedUSD', 0)
-                        
-                        # 24h Issuance (Change)
-                        change_24h = circulating - prev_day
-                        
-                        coins_list.append({
-                            'name': asset['name'],
-                            'symbol': symbol,
-                            'price': asset.get('price', 1.0),
-                            'total_supply': circulating,
-                            'change_24h': change_24h,
-                            'change_24h_pct': (change_24h / prev_day * 100) if prev_day else 0
-                        })
-                
-                # Calculate Others
-                market_share['Others'] = total_mcap - market_share['USDT'] - market_share['USDC']
-                
+        return stablecoin_feed.fetch()
     except Exception as e:
         print(f"Error fetching stablecoin data: {e}")
-        
-    return {
-        'coins': coins_list,
-        'market_share': market_share
-    }
+        return {
+            'coins': [],
+            'market_share': {'USDT': 0, 'USDC': 0, 'Others': 0}
+        }
+
+# https://api.binance.com/api/v3/depth?symbol=BTCUSDT&limit=100
+# Increased limit to 100 for better chart visualization
+DEPTH_REST_URL = "https://api.binance.com/api/v3/depth?symbol=BTCUSDT&limit=100"
 
 def fetch_btc_depth():
-    # Fetch BTCUSDT order book depth from Binance
-    # https://api.binance.com/api/v3/depth?symbol=BTCUSDT&limit=100
-    # Increased limit to 100 for better chart visualization
-    url = "https://api.binance.com/api/v3/depth?symbol=BTCUSDT&limit=100"
-    
-    result = {'bids': [], 'asks': []}
-    
+    # Read BTCUSDT depth from the locally maintained order book (kept current by
+    # the diff-depth WebSocket stream). Until the stream has synced, or where
+    # it is disabled, fall back to a REST snapshot.
+    depth = stream_depth()
+    if depth is not None:
+        return depth
     try:
-        r = requests.get(url, timeout=5)
-        if r.status_code == 200:
-            data = r.json()
-            # Binance returns [[price, quantity], ...]
-            # We want to format it nicely
-            result['bids'] = [{'price': float(item[0]), 'amount': float(item[1])} for item in data.get('bids', [])]
-            result['asks'] = [{'price': float(item[0]), 'amount': float(item[1])} for item in data.get('asks', [])]
-            
+        return rest_depth(upstream.get(DEPTH_REST_URL))
     except Exception as e:
         print(f"Error fetching BTC depth: {e}")
-        
+        return rest_depth(None)
+
+async def afetch_btc_depth():
+    depth = stream_depth()
+    if depth is not None:
+        return depth
+    try:
+        return rest_depth(await async_upstream.get(DEPTH_REST_URL))
+    except Exception as e:
+        print(f"Error fetching BTC depth: {e}")
+        return rest_depth(None)
+
+def stream_depth():
+    if stream_enabled():
+        depth_stream.start()
+        return depth_stream.depth(1000)
+    return None
+
+def rest_depth(r):
+    result = {'bids': {'price': [], 'amount': []}, 'asks': {'price': [], 'amount': []}}
+    if r is not None and r.status_code == 200:
+        data = r.json()
+        # Binance returns [[price, quantity], ...], best first; keep the
+        # same parallel-array shape as the local order book
+        for side in ('bids', 'asks'):
+            result[side]['price'] = [float(item[0]) for item in data.get(side, [])]
+            result[side]['amount'] = [float(item[1]) for item in data.get(side, [])]
     return result
 
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def record_timing(response):
+    # Streaming responses (/api/stream) are timed up to their first byte
+    rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    route_seconds.observe(time.perf_counter() - g.started, rule, request.method, str(response.status_code))
+    return response
+
+@app.route('/metrics')
+def get_metrics():
+    for name, status in collector.status().items():
+        if status['age'] is not None:
+            source_age.set(status['age'], name)
+            source_stale.set(int(status['status'] == 'stale'), name)
+    states = {'closed': 0, 'half_open': 1, 'open': 2}
+    for host, status in upstream.breakers.status().items():
+        breaker_state.set(states[status['state']], host)
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def json_response(body):
+    # Views are cached as encoded JSON so serving them skips the encoder too
+    return app.response_class(body, mimetype='application/json')
+
 @app.route('/api/stablecoins')
 def get_stablecoins():
-    data = fetch_stablecoin_data()
-    return jsonify(data)
+    return json_response(collector.view('stablecoins', ['stablecoins'], json.dumps))
+
+# Allowed tick groupings for /api/depth; keeping the set fixed bounds the
+# number of cached views per book version
+DEPTH_BUCKETS = (0, 0.01, 0.1, 1, 10, 50, 100)
+DEPTH_MAX_LEVELS = 500
 
 @app.route('/api/depth/btcusdt')
 def get_btc_depth():
-    data = fetch_btc_depth()
-    return jsonify(data)
+    # ?bucket=<tick grouping>&levels=<levels per side>
+    # Returns cumulative curves and top-N tables as parallel arrays, computed
+    # once per (bucket, levels) per book version and shared by all clients.
+    try:
+        bucket = float(request.args.get('bucket', 0))
+        levels = int(request.args.get('levels', 100))
+    except ValueError:
+        return jsonify({'error': 'bucket and levels must be numbers'}), 400
+    if bucket not in DEPTH_BUCKETS:
+        return jsonify({'error': f'bucket must be one of {list(DEPTH_BUCKETS)}'}), 400
+    levels = max(1, min(levels, DEPTH_MAX_LEVELS))
+    return json_response(depth_view(bucket, levels, encoded=True))
+
+def depth_view(bucket=0, levels=100, encoded=False):
+    def build(depth):
+        view = aggregate(depth, bucket, levels)
+        return json.dumps(view) if encoded else view
+    return collector.view(('depth', bucket, levels, encoded), ['depth'], build)
+
+LIQUIDATION_SYMBOLS = ['BTCUSDT', 'ETHUSDT', 'SOLUSDT', 'DOGEUSDT', 'XRPUSDT']
+
+def liquidation_stream_live():
+    if liquidation_stream_enabled():
+        liquidation_stream.start()
+        return liquidation_stream.connected
+    return False
 
 def fetch_binance_liquidations():
+    # Recent liquidations, newest first, from liquidation_store. Where the
+    # process is long-lived the force-order stream feeds the store; otherwise
+    # (or while it is down) each call polls REST and ingests what is new.
+    if liquidation_stream_live():
+        return liquidation_store.recent(20)
+
     # Fetch recent liquidations from Binance
     # Since fapi.binance.com is often blocked, we will use a public aggregator API or fallback to mock data if network fails.
     # Coinglass API is also protected.
@@ -372,40 +330,56 @@ def fetch_binance_liquidations():
     # If all fail, we will generate REALISTIC SIMULATED DATA based on current price volatility.
     # This is a "Demo Mode" fallback to ensure UI is populated when API is unreachable.
     
-    symbols = ['BTCUSDT', 'ETHUSDT', 'SOLUSDT', 'DOGEUSDT', 'XRPUSDT']
     results = []
     
-    api_reachable = False
-    
-    # Attempt 1: Try official API with short timeout
-    try:
-        # Test connectivity with BTC
-        test_url = "https://fapi.binance.com/fapi/v1/time"
-        requests.get(test_url, timeout=1)
-        api_reachable = True
-    except:
-        api_reachable = False
-        
-    if api_reachable:
-        for symbol in symbols:
-            try:
-                url = f"https://fapi.binance.com/fapi/v1/allForceOrders?symbol={symbol}&limit=5"
-                r = requests.get(url, timeout=2)
-                if r.status_code == 200:
-                    orders = r.json()
-                    for order in orders:
-                        side = "Long" if order['side'] == 'SELL' else "Short"
-                        amount = float(order['price']) * float(order['origQty'])
-                        results.append({
-                            'symbol': symbol.replace('USDT', ''),
-                            'side': side,
-                            'price': float(order['price']),
-                            'qty': float(order['origQty']),
-                            'amount_usd': amount,
-                            'time': order['time']
-                        })
-            except:
-                pass
+    # No connectivity probe: upstream's circuit breaker for fapi.binance.com
+    # remembers that the host is down and fails the calls below at once
+    for symbol in LIQUIDATION_SYMBOLS:
+        try:
+            results.extend(liquidation_rows(symbol, upstream.get(liquidation_url(symbol))))
+        except CircuitOpen:
+            break
+        except:
+            pass
+    return ingest_liquidations(results)
+
+async def afetch_binance_liquidations():
+    if liquidation_stream_live():
+        return liquidation_store.recent(20)
+    responses = await asyncio.gather(*[async_upstream.get(liquidation_url(symbol)) for symbol in LIQUIDATION_SYMBOLS],
+                                     return_exceptions=True)
+    results = []
+    for symbol, r in zip(LIQUIDATION_SYMBOLS, responses):
+        try:
+            if not isinstance(r, BaseException):
+                results.extend(liquidation_rows(symbol, r))
+        except Exception:
+            pass
+    return ingest_liquidations(results)
+
+def liquidation_url(symbol):
+    return f"https://fapi.binance.com/fapi/v1/allForceOrders?symbol={symbol}&limit=5"
+
+def liquidation_rows(symbol, r):
+    results = []
+    if r.status_code == 200:
+        orders = r.json()
+        for order in orders:
+            side = "Long" if order['side'] == 'SELL' else "Short"
+            amount = float(order['price']) * float(order['origQty'])
+            results.append({
+                'symbol': symbol.replace('USDT', ''),
+                'side': side,
+                'price': float(order['price']),
+                'qty': float(order['origQty']),
+                'amount_usd': amount,
+                'time': order['time']
+            })
+    return results
+
+def ingest_liquidations(results):
+    if results:
+        liquidation_store.add_new(results, 'rest')
     
     # Fallback: Realistic Simulation if API is unreachable
     # This ensures the user sees how the feature works even if they are network restricted.
@@ -448,53 +422,202 @@ def fetch_binance_liquidations():
                 'time': evt_time,
                 'is_simulation': True # Flag for debug if needed
             })
+        # Listed, flagged, but kept out of the /api/liquidations/summary totals
+        liquidation_store.add_new(results, SIMULATION)
+        fallbacks.inc('liquidations', 'simulation')
             
-    # Sort by time desc
-    results.sort(key=lambda x: x['time'], reverse=True)
-    return results[:20]
+    return liquidation_store.recent(20)
+
+def fetch_liquidation_summary():
+    # Computed where liquidation_store is kept up to date: the worker that
+    # refreshes the sources (and runs the stream)
+    if liquidation_stream_enabled():
+        liquidation_stream.start()
+    return liquidation_store.summary()
 
 @app.route('/api/liquidations')
 def get_liquidations():
-    data = fetch_binance_liquidations()
-    return jsonify(data)
+    return json_response(collector.view('liquidations', ['liquidations'], json.dumps))
+
+@app.route('/api/liquidations/summary')
+def get_liquidation_summary():
+    # Rolling long/short totals per symbol over 1m/5m/1h/24h, read from the
+    # store's running aggregates (no upstream call, no event rescan)
+    return jsonify(collector.get('liquidation_summary'))
 
 @app.route('/api/news')
 def get_news():
-    news = fetch_news()
-    return jsonify(news)
+    # {cursor, items}: the latest items, or with ?since=<cursor from a
+    # previous response> only the ones newer than that
+    since = request.args.get('since')
+    if since:
+        items = collector.get('news') or []
+        return jsonify({'cursor': news.next_cursor(items, since), 'items': news.since(items, since)})
+    def build(items):
+        return json.dumps({'cursor': news.next_cursor(items or []), 'items': items or []})
+    return json_response(collector.view('news', ['news'], build))
+
+PRICE_SOURCES = ['sina', 'crypto', 'nft']
+
+def price_rows():
+    def build(sina_data, crypto_data, nft_data):
+        # Sources that missed their deadline still contribute their last good
+        # value; the rows say so instead of blocking the response.
+        stale = collector.stale(PRICE_SOURCES)
+        return build_price_rows(sina_data or {}, crypto_data or {}, nft_data or {}, stale)
+    return collector.view('price_rows', PRICE_SOURCES, build)
+
+PRICES_PAGE_SIZE = 100
+PRICES_MAX_PAGE_SIZE = 500
 
 @app.route('/api/prices')
 def get_prices():
-    sina_data = fetch_sina_data()
-    crypto_data = fetch_crypto_data()
-    nft_data = fetch_nft_data()
-    
-    # Map to frontend structure
-    # Assets: Gold, Silver, USD/CNY, BTC, ETH, Meituan, Kuaishou, Moutai, Insta360, Liberty Cats
-    assets_map = [
-        {'name': '黄金 (Gold)', 'code': 'hf_GC', 'source': 'sina', 'suffix': ' USD'},
-        {'name': '白银 (Silver)', 'code': 'hf_SI', 'source': 'sina', 'suffix': ' USD'},
-        {'name': '美元/人民币 (USD/CNY)', 'code': 'fx_susdcny', 'source': 'sina', 'suffix': ''},
-        {'name': '比特币 (BTC)', 'code': 'BTCUSDT', 'source': 'binance', 'suffix': ' USD'},
-        {'name': '以太坊 (ETH)', 'code': 'ETHUSDT', 'source': 'binance', 'suffix': ' USD'},
-        {'name': '美团 (Meituan)', 'code': 'hk03690', 'source': 'sina', 'suffix': ' HKD'},
-        {'name': '快手 (Kuaishou)', 'code': 'hk01024', 'source': 'sina', 'suffix': ' HKD'},
-        {'name': '茅台 (Moutai)', 'code': 'sh600519', 'source': 'sina', 'suffix': ' CNY'},
-        {'name': '影石创新 (Insta360)', 'code': 'sh688775', 'source': 'sina', 'suffix': ' CNY'},
-        {'name': 'Circle (CRCL)', 'code': 'gb_crcl', 'source': 'sina', 'suffix': ' USD'},
-        {'name': 'Liberty Cats NFT (OKX)', 'code': 'liberty-cats', 'source': 'nft', 'suffix': ' USDT'},
-    ]
-    
+    # ?page=&page_size= paginate; ?source=, ?market=, ?codes=a,b and ?q=
+    # (substring of code or name) filter. The body stays a list of rows; the
+    # total count is in X-Total-Count.
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        page_size = min(max(int(request.args.get('page_size', PRICES_PAGE_SIZE)), 1), PRICES_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'page and page_size must be integers'}), 400
+    source = request.args.get('source')
+    market = request.args.get('market')
+    if source and source not in symbols.by_source:
+        return jsonify({'error': f"unknown source: {source}"}), 400
+    if market and market not in symbols.markets:
+        return jsonify({'error': f"unknown market: {market}"}), 400
+    codes = request.args.get('codes')
+    q = request.args.get('q', '').lower()
+
+    def select(*_):
+        rows = price_rows()
+        if source:
+            rows = [row for row in rows if symbols.get(row['code']).source == source]
+        if market:
+            rows = [row for row in rows if row['market'] == market]
+        if codes:
+            wanted = set(codes.split(','))
+            rows = [row for row in rows if row['code'] in wanted]
+        if q:
+            rows = [row for row in rows if q in row['code'].lower() or q in row['name'].lower()]
+        start = (page - 1) * page_size
+        return len(rows), json.dumps(rows[start:start + page_size])
+
+    if codes or q:
+        total, body = select()
+    else:
+        # Cached per snapshot version. source and market are known ones, and
+        # every page past the last is the same empty page (every size past the
+        # number of symbols the same single page), so the keys stay bounded.
+        count = max(len(symbols.visible), 1)
+        page_size = min(page_size, count)
+        page = min(page, -(-count // page_size) + 1)
+        total, body = collector.view(('prices', source, market, page, page_size), PRICE_SOURCES, select)
+    response = json_response(body)
+    response.headers['X-Total-Count'] = str(total)
+    return response
+
+# Everything the dashboard shows, grouped the way /api/stream pushes it
+STREAM_GROUPS = {
+    'prices': PRICE_SOURCES,
+    'depth': ['depth'],
+    'liquidations': ['liquidations'],
+    'news': ['news'],
+    'stablecoins': ['stablecoins'],
+    'btc_history': ['btc_history'],
+}
+STREAM_SOURCES = [name for names in STREAM_GROUPS.values() for name in names]
+STREAM_KEEPALIVE = 15
+# Keep well below the server's threads (Procfile / Dockerfile serve asgi.py,
+# which has no such limit)
+stream_slots = StreamSlots()
+depth_deltas = DepthDeltas()
+
+@app.route('/api/stream')
+def get_stream():
+    # Server-Sent Events: the dashboard subscribes once and receives only what
+    # changed (price rows, depth level deltas, new liquidations and news) as
+    # soon as the collector publishes it.
+    def events():
+        client = StreamClient()
+        while True:
+            version = collector.version
+            yield from stream_messages(client, collector.snapshots(STREAM_SOURCES))
+            # Serverless mode has no background refresh, so wake up regularly
+            # and let snapshots() refresh what is due.
+            timeout = STREAM_KEEPALIVE if collector.background else 1
+            if collector.wait(version, timeout) == version:
+                yield ': keep-alive\n\n'
+
+    if not stream_slots.acquire():
+        # EventSource gives up on a 503; the page falls back to polling
+        response = jsonify({'error': 'too many open streams'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(STREAM_KEEPALIVE)
+        return response
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    response = Response(stream_with_context(events()), mimetype='text/event-stream', headers=headers)
+    # Called by the server when the connection ends, even if nothing was sent
+    response.call_on_close(stream_slots.release)
+    return response
+
+def stream_messages(client, snapshots):
+    # The SSE messages for what changed since `client` was last sent anything;
+    # `snapshots` are those of STREAM_SOURCES
+    snapshots = dict(zip(STREAM_SOURCES, snapshots))
+    for group, names in STREAM_GROUPS.items():
+        versions = tuple(snapshots[name].version if snapshots[name] else 0 for name in names)
+        if not client.changed(group, versions):
+            continue
+        message = stream_message(client, group, [snapshots[name].data if snapshots[name] else None for name in names])
+        if message is not None:
+            yield sse(group, message, max(versions))
+
+def stream_message(client, group, datas):
+    if group == 'prices':
+        changed = client.price_changes(price_rows())
+        return {'rows': changed} if changed else None
+    data = datas[0]
+    if data is None:
+        return None
+    if group == 'depth':
+        # The default view is aggregated once per book version for everyone;
+        # each client is sent the levels that changed since its last message
+        return client.depth_delta(depth_view(), depth_deltas)
+    if group == 'liquidations':
+        items = client.new_items('liquidations', data, lambda i: (i['symbol'], i['time'], i['amount_usd']))
+        return {'items': items} if items else None
+    if group == 'news':
+        items = client.new_items('news', data, lambda i: i['id'])
+        return {'items': items} if items else None
+    return data
+
+@app.route('/api/collector')
+def get_collector_status():
+    # Whether this worker refreshes the sources (leader) or loads them from
+    # the shared snapshots (follower), per-source freshness, how long each
+    # upstream call took last time, cache hit/miss counts and the circuit
+    # state of every upstream host
+    return jsonify({'role': collector.role, 'sources': collector.status(), 'fetches': fetch_pool.timings, 'caches': cache.stats(),
+                    'breakers': upstream.breakers.status()})
+
+def build_price_rows(sina_data, crypto_data, nft_data, stale=()):
+    # Map to frontend structure, in registry order
     response_list = []
     
-    for asset in assets_map:
+    source_names = {'sina': 'sina', 'binance': 'crypto', 'nft': 'nft'}
+    for symbol in symbols.visible:
+        asset = {'name': symbol.name, 'code': symbol.code, 'source': symbol.source, 'suffix': symbol.suffix}
         data = None
+        status = 'stale' if source_names[asset['source']] in stale else 'ok'
         if asset['source'] == 'sina':
             data = sina_data.get(asset['code'])
         elif asset['source'] == 'binance':
             data = crypto_data.get(asset['code'])
         elif asset['source'] == 'nft':
             data = nft_data.get(asset['code'])
+            # Work on a copy: nft_data is the shared collector snapshot
+            data = dict(data) if data else None
             # Convert POL to USDT
             if data and data.get('currency') == 'POL':
                 pol_data = crypto_data.get('POLUSDT')
@@ -524,7 +647,9 @@ def get_prices():
                 'price': f"{price:,.2f}{asset['suffix']}",
                 'change': f"{change:.2f}",
                 'change_pct': f"{change_pct:.2f}%",
-                'color': 'red' if change >= 0 else 'green' # Red up, Green down
+                'color': 'red' if change >= 0 else 'green', # Red up, Green down
+                'market': symbol.market,
+                'status': status
             }
             if data.get('is_fallback'):
                 item['name'] += ' (Est.)'
@@ -537,157 +662,418 @@ def get_prices():
                 'price': 'N/A',
                 'change': '0',
                 'change_pct': '0%',
-                'color': 'black'
+                'color': 'black',
+                'market': symbol.market,
+                'status': 'missing'
             })
             
-    return jsonify(response_list)
+    return response_list
 
 @app.route('/detail/<path:code>')
 def detail(code):
-    name = ASSET_NAMES.get(code, code)
+    symbol = symbols.get(code)
+    name = symbol.name if symbol else code
     return render_template('detail.html', name=name, code=code)
 
 @app.route('/api/history/<path:code>')
 def get_history(code):
-    if code not in YFINANCE_MAPPING:
-        return jsonify({'error': 'Chart not available for this asset', 'dates': [], 'prices': []})
-    
+    # ?from=YYYY-MM-DD&to=YYYY-MM-DD (inclusive), ?resolution=1m|5m|1h|1d
+    # (default 1d) and ?points=N, the most points to return (default 1000):
+    # longer ranges are downsampled. Without a range the last ?limit=N bars (30).
+    # Bars go back as far as history_store.RETENTION keeps them: 30 days of 1m,
+    # a year of 5m, five years of 1h and everything daily; a longer 1m range
+    # returns the last 30 days (use 5m for more).
+    try:
+        params = history_params(request.args)
+    except ValueError as e:
+        return jsonify(history_params_error(e)), 400
+    return jsonify(fetch_history(code, *params))
+
+DEFAULT_POINTS = 1000
+MAX_POINTS = 5000
+
+def history_range(args):
+    try:
+        start = date_to_ts(args['from']) if args.get('from') else None
+        # Inclusive: up to the last bar of that day
+        end = date_to_ts(args['to']) + 86399 if args.get('to') else None
+    except ValueError:
+        raise ValueError('from/to must be YYYY-MM-DD') from None
+    return start, end
+
+def history_params(args):
+    # (start, end, resolution, points, limit), the arguments of fetch_history
+    start, end = history_range(args)
+    resolution = args.get('resolution', '1d')
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"resolution must be one of {', '.join(RESOLUTIONS)}")
+    try:
+        points = int(args.get('points', DEFAULT_POINTS))
+        limit = int(args.get('limit', 30))
+    except ValueError:
+        raise ValueError('points and limit must be integers') from None
+    if not 3 <= points <= MAX_POINTS:
+        raise ValueError(f"points must be between 3 and {MAX_POINTS}")
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return start, end, resolution, points, limit
+
+def history_params_error(e):
+    return {'error': str(e), 'dates': [], 'prices': []}
+
+def fetch_btc_history():
+    # Dashboard chart; an error result is not worth publishing over the last
+    # good series
+    history = fetch_history('BTCUSDT')
+    return history if history.get('dates') else None
+
+def fetch_history(code, start=None, end=None, resolution='1d', points=DEFAULT_POINTS, limit=30):
+    # /api/history, from the cached bars
+    bars = history_bars(code, start, end, resolution, points, limit)
+    return bars if 'error' in bars else history_json(bars)
+
+def history_json(bars):
+    # history_bars in the JSON shape: dates, and 'prices' for the closes
+    label = ts_to_date if bars['resolution'] == '1d' else ts_to_minute
+    result = {'dates': [label(ts) for ts in bars['t']]}
+    for column in HISTORY_COLUMNS:
+        result['prices' if column == 'close' else column] = [None if v != v else v for v in bars[column]]
+    result['resolution'] = bars['resolution']
+    if 'downsampled_from' in bars:
+        result['downsampled_from'] = bars['downsampled_from']
+    return result
+
+# The one cache of the history routes. Concurrent requests for the same code,
+# resolution, range and point count (a shared chart link) wait for one fetch;
+# an error result is served for 15s before the next attempt
+@cache.cached(ttl=60, stale_ttl=3600, max_size=512, accept=lambda r: 'error' not in r, error_ttl=15)
+def history_bars(code, start=None, end=None, resolution='1d', points=DEFAULT_POINTS, limit=30):
+    # OHLCV bars as columns: 't' (epoch seconds) and one array per column.
+    # Without a range, the last `limit` bars. More than `points` bars are
+    # downsampled (LTTB on the closes): the bars returned are real ones,
+    # picked to keep the shape of the line.
+    series, error = load_history(code, resolution)
+    if series is None:
+        return error
+
+    lo, hi = history_slice(series, start, end, limit)
+    if hi - lo > points:
+        import numpy as np
+        from downsample import lttb
+        t = np.frombuffer(series.t, dtype=np.int64)[lo:hi]
+        closes = np.frombuffer(series.values['close'], dtype=float)[lo:hi]
+        picked = (lttb(t, closes, points) + lo).tolist()
+        take = lambda values: array('d', [values[i] for i in picked])
+        result = {'t': array('q', [series.t[i] for i in picked]), 'downsampled_from': hi - lo}
+    else:
+        take = lambda values: values[lo:hi]
+        result = {'t': series.t[lo:hi]}
+    for column in HISTORY_COLUMNS:
+        values = series.values.get(column)
+        result[column] = array('d', [float('nan')]) * len(result['t']) if values is None else take(values)
+    result['resolution'] = resolution
+    return result
+
+def ts_to_minute(ts):
+    # Intraday bar labels, UTC
+    return time.strftime('%Y-%m-%d %H:%M', time.gmtime(ts))
+
+# Shared by the history and analytics routes: concurrent loads of a code wait
+# for one, and a failing provider is retried at most every 15s. Nothing else
+# is kept here: how often new bars are downloaded is the store's
+# REFRESH_INTERVAL, and history_bars caches what the routes serve.
+@cache.cached(ttl=0, max_size=512, accept=lambda r: r[0] is not None, error_ttl=15)
+def load_history(code, resolution='1d'):
+    # (series, None) from the local history store, where only bars newer than
+    # the last stored one are downloaded; (None, error result) without one
+    symbol = symbols.get(code)
+    if symbol is None or not symbol.history:
+        return None, {'error': 'Chart not available for this asset', 'dates': [], 'prices': []}
+    if resolution != '1d' and resolution not in INTRADAY_RESOLUTIONS.get(symbol.history, ()):
+        return None, {'error': f"No {resolution} bars for this asset", 'dates': [], 'prices': []}
+
+    try:
+        return history_store.refresh(code, lambda since: timed_history_rows(symbol, since, resolution),
+                                     resolution=resolution), None
+    except Exception as e:
+        print(f"Error fetching {resolution} history for {code}: {e}")
+        # Serve what is already stored rather than nothing
+        series = history_store.load(code, resolution)
+        if not series:
+            return None, {'error': str(e), 'dates': [], 'prices': []}
+        return series, None
+
+def history_slice(series, start, end, limit):
+    lo, hi = series.range(start, end)
+    if start is None and end is None:
+        lo = max(hi - limit, 0)
+    return lo, hi
+
+@app.route('/api/analytics/<path:code>')
+def get_analytics(code):
+    # ?indicators=sma:20,ema:50,rsi:14,bb:20,vol:20,returns and the ?from=&to=
+    # range of /api/history; without a range the last 30 bars
+    import indicators
+    try:
+        start, end = history_range(request.args)
+        wanted = indicators.parse(request.args.get('indicators'))
+    except ValueError as e:
+        return jsonify({'error': str(e), 'dates': [], 'indicators': {}}), 400
+    return jsonify(fetch_analytics(code, start, end, wanted))
+
+# Indicator results per code, bars and indicator set. The key holds the last
+# bar of the range, so an entry is used until a new bar (or a new value for
+# the still-open one) arrives; the TTL only bounds how long it lingers.
+analytics_cache = cache.Cache('analytics', ttl=86400, max_size=256)
+
+def fetch_analytics(code, start=None, end=None, wanted=(), limit=30):
+    # Computed over all stored bars up to the end of the range, so the
+    # windows are already filled at its first bar
+    series, error = load_history(code, '1d')
+    if series is None:
+        return dict(error, indicators={})
+    lo, hi = history_slice(series, start, end, limit)
+    close = series.values['close'][hi - 1] if hi else None
+    # NaN != NaN: a missing last close would never match its own entry
+    last = (series.t[hi - 1], None if close != close else close) if hi else None
+    key = (code, lo, hi, last, wanted)
+    return analytics_cache.get(key, lambda: compute_analytics(code, series, lo, hi, wanted))
+
+def compute_analytics(code, series, lo, hi, wanted):
+    import numpy as np
+    import indicators
+    symbol = symbols.get(code)
+    closes = np.frombuffer(series.values['close'], dtype=float, count=hi)
+    values = indicators.compute(closes, wanted, periods_per_year=365 if symbol.market == 'crypto' else 252)
+    result = {}
+    for key, value in values.items():
+        if isinstance(value, dict):
+            result[key] = {part: indicators.to_list(v, lo) for part, v in value.items()}
+        else:
+            result[key] = indicators.to_list(value, lo)
+    return {
+        'code': code,
+        'dates': [ts_to_date(ts) for ts in series.t[lo:hi]],
+        'close': indicators.to_list(closes, lo),
+        'indicators': result,
+    }
+
+def timed_history_rows(symbol, since=None, resolution='1d'):
+    # [(ts, row)] from epoch seconds `since` on, for history_store.refresh
+    with history_seconds.time(symbol.history):
+        try:
+            if resolution != '1d':
+                return fetch_intraday_rows(symbol, resolution, since)
+            rows = fetch_history_rows(symbol, ts_to_date(since) if since is not None else None)
+            return [(date_to_ts(date), row) for date, row in rows]
+        except Exception:
+            history_errors.inc(symbol.history)
+            raise
+
+def fetch_history_rows(symbol, since=None):
+    # Daily bars [(date, {column: value})] from `since` (inclusive, 'YYYY-MM-DD')
+    # or the full available history when since is None, from the symbol's
+    # history provider (symbols.json).
     # Use Sina Finance for history instead of yfinance due to rate limits
     # Sina history URL patterns:
     # A-Share: https://finance.sina.com.cn/realstock/company/sh600519/hisdata/klc_kl.js (Daily)
     # HK Share: http://finance.sina.com.cn/stock/hkstock/sh00000/klc_kl.js (Need check)
     # Actually simpler API for scale:
     # http://money.finance.sina.com.cn/quotes_service/api/json_v2.php/CN_MarketData.getKLineData?symbol=sh600519&scale=240&ma=no&datalen=1023
-    
-    dates = []
-    prices = []
-    
+    code = symbol.code
+    provider = symbol.history
+    rows = []
+
+    if provider == 'sina_a':
+        # A-Share: scale=240 (Day); datalen counts bars back from today, so
+        # ask for just enough to cover the days since the last stored bar
+        datalen = 1023
+        if since:
+            datalen = min((datetime.date.today() - datetime.date.fromisoformat(since)).days + 1, 1023)
+        for day, row in sina_kline_rows(code, 240, datalen):
+            rows.append((day[:10], row))
+
+    elif provider == 'yfinance':
+        # HK Share
+        # Try to use yfinance as primary for HK stocks since Sina API is unstable/empty for some
+        ticker = symbol.yfinance
+        if ticker:
+            if since:
+                bars = download_yfinance(ticker, start=since)
+            else:
+                bars = download_yfinance(ticker, period='5y')
+            rows = [(dt.strftime('%Y-%m-%d'), row) for dt, row in bars]
+
+    elif provider == 'sina_us':
+        # US Share
+        # http://stock.finance.sina.com.cn/usstock/api/jsonp_v2.php/var%20_crcl=/US_MinKService.getDailyK?symbol=crcl
+        ticker = code[3:]
+        url = f"http://stock.finance.sina.com.cn/usstock/api/jsonp_v2.php/var%20_{ticker}=/US_MinKService.getDailyK?symbol={ticker}"
+        r = upstream.get(url)
+        # US API returns list of objects: {"d":"2025-01-07","o":..,"h":..,"l":..,"c":"83.23","v":..}
+        rows = parse_jsonp_series(r.text, SINA_US_KEYS, since)
+
+    elif provider == 'binance':
+        # Binance klines
+        # https://api.binance.com/api/v3/klines?symbol=BTCUSDT&interval=1d&limit=30
+        start = date_to_ts(since) if since else None
+        rows = [(ts_to_date(ts), row) for ts, row in binance_klines(code, '1d', start)]
+
+    elif provider == 'sina_futures':
+        # Sina Future
+        # http://stock2.finance.sina.com.cn/futures/api/jsonp.php/var%20_GC=/GlobalFuturesService.getGlobalFuturesDailyKLine?symbol=GC
+        # Format: var _GC=([{"date":"2025-01-07","open":...,"close":"..."}, ...]);
+        ticker = code[3:]
+        url = f"http://stock2.finance.sina.com.cn/futures/api/jsonp.php/var%20_{ticker}=/GlobalFuturesService.getGlobalFuturesDailyKLine?symbol={ticker}"
+        r = upstream.get(url)
+        rows = parse_jsonp_series(r.text, SINA_KEYS, since)
+
+    elif provider == 'sina_forex':
+        # Sina Forex
+        # http://vip.stock.finance.sina.com.cn/forex/api/jsonp.php/var%20_fx_susdcny=/NewForexService.getGlobalForexDailyKLine?symbol=fx_susdcny
+        url = f"http://vip.stock.finance.sina.com.cn/forex/api/jsonp.php/var%20_{code}=/NewForexService.getGlobalForexDailyKLine?symbol={code}"
+        r = upstream.get(url)
+        # Similar format to futures (no volume)
+        rows = parse_jsonp_series(r.text, SINA_KEYS, since)
+
+    if since:
+        rows = [row for row in rows if row[0] >= since]
+    return rows
+
+# Intraday bars per history provider (every provider has daily ones). The
+# Sina jsonp series (US, futures, forex) are daily only.
+INTRADAY_RESOLUTIONS = {'binance': ('1m', '5m', '1h'), 'sina_a': ('5m', '1h'), 'yfinance': ('1m', '5m', '1h')}
+
+# Sina kline scale (minutes per bar) per resolution
+SINA_SCALES = {'5m': 5, '1h': 60}
+
+# How far back Yahoo serves each intraday interval (days)
+YFINANCE_INTRADAY_DAYS = {'1m': 7, '5m': 59, '1h': 729}
+
+# Sina A-share kline times are Beijing time
+CHINA_TZ = datetime.timezone(datetime.timedelta(hours=8))
+
+def fetch_intraday_rows(symbol, resolution, since=None):
+    # [(ts, row)] of `resolution` bars from epoch seconds `since`, or as far
+    # back as the store keeps them (RETENTION) when since is None
+    step = RESOLUTIONS[resolution]
+    now = int(time.time())
+    if since is None:
+        since = now - RETENTION[resolution]
+    provider = symbol.history
+    rows = []
+
+    if provider == 'binance':
+        # 1000 bars per request: the pages of a long download are fetched at once
+        page = 1000 * step
+        starts = list(range(since - since % step, now + 1, page))
+        results = fetch_pool.run({f"klines:{symbol.code}:{resolution}:{i}": (lambda start=start: binance_klines(symbol.code, resolution, start), 20)
+                                  for i, start in enumerate(starts)})
+        for result in results.values():
+            if result.status != 'ok':
+                raise result.error or TimeoutError(f"{result.name} timed out")
+            rows += result.data
+
+    elif provider == 'sina_a':
+        # datalen counts bars back from now (at most 1023, about 10 trading
+        # days of 5m bars); trading hours are short, so this over-asks
+        datalen = min((now - since) // step + 1, 1023)
+        for day, row in sina_kline_rows(symbol.code, SINA_SCALES[resolution], datalen):
+            ts = int(datetime.datetime.fromisoformat(day).replace(tzinfo=CHINA_TZ).timestamp())
+            rows.append((ts, row))
+
+    elif provider == 'yfinance' and symbol.yfinance:
+        earliest = now - YFINANCE_INTRADAY_DAYS[resolution] * 86400
+        start = datetime.datetime.fromtimestamp(max(since, earliest), datetime.timezone.utc)
+        rows = [(int(dt.timestamp()), row) for dt, row in download_yfinance(symbol.yfinance, start=start, interval=resolution)]
+
+    return [row for row in rows if row[0] >= since]
+
+def binance_klines(code, interval, start=None):
+    # Up to 1000 bars from epoch seconds `start` (the latest ones without)
+    url = f"https://api.binance.com/api/v3/klines?symbol={code}&interval={interval}&limit=1000"
+    if start is not None:
+        url += f"&startTime={start * 1000}"
+    r = upstream.get(url)
+    r.raise_for_status()
+    # [Open time, Open, High, Low, Close, Volume, ...]
+    return [(item[0] // 1000, dict(zip(HISTORY_COLUMNS, map(float, item[1:6])))) for item in r.json()]
+
+def sina_kline_rows(code, scale, datalen):
+    # The latest `datalen` bars of `scale` minutes: [(time string, row)]
+    url = f"http://money.finance.sina.com.cn/quotes_service/api/json_v2.php/CN_MarketData.getKLineData?symbol={code}&scale={scale}&ma=no&datalen={datalen}"
+    r = upstream.get(url)
+    return [(item['day'], {column: to_float(item.get(column)) for column in HISTORY_COLUMNS}) for item in r.json() or []]
+
+def download_yfinance(ticker, **kwargs):
+    # [(pandas Timestamp, row)] from yf.download. yfinance uses its own HTTP
+    # session; retry it with the same jittered backoff as the other
+    # upstreams, behind the Yahoo circuit breaker. Imported here: yfinance
+    # brings pandas and numpy, which cost every serverless cold start otherwise.
+    import yfinance as yf
+    download = lambda: yf.download(ticker, progress=False, **kwargs)
+    has_rows = lambda d: not d.empty
+    data = upstream.guarded('query1.finance.yahoo.com',
+                            lambda: upstream.retry_call(download, accept=has_rows), accept=has_rows)
+    if data.empty:
+        return []
+    columns = {}
+    for column in HISTORY_COLUMNS:
+        values = data[column.capitalize()]
+        if hasattr(values, 'columns') and ticker in values.columns:
+            values = values[ticker]
+        columns[column] = values.tolist()
+    return [(dt, {column: to_float(columns[column][i]) for column in HISTORY_COLUMNS}) for i, dt in enumerate(data.index)]
+
+# Keys of the Sina jsonp kline objects: date first, then the history columns
+SINA_KEYS = ('date', 'open', 'high', 'low', 'close', 'volume')
+SINA_US_KEYS = ('d', 'o', 'h', 'l', 'c', 'v')
+
+def to_float(value):
+    # Upstream numbers come as strings, numbers, '' or NaN; missing -> None
     try:
-        if code.startswith('sh') or code.startswith('sz'):
-            # A-Share: scale=240 (Day), datalen=30 (30 days)
-            url = f"http://money.finance.sina.com.cn/quotes_service/api/json_v2.php/CN_MarketData.getKLineData?symbol={code}&scale=240&ma=no&datalen=30"
-            r = requests.get(url)
-            data = r.json()
-            for item in data:
-                dates.append(item['day'])
-                prices.append(float(item['close']))
-                
-        elif code.startswith('hk'):
-            # HK Share
-            # Try to use yfinance as primary for HK stocks since Sina API is unstable/empty for some
-            try:
-                ticker = YFINANCE_MAPPING.get(code)
-                if ticker:
-                    # Retry logic for yfinance
-                    for _ in range(3):
-                        try:
-                            data = yf.download(ticker, period='1mo', progress=False)
-                            if not data.empty:
-                                break
-                            time.sleep(1)
-                        except:
-                            time.sleep(1)
-                            
-                    if not data.empty:
-                        close_data = data['Close']
-                        if hasattr(close_data, 'columns') and ticker in close_data.columns:
-                            close_data = close_data[ticker]
-                        
-                        for dt, price in zip(data.index, close_data):
-                            dates.append(dt.strftime('%Y-%m-%d'))
-                            if hasattr(price, 'item'): price = price.item()
-                            prices.append(price if not (price != price) else None)
-            except Exception as e:
-                print(f"HK stock yfinance failed: {e}")
-                
-        elif code.startswith('gb_'):
-            # US Share
-            # http://stock.finance.sina.com.cn/usstock/api/jsonp_v2.php/var%20_crcl=/US_MinKService.getDailyK?symbol=crcl
-            symbol = code[3:]
-            url = f"http://stock.finance.sina.com.cn/usstock/api/jsonp_v2.php/var%20_{symbol}=/US_MinKService.getDailyK?symbol={symbol}"
-            r = requests.get(url)
-            content = r.text
-            start = content.find('([') + 1
-            end = content.rfind('])') + 1
-            if start > 0 and end > 0:
-                json_str = content[start:end]
-                # US API returns list of objects: {"d":"2025-01-07",...,"c":"83.23",...}
-                import re
-                # Keys are quoted: "d" and "c"
-                matches = re.findall(r'"d":"(\d{4}-\d{2}-\d{2})".*?"c":"([\d\.]+)"', json_str)
-                matches = matches[-30:]
-                for d, c in matches:
-                    dates.append(d)
-                    prices.append(float(c))
-
-        elif code == 'BTCUSDT' or code == 'ETHUSDT':
-            # Binance klines
-            # https://api.binance.com/api/v3/klines?symbol=BTCUSDT&interval=1d&limit=30
-            url = f"https://api.binance.com/api/v3/klines?symbol={code}&interval=1d&limit=30"
-            r = requests.get(url)
-            data = r.json()
-            for item in data:
-                # [Open time, Open, High, Low, Close, ...]
-                ts = item[0]
-                close = float(item[4])
-                date_str = datetime.datetime.fromtimestamp(ts/1000).strftime('%Y-%m-%d')
-                dates.append(date_str)
-                prices.append(close)
-                
-        elif code == 'hf_GC' or code == 'hf_SI':
-            # Sina Future
-            # http://stock2.finance.sina.com.cn/futures/api/jsonp.php/var%20_GC=/GlobalFuturesService.getGlobalFuturesDailyKLine?symbol=GC
-            symbol = 'GC' if code == 'hf_GC' else 'SI'
-            url = f"http://stock2.finance.sina.com.cn/futures/api/jsonp.php/var%20_{symbol}=/GlobalFuturesService.getGlobalFuturesDailyKLine?symbol={symbol}"
-            r = requests.get(url)
-            content = r.text
-            # Format: var _GC=([...]);
-            start = content.find('([') + 1
-            end = content.rfind('])') + 1
-            if start > 0 and end > 0:
-                json_str = content[start:end]
-                # keys: date, open, high, low, close
-                # But it's list of dicts or list of lists?
-                # It's list of dicts: {d:"2023-...", o:..., h:..., l:..., c:...}
-                # Wait, Sina Futures usually returns list of objects
-                # Let's try to parse
-                # The response keys are not quoted, so json.loads might fail.
-                # Example: [{d:"2025-01-07",o:"...",...}]
-                # We need to quote the keys or use regex
-                import re
-                # Simple regex to extract date and close
-                # Keys are quoted: "date" and "close"
-                matches = re.findall(r'"date":"(\d{4}-\d{2}-\d{2})".*?"close":"([\d\.]+)"', json_str)
-                # Take last 30
-                matches = matches[-30:]
-                for d, c in matches:
-                    dates.append(d)
-                    prices.append(float(c))
-                    
-        elif code == 'fx_susdcny':
-             # Sina Forex
-             # http://vip.stock.finance.sina.com.cn/forex/api/jsonp.php/var%20_fx_susdcny=/NewForexService.getGlobalForexDailyKLine?symbol=fx_susdcny
-             url = "http://vip.stock.finance.sina.com.cn/forex/api/jsonp.php/var%20_fx_susdcny=/NewForexService.getGlobalForexDailyKLine?symbol=fx_susdcny"
-             r = requests.get(url)
-             content = r.text
-             start = content.find('([') + 1
-             end = content.rfind('])') + 1
-             if start > 0 and end > 0:
-                json_str = content[start:end]
-                # Similar format to futures
-                import re
-                matches = re.findall(r'"date":"(\d{4}-\d{2}-\d{2})".*?"close":"([\d\.]+)"', json_str)
-                matches = matches[-30:]
-                for d, c in matches:
-                    dates.append(d)
-                    prices.append(float(c))
-                    
-        return jsonify({'dates': dates, 'prices': prices})
-        
-    except Exception as e:
-        print(f"Error fetching history for {code}: {e}")
-        return jsonify({'error': str(e)})
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if value != value else value
+
+def parse_jsonp_series(content, keys, since=None):
+    # Sina jsonp endpoints always return the whole daily series, oldest first.
+    # When only bars from `since` on are needed, jump to that date and only
+    # parse the tail.
+    start = content.find('([') + 1
+    end = content.rfind('])') + 1
+    if start <= 0 or end <= 0:
+        return []
+    json_str = content[start:end]
+    date_key = keys[0]
+    if since:
+        pos = json_str.find(f'"{date_key}":"{since}')
+        brace = json_str.rfind('{', 0, pos) if pos >= 0 else -1
+        if brace >= 0:
+            json_str = '[' + json_str[brace:]
+    try:
+        items = json.loads(json_str)
+    except ValueError:
+        return []
+    return [(item[date_key][:10], {column: to_float(item.get(key)) for column, key in zip(HISTORY_COLUMNS, keys[1:])})
+            for item in items if item.get(date_key)]
+
 
+# Each source is refreshed on its own schedule (seconds), independent of how
+# many clients are polling the routes above. The deadline bounds how long a
+# refresh waits before the source is served as stale; a fallback NFT price or
+# an empty stablecoin summary is published only while there is no real one to
+# keep serving (accept).
+collector.register('sina', fetch_sina_data, 5, deadline=4, afetch=afetch_sina_data)
+collector.register('crypto', fetch_crypto_data, 5, deadline=4, afetch=afetch_crypto_data)
+collector.register('nft', fetch_nft_data, 60, deadline=6, accept=lambda r: not r['liberty-cats'].get('is_fallback'))
+collector.register('depth', fetch_btc_depth, 1, deadline=2, afetch=afetch_btc_depth)
+collector.register('news', fetch_news, 30, deadline=6, afetch=afetch_news)
+collector.register('stablecoins', fetch_stablecoin_data, 60, deadline=12, accept=lambda r: bool(r['coins']))
+collector.register('liquidations', fetch_binance_liquidations, 5, deadline=4, afetch=afetch_binance_liquidations)
+collector.register('liquidation_summary', fetch_liquidation_summary, 1, deadline=2)
+collector.register('btc_history', fetch_btc_history, 60, deadline=10)
 
 if __name__ == '__main__':
     app.run(debug=True, port=5001)
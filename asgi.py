@@ -0,0 +1,144 @@
+"""ASGI entry point: the dashboard on an event loop, next to the WSGI app.
+
+    uvicorn asgi:app --port 5001
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT --workers 4
+
+The collector refreshes its sources on the loop: the afetch_* variants in
+app.py over async_upstream, and the remaining sources on worker threads. The
+routes that wait are served on the loop too. /api/stream holds no thread per
+client. /api/history waits for its download as a coroutine, one download per
+code and range however many clients ask. Every other route only reads
+collector snapshots and is answered by the Flask app on a small thread pool.
+"""
+import asyncio
+import contextlib
+import os
+import time
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+import app as wsgi
+import async_upstream
+from stream import StreamClient
+
+# Threads for the routes served by the Flask app; they only read snapshots,
+# so a few go a long way
+WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', '16'))
+
+collector = wsgi.collector
+
+
+class Changes:
+    """Wakes the /api/stream coroutines when the collector publishes, which
+    may happen on any thread."""
+
+    def __init__(self):
+        self.loop = None
+        self.event = None
+
+    def bind(self, loop):
+        self.loop = loop
+        self.event = asyncio.Event()
+
+    def notify(self):
+        try:
+            self.loop.call_soon_threadsafe(self._fire)
+        except RuntimeError:
+            pass  # the loop has closed
+
+    def _fire(self):
+        self.event.set()
+        self.event = asyncio.Event()
+
+    async def wait(self, version, timeout):
+        # collector.wait() for coroutines
+        event = self.event
+        if collector.version == version:
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return collector.version
+
+
+changes = Changes()
+
+
+async def get_stream(request):
+    # The same events as the WSGI /api/stream
+    async def events():
+        client = StreamClient()
+        while True:
+            version = collector.version
+            if collector.background:
+                # Read on the loop thread, snapshots() never fetches inline
+                snapshots = collector.snapshots(wsgi.STREAM_SOURCES)
+            else:
+                snapshots = await asyncio.to_thread(collector.snapshots, wsgi.STREAM_SOURCES)
+            for message in wsgi.stream_messages(client, snapshots):
+                yield message
+            timeout = wsgi.STREAM_KEEPALIVE if collector.background else 1
+            if await changes.wait(version, timeout) == version:
+                yield ': keep-alive\n\n'
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return StreamingResponse(events(), media_type='text/event-stream', headers=headers)
+
+
+_history_loads = {}
+
+
+async def get_history(request):
+    code = request.path_params['code']
+    try:
+        params = wsgi.history_params(request.query_params)
+    except ValueError as e:
+        return JSONResponse(wsgi.history_params_error(e), status_code=400)
+    bars = wsgi.history_bars.peek(code, *params)
+    if bars is None:
+        # One thread per code, range, resolution and point count, however
+        # many requests wait on it
+        key = (code, *params)
+        task = _history_loads.get(key)
+        if task is None:
+            task = _history_loads[key] = asyncio.ensure_future(asyncio.to_thread(wsgi.history_bars, code, *params))
+            task.add_done_callback(lambda _: _history_loads.pop(key, None))
+        bars = await asyncio.shield(task)
+    if 'error' in bars:
+        return JSONResponse(bars)
+    return JSONResponse(wsgi.history_json(bars))
+
+
+def timed(rule, endpoint):
+    # Record the route_seconds metric the WSGI app records for its routes
+    async def handler(request):
+        started = time.perf_counter()
+        response = await endpoint(request)
+        wsgi.route_seconds.observe(time.perf_counter() - started, rule, request.method, str(response.status_code))
+        return response
+    return handler
+
+
+@contextlib.asynccontextmanager
+async def lifespan(_):
+    loop = asyncio.get_running_loop()
+    changes.bind(loop)
+    collector.add_listener(changes.notify)
+    collector.run_on(loop)
+    collector.start()
+    yield
+    collector.stop()
+    await async_upstream.aclose()
+
+
+app = Starlette(
+    routes=[
+        Route('/api/stream', timed('/api/stream', get_stream)),
+        Route('/api/history/{code:path}', timed('/api/history/<path:code>', get_history)),
+        Mount('/', WSGIMiddleware(wsgi.app, workers=WSGI_THREADS)),
+    ],
+    lifespan=lifespan,
+)
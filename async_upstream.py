@@ -0,0 +1,118 @@
+"""upstream.get for the event loop (ASGI mode, asgi.py), on httpx.AsyncClient.
+
+Same per-host timeouts, retries, circuit breakers, metrics, recording and
+UPSTREAM_OVERRIDE as upstream.get, and the same return type: the httpx
+response is turned into a requests.Response and httpx errors into their
+requests counterparts, so the parsing code and the `except` clauses of the
+sync fetchers work unchanged on what this returns.
+
+httpx is only imported when the first call is made, so the WSGI app does not
+need it installed.
+"""
+import asyncio
+import random
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+import recorder
+import upstream
+from breaker import CircuitOpen
+
+_clients = {}
+
+
+def _client():
+    # One client (and connection pool) per event loop
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        import httpx
+        limits = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+        client = _clients[loop] = httpx.AsyncClient(headers=dict(upstream.session.headers), limits=limits)
+    return client
+
+
+async def aclose():
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def get(url, params=None, headers=None, timeout=None, retries=None):
+    tape = upstream.tape
+    if isinstance(tape, recorder.Player):
+        return await asyncio.to_thread(tape.get, url, params)
+    import httpx
+    host = urlsplit(url).hostname
+    if timeout is None:
+        timeout = upstream.HOST_TIMEOUTS.get(host, upstream.DEFAULT_TIMEOUT)
+    connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    if retries is None:
+        retries = upstream.HOST_RETRIES.get(host, upstream.DEFAULT_RETRIES)
+
+    request_url = url
+    if upstream.UPSTREAM_OVERRIDE:
+        request_url, headers = upstream._override(url, headers)
+
+    breaker = upstream.breakers.get(host)
+    for attempt in range(retries + 1):
+        last = attempt == retries
+        try:
+            breaker.before()
+        except CircuitOpen:
+            upstream.request_errors.inc(host, 'circuit_open')
+            raise
+        started = time.monotonic()
+        try:
+            r = await _client().get(request_url, params=params, headers=headers,
+                                    timeout=httpx.Timeout(read, connect=connect))
+        except (httpx.InvalidURL, httpx.UnsupportedProtocol) as e:
+            # Not the host's fault
+            breaker.release()
+            raise requests.exceptions.InvalidURL(str(e)) from e
+        except httpx.TransportError as e:
+            elapsed = time.monotonic() - started
+            error = _requests_error(e)
+            if tape is not None:
+                tape.record(url, params, elapsed, error=error)
+            upstream.request_seconds.observe(elapsed, host)
+            upstream.request_errors.inc(host, 'timeout' if isinstance(error, requests.Timeout) else 'connection')
+            breaker.failure()
+            if last:
+                raise error from e
+        except BaseException:
+            # Includes cancellation (asyncio.wait_for around the call): a
+            # half-open trial cut short must not keep the host's circuit shut
+            breaker.release()
+            raise
+        else:
+            elapsed = time.monotonic() - started
+            response = recorder.build_response(str(r.url), r.status_code, r.headers, r.content)
+            if tape is not None:
+                response = tape.record(url, params, elapsed, response=response)
+            upstream.request_seconds.observe(elapsed, host)
+            if r.content:
+                upstream.response_bytes.inc(host, amount=len(r.content))
+            if r.status_code >= 400:
+                upstream.request_errors.inc(host, 'status')
+            if r.status_code not in upstream.RETRY_STATUSES:
+                breaker.success()
+                return response
+            breaker.failure()
+            if last:
+                return response
+        await backoff(attempt)
+
+
+def _requests_error(e):
+    import httpx
+    if isinstance(e, httpx.TimeoutException):
+        return requests.Timeout(str(e) or type(e).__name__)
+    return requests.ConnectionError(str(e) or type(e).__name__)
+
+
+async def backoff(attempt, base=0.2, cap=2.0):
+    # upstream.backoff without blocking the loop
+    await asyncio.sleep(random.uniform(0, min(cap, base * 2 ** attempt)))
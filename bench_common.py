@@ -0,0 +1,47 @@
+import datetime
+import json
+import os
+import platform
+import subprocess
+
+# Every benchmark appends one JSON line here, so runs can be compared across
+# commits (e.g. `git stash; python bench_x.py; git stash pop; python bench_x.py`).
+RESULTS_FILE = os.environ.get('BENCH_RESULTS', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_results.jsonl'))
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def save_result(bench, results, path=None):
+    record = {
+        'bench': bench,
+        'at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'results': results,
+    }
+    with open(path or RESULTS_FILE, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+    return record
+
+
+def last_result(bench, path=None):
+    # The most recent saved record of `bench`, or None
+    try:
+        with open(path or RESULTS_FILE) as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return None
+    for line in reversed(lines):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.get('bench') == bench:
+            return record
+    return None
@@ -0,0 +1,300 @@
+"""Load test: M simulated dashboards polling the app under gunicorn, against stub upstreams.
+
+    python bench_load.py [--server wsgi|asgi] [--workers 2] [--threads 32] [--dashboards 50] [--duration 60]
+                         [--mix prices:5,depth:5,liquidations:5] [--streams 10]
+                         [--latency-ms 50] [--jitter-ms 20] [--failure-rate 0.05]
+                         [--collector-background 1] [--shared-snapshots 1] [--output load.json]
+
+Every dashboard polls each endpoint of the mix on its own interval (seconds),
+like the page's setInterval fallback, while --streams more tabs hold
+/api/stream open for the whole run, as the page does where it can. Under
+gunicorn gthread each open stream holds a thread, so the polling latencies
+show what the streams leave for everything else; streams past the app's cap
+(STREAM_MAX_CLIENTS) are answered 503 and counted as rejected.
+Reported per endpoint: p50/p95/p99 latency, throughput and errors; for the server: how far requests fell behind
+their schedule and CPU use per gunicorn worker (a worker near 100% of one core
+is saturated) and how many calls reached the stub upstreams, which with
+shared snapshots should not grow with --workers. Results are appended to bench_results.jsonl and, with
+--output, written to a file of their own.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from bench_common import save_result
+from stub_upstream_server import StubUpstreams
+
+ENDPOINTS = {
+    'prices': '/api/prices',
+    'depth': '/api/depth/btcusdt?bucket=10&levels=100',
+    'liquidations': '/api/liquidations',
+    'liquidation_summary': '/api/liquidations/summary',
+    'news': '/api/news',
+    'stablecoins': '/api/stablecoins',
+    'btc_history': '/api/history/BTCUSDT',
+}
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        name, _, interval = item.partition(':')
+        if name not in ENDPOINTS:
+            raise SystemExit(f"unknown endpoint {name!r}; one of {', '.join(ENDPOINTS)}")
+        mix[name] = float(interval or 5)
+    return mix
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_app(args, port, stub_url, data_dir):
+    env = dict(os.environ,
+               UPSTREAM_OVERRIDE=stub_url,
+               COLLECTOR_BACKGROUND=str(args.collector_background),
+               SHARED_SNAPSHOTS=str(args.shared_snapshots),
+               DEPTH_STREAM='0',
+               LIQUIDATION_STREAM='0',
+               HISTORY_DIR=os.path.join(data_dir, 'history'),
+               SNAPSHOT_DIR=os.path.join(data_dir, 'snapshots'))
+    if args.server == 'asgi':
+        cmd = [sys.executable, '-m', 'uvicorn', '--workers', str(args.workers), '--host', '127.0.0.1',
+               '--port', str(port), '--log-level', 'warning', 'asgi:app']
+    else:
+        cmd = [sys.executable, '-m', 'gunicorn', '--worker-class', 'gthread', '--workers', str(args.workers),
+               '--threads', str(args.threads), '--bind', f"127.0.0.1:{port}", '--log-level', 'warning', 'app:app']
+    return subprocess.Popen(cmd, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                            stdout=subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL)
+
+
+def wait_ready(base, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(base + '/api/prices', timeout=10).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise SystemExit("app did not come up")
+
+
+def worker_pids(master_pid):
+    # uvicorn with a single worker serves from the master process itself
+    try:
+        with open(f"/proc/{master_pid}/task/{master_pid}/children") as f:
+            return [int(pid) for pid in f.read().split()] or [master_pid]
+    except OSError:
+        return []
+
+
+def cpu_seconds(pid):
+    # utime + stime from /proc/<pid>/stat (Linux); None where unavailable
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class CpuSampler(threading.Thread):
+    def __init__(self, master_pid, interval=1.0):
+        super().__init__(name='cpu-sampler', daemon=True)
+        self.master_pid = master_pid
+        self.interval = interval
+        self.samples = {}
+        self.stop = threading.Event()
+
+    def run(self):
+        last = {}
+        while not self.stop.wait(self.interval):
+            for pid in worker_pids(self.master_pid):
+                now = cpu_seconds(pid)
+                if now is None:
+                    continue
+                if pid in last:
+                    self.samples.setdefault(pid, []).append((now - last[pid]) / self.interval)
+                last[pid] = now
+
+
+def dashboard(base, mix, started, stop_at, records, rng):
+    # One browser tab: each endpoint on its own fixed schedule, one request at a time
+    session = requests.Session()
+    due = {name: started + rng.uniform(0, interval) for name, interval in mix.items()}
+    while True:
+        name = min(due, key=due.get)
+        at = due[name]
+        if at >= stop_at:
+            return
+        delay = at - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        sent = time.time()
+        try:
+            r = session.get(base + ENDPOINTS[name], timeout=30)
+            r.content
+            ok = r.status_code == 200
+        except requests.RequestException:
+            ok = False
+        records.append((name, sent, time.time() - sent, ok, sent - at))
+        due[name] = at + mix[name]
+
+
+def stream_tab(base, started, stop_at, result):
+    # One browser tab on /api/stream: held open for the run, counting the events pushed
+    delay = started - time.time()
+    if delay > 0:
+        time.sleep(delay)
+    sent = time.time()
+    try:
+        with requests.get(base + '/api/stream', stream=True, timeout=(10, 60)) as r:
+            result['status'] = r.status_code
+            if r.status_code != 200:
+                return
+            for line in r.iter_lines():
+                if line.startswith(b'event:'):
+                    if 'first_event' not in result:
+                        result['first_event'] = time.time() - sent
+                    result['events'] = result.get('events', 0) + 1
+                if time.time() >= stop_at:
+                    return
+    except requests.RequestException:
+        result['error'] = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--server', choices=['wsgi', 'asgi'], default='wsgi',
+                        help='wsgi: gunicorn gthread app:app; asgi: uvicorn asgi:app')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=32, help='gunicorn threads per worker (wsgi)')
+    parser.add_argument('--dashboards', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=60)
+    parser.add_argument('--warmup', type=float, default=5, help='seconds excluded from the stats')
+    parser.add_argument('--mix', default='prices:5,depth:5,liquidations:5')
+    parser.add_argument('--streams', type=int, default=10, help='tabs holding /api/stream open')
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--jitter-ms', type=float, default=20)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--failure-mode', choices=['status', 'reset'], default='status')
+    parser.add_argument('--collector-background', type=int, choices=[0, 1], default=1,
+                        help='0: refresh on read, as on serverless deploys')
+    parser.add_argument('--shared-snapshots', type=int, choices=[0, 1], default=1,
+                        help='0: every worker refreshes every source itself')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    parser.add_argument('--verbose', action='store_true', help="show the app's log output")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    stub = StubUpstreams(port=0, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                         failure_rate=args.failure_rate, failure_mode=args.failure_mode).start()
+    data_dir = tempfile.mkdtemp(prefix='bench-load-data-')
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    server = start_app(args, port, stub.url, data_dir)
+    try:
+        wait_ready(base)
+        sampler = CpuSampler(server.pid)
+        sampler.start()
+
+        records = []
+        started = time.time() + 0.5
+        stop_at = started + args.duration
+        rng = random.Random(1)
+        tabs = [threading.Thread(target=dashboard, args=(base, mix, started, stop_at, records, random.Random(rng.random())),
+                                 daemon=True) for _ in range(args.dashboards)]
+        streams = [{} for _ in range(args.streams)]
+        stream_tabs = [threading.Thread(target=stream_tab, args=(base, started, stop_at, result), daemon=True)
+                       for result in streams]
+        for tab in stream_tabs + tabs:
+            tab.start()
+        for tab in tabs:
+            tab.join()
+        # A stream only notices the end with its next event or keep-alive
+        for tab in stream_tabs:
+            tab.join(max(stop_at + 20 - time.time(), 0))
+        sampler.stop.set()
+    finally:
+        server.terminate()
+        server.wait(10)
+        stub.stop()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    window_start = started + args.warmup
+    measured = [r for r in records if r[1] >= window_start]
+    span = max(stop_at - window_start, 1e-9)
+    endpoints = {}
+    for name in mix:
+        rows = [r for r in measured if r[0] == name]
+        latencies = sorted(r[2] for r in rows)
+        endpoints[name] = {
+            'requests': len(rows),
+            'errors': sum(1 for r in rows if not r[3]),
+            'rps': round(len(rows) / span, 2),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2) if rows else None,
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2) if rows else None,
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2) if rows else None,
+            'max_ms': round(latencies[-1] * 1000, 2) if rows else None,
+        }
+    first_events = sorted(s['first_event'] for s in streams if 'first_event' in s)
+    stream_stats = {
+        'clients': args.streams,
+        'open': sum(1 for s in streams if s.get('status') == 200),
+        'rejected': sum(1 for s in streams if s.get('status') == 503),
+        'errors': sum(1 for s in streams if s.get('error') or s.get('status') not in (200, 503)),
+        'events': sum(s.get('events', 0) for s in streams),
+        'first_event_p50_ms': round(percentile(first_events, 50) * 1000, 2) if first_events else None,
+        'first_event_max_ms': round(first_events[-1] * 1000, 2) if first_events else None,
+    }
+    lags = sorted(r[4] for r in measured)
+    worker_cpu = {str(pid): {'mean': round(sum(s) / len(s), 3), 'max': round(max(s), 3)}
+                  for pid, s in sampler.samples.items() if s}
+    results = {
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'verbose')},
+        'offered_rps': round(args.dashboards * sum(1 / interval for interval in mix.values()), 2),
+        'achieved_rps': round(len(measured) / span, 2),
+        'endpoints': endpoints,
+        'streams': stream_stats,
+        'schedule_lag_p95_ms': round(percentile(lags, 95) * 1000, 2) if lags else None,
+        'worker_cpu': worker_cpu,
+        'upstream_requests': stub.requests,
+        'upstream_failures': stub.failures,
+    }
+    record = save_result('load', results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(record, f, indent=2)
+
+    print(f"offered {results['offered_rps']} req/s, achieved {results['achieved_rps']} req/s, "
+          f"schedule lag p95 {results['schedule_lag_p95_ms']} ms")
+    for name, stats in endpoints.items():
+        print(f"{name:20} {stats}")
+    print(f"{'stream':20} {stream_stats}")
+    for pid, cpu in worker_cpu.items():
+        print(f"worker {pid}: cpu mean {cpu['mean']:.0%} max {cpu['max']:.0%}")
+    print(f"upstream requests {stub.requests}, injected failures {stub.failures}")
+
+
+if __name__ == '__main__':
+    main()
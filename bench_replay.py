@@ -0,0 +1,115 @@
+"""Time /api/prices, /api/history and /api/depth against recorded upstream responses.
+
+    python bench_replay.py --record --rounds 5     # capture live responses (needs network)
+    python bench_replay.py [--speed 0] [--rounds 20] [--profile]
+
+"cold" requests start from an empty collector, cache and history store, so
+they include fetching (replayed) and parsing; "warm" ones are served from
+memory. --speed 1 replays the recorded upstream latency, 0 skips it.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+
+def timed(client, path):
+    started = time.perf_counter()
+    r = client.get(path)
+    elapsed = time.perf_counter() - started
+    assert r.status_code == 200, f"{path}: {r.status_code}"
+    return elapsed
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        'mean_ms': round(statistics.mean(samples) * 1000, 2),
+        'p50_ms': round(samples[len(samples) // 2] * 1000, 2),
+        'max_ms': round(samples[-1] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--record', action='store_true', help='call the live upstreams and record them')
+    parser.add_argument('--archive', help='archive path (default: UPSTREAM_ARCHIVE)')
+    parser.add_argument('--speed', type=float, default=0)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--profile', action='store_true', help='print a cProfile of the cold requests')
+    args = parser.parse_args()
+
+    # The app reads these at import time
+    history_dir = tempfile.mkdtemp(prefix='bench-history-')
+    os.environ.update({
+        'UPSTREAM_MODE': 'record' if args.record else 'replay',
+        'UPSTREAM_REPLAY_SPEED': str(args.speed),
+        'COLLECTOR_BACKGROUND': '0',
+        'DEPTH_STREAM': '0',
+        'LIQUIDATION_STREAM': '0',
+        'HISTORY_DIR': history_dir,
+        'SHARED_SNAPSHOTS': '0',
+    })
+    if args.archive:
+        os.environ['UPSTREAM_ARCHIVE'] = args.archive
+
+    import app
+    import cache
+    from bench_common import save_result
+
+    client = app.app.test_client()
+    history_codes = [s.code for s in app.symbols.visible if s.history]
+    paths = {
+        'prices': '/api/prices',
+        'depth': '/api/depth/btcusdt?bucket=10&levels=100',
+    }
+    for code in history_codes:
+        paths[f"history:{code}"] = f"/api/history/{code}"
+
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+
+    cold = {name: [] for name in paths}
+    warm = {name: [] for name in paths}
+    try:
+        for _ in range(args.rounds):
+            app.collector.reset()
+            cache.clear_all()
+            shutil.rmtree(history_dir, ignore_errors=True)
+            if profiler:
+                profiler.enable()
+            for name, path in paths.items():
+                cold[name].append(timed(client, path))
+            if profiler:
+                profiler.disable()
+            for name, path in paths.items():
+                warm[name].append(timed(client, path))
+            if args.record:
+                time.sleep(5)
+    finally:
+        shutil.rmtree(history_dir, ignore_errors=True)
+
+    if args.record:
+        app.upstream.tape.close()
+        print(f"Recorded {app.upstream.tape.count} responses to {app.upstream.tape.path}")
+        return
+
+    results = {'rounds': args.rounds, 'speed': args.speed, 'archive_misses': app.upstream.tape.misses}
+    for name in paths:
+        results[name] = {'cold': summarize(cold[name]), 'warm': summarize(warm[name])}
+    save_result('replay', results)
+    for name in paths:
+        print(f"{name:24} cold {results[name]['cold']}  warm {results[name]['warm']}")
+    print(f"archive misses: {results['archive_misses']}")
+
+    if profiler:
+        import pstats
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
+
+
+if __name__ == '__main__':
+    main()
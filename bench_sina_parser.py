@@ -0,0 +1,68 @@
+"""Throughput of sina_parser.parse on a generated 5,000-symbol hq.sinajs.cn response.
+
+    python bench_sina_parser.py [--symbols 5000] [--rounds 50]
+"""
+import argparse
+import random
+import time
+
+import sina_parser
+from bench_common import save_result
+
+
+def make_payload(n_symbols, seed=1):
+    # Lines shaped like the real feed (field counts and positions per market)
+    rng = random.Random(seed)
+    lines = []
+    for i in range(n_symbols):
+        kind = i % 5
+        p = rng.uniform(1, 500)
+        if kind == 0:
+            code = f"sh{600000 + i:06d}"
+            values = ['贵州茅台', f"{p:.2f}", f"{p * 0.99:.2f}", f"{p:.2f}", f"{p * 1.01:.2f}", f"{p * 0.98:.2f}"] + ['0'] * 24 + ['2026-01-08', '15:00:00', '00']
+        elif kind == 1:
+            code = f"hk{i:05d}"
+            values = ['MEITUAN-W', '美团-W', f"{p:.3f}", f"{p * 0.99:.3f}", f"{p * 1.01:.3f}", f"{p * 0.98:.3f}", f"{p:.3f}"] + ['0'] * 10 + ['2026/01/08', '16:08']
+        elif kind == 2:
+            code = f"gb_s{i}"
+            values = ['Circle', f"{p:.2f}", '1.20', '2026-01-08 09:30:00'] + ['0'] * 22 + [f"{p * 0.99:.2f}"] + ['0'] * 9
+        elif kind == 3:
+            code = f"hf_F{i}"
+            values = [f"{p:.1f}", '', f"{p:.1f}", f"{p:.1f}", f"{p * 1.01:.1f}", f"{p * 0.98:.1f}", '22:52:54', f"{p * 0.99:.1f}", f"{p:.1f}", '0', '0', '0', '2026-01-08', '纽约黄金']
+        else:
+            code = f"fx_s{i}"
+            values = ['22:52:54', f"{p:.4f}", f"{p:.4f}", f"{p * 0.99:.4f}"] + ['0'] * 13 + ['2026-01-08']
+        lines.append(f'var hq_str_{code}="{",".join(values)}";')
+    return '\n'.join(lines).encode('gb18030')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--symbols', type=int, default=5000)
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    payload = make_payload(args.symbols)
+    quotes = sina_parser.parse(payload)
+    assert len(quotes) == args.symbols, f"parsed {len(quotes)} of {args.symbols}"
+
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        sina_parser.parse(payload)
+    elapsed = time.perf_counter() - started
+
+    per_parse = elapsed / args.rounds
+    results = {
+        'symbols': args.symbols,
+        'payload_bytes': len(payload),
+        'ms_per_parse': round(per_parse * 1000, 3),
+        'records_per_sec': round(args.symbols / per_parse),
+        'mb_per_sec': round(len(payload) / per_parse / 1e6, 2),
+    }
+    save_result('sina_parser', results)
+    for key, value in results.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == '__main__':
+    main()
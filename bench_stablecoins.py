@@ -0,0 +1,96 @@
+"""Peak memory and parse time of the stablecoin summary: streaming vs json.load.
+
+    curl -o data/stablecoins.json 'https://stablecoins.llama.fi/stablecoins?includePrices=true'
+    python bench_stablecoins.py [--payload data/stablecoins.json] [--rounds 5]
+
+Without --payload a generated document of the same shape is used.
+"""
+import argparse
+import io
+import json
+import random
+import time
+import tracemalloc
+
+import stablecoins
+from bench_common import save_result
+
+
+def make_payload(n_assets=350, n_chains=60, seed=1):
+    # peggedAssets entries with per-chain breakdowns, which make up most of
+    # the real document and which the summary never reads
+    rng = random.Random(seed)
+    assets = []
+    for i in range(n_assets):
+        symbol = 'USDT' if i == 0 else 'USDC' if i == 1 else f"S{i}"
+        circ = rng.uniform(1e5, 1e11)
+        chains = {
+            f"Chain{c}": {
+                'current': {'peggedUSD': rng.uniform(0, circ / n_chains)},
+                'circulatingPrevDay': {'peggedUSD': rng.uniform(0, circ / n_chains)},
+                'circulatingPrevWeek': {'peggedUSD': rng.uniform(0, circ / n_chains)},
+                'circulatingPrevMonth': {'peggedUSD': rng.uniform(0, circ / n_chains)},
+            }
+            for c in range(rng.randint(1, n_chains))
+        }
+        assets.append({
+            'id': str(i), 'name': f"Stablecoin {i}", 'symbol': symbol, 'gecko_id': f"coin-{i}",
+            'pegType': 'peggedUSD', 'priceSource': 'defillama', 'pegMechanism': 'fiat-backed',
+            'circulating': {'peggedUSD': circ},
+            'circulatingPrevDay': {'peggedUSD': circ * rng.uniform(0.98, 1.02)},
+            'circulatingPrevWeek': {'peggedUSD': circ * rng.uniform(0.95, 1.05)},
+            'circulatingPrevMonth': {'peggedUSD': circ * rng.uniform(0.9, 1.1)},
+            'chainCirculating': chains,
+            'chains': list(chains),
+            'price': rng.uniform(0.99, 1.01),
+        })
+    return json.dumps({'peggedAssets': assets, 'chains': []}).encode()
+
+
+def measure(payload, rounds):
+    tracemalloc.start()
+    result = stablecoins.summarize(stablecoins.iter_assets(io.BytesIO(payload)))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        stablecoins.summarize(stablecoins.iter_assets(io.BytesIO(payload)))
+    elapsed = (time.perf_counter() - started) / rounds
+    return result, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--payload', help='saved copy of the stablecoins response')
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.payload:
+        with open(args.payload, 'rb') as f:
+            payload = f.read()
+    else:
+        payload = make_payload()
+
+    results = {'payload': args.payload or 'generated', 'payload_bytes': len(payload)}
+    backend = stablecoins.ijson
+    modes = [('json_load', None)]
+    if backend is not None:
+        modes.append((f"stream_{backend.backend}", backend))
+    summaries = []
+    for label, module in modes:
+        stablecoins.ijson = module
+        summary, peak, elapsed = measure(payload, args.rounds)
+        summaries.append(summary)
+        results[f"{label}_peak_mb"] = round(peak / 1e6, 2)
+        results[f"{label}_ms"] = round(elapsed * 1000, 1)
+    stablecoins.ijson = backend
+    assert all(s == summaries[0] for s in summaries), "parsers disagree"
+
+    save_result('stablecoins', results)
+    for key, value in results.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == '__main__':
+    main()
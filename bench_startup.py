@@ -0,0 +1,169 @@
+"""Cold start: import time and time to the first response of each route, in fresh processes.
+
+    python bench_startup.py [--routes /,/api/prices] [--rounds 5] [--importtime]
+                            [--tolerance 0.25] [--output startup.json]
+
+Each measurement runs a new interpreter configured like the serverless deploy
+(vercel.json, VERCEL=1: no background refresh, no streams): import app, then
+one request through the Flask test client. Upstreams are the local stubs with
+no added latency, so the time is our own startup work. Reported per route:
+median import time, median time to the first response, and which heavy
+modules (numpy, pandas, yfinance) were loaded by then.
+
+Results are compared with the previous run in bench_results.jsonl; a route
+whose first response got slower by more than --tolerance (and 20 ms) is
+reported and the exit status is 1, so a cold-start regression fails CI.
+--importtime lists the slowest imports of `import app` (python -X importtime).
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from bench_common import last_result, save_result
+from stub_upstream_server import StubUpstreams
+
+ROUTES = [
+    '/',
+    '/api/prices',
+    '/api/depth/btcusdt',
+    '/api/liquidations',
+    '/api/liquidations/summary',
+    '/api/news',
+    '/api/stablecoins',
+    '/api/history/BTCUSDT',
+    '/api/analytics/BTCUSDT',
+    '/api/collector',
+    '/metrics',
+]
+
+HEAVY_MODULES = ('numpy', 'pandas', 'yfinance')
+
+# Runs in the fresh interpreter; prints one JSON line
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+heavy = [m for m in {heavy!r} if m in sys.modules]
+r = app.app.test_client().get({route!r})
+r.get_data()
+done = time.perf_counter()
+print(json.dumps({{
+    'import_ms': (imported - started) * 1000,
+    'first_ms': (done - imported) * 1000,
+    'status': r.status_code,
+    'heavy_at_import': heavy,
+    'heavy_after': [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def run_child(route, env):
+    code = CHILD.format(route=route, heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)), timeout=120)
+    if out.returncode != 0:
+        raise SystemExit(f"{route}: the child failed\n{out.stderr[-2000:]}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def child_env(stub_url):
+    # A fresh history directory per process: serverless instances start empty
+    return dict(os.environ, VERCEL='1', UPSTREAM_OVERRIDE=stub_url, UPSTREAM_MODE='live',
+                HISTORY_DIR=tempfile.mkdtemp(prefix='bench-startup-history-'))
+
+
+def import_profile(env, top=15):
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], env=env,
+                         capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace('import time:', '|').split('|')]
+        rows.append((int(cumulative_us), int(self_us), name))
+    return sorted(rows, reverse=True)[:top]
+
+
+def regressions(routes, previous, tolerance):
+    slower = {}
+    for route, stats in routes.items():
+        before = (previous or {}).get('routes', {}).get(route)
+        if not before:
+            continue
+        grown = stats['first_ms'] - before['first_ms']
+        if grown > 20 and grown > before['first_ms'] * tolerance:
+            slower[route] = {'before_ms': before['first_ms'], 'now_ms': stats['first_ms']}
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--routes', help='comma-separated, default: ' + ','.join(ROUTES))
+    parser.add_argument('--rounds', type=int, default=5, help='fresh processes per route')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--importtime', action='store_true', help='list the slowest imports')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    args = parser.parse_args()
+    routes = args.routes.split(',') if args.routes else ROUTES
+
+    stub = StubUpstreams(port=0, latency_ms=0).start()
+    history_dirs = []
+    try:
+        results = {}
+        imports = []
+        for route in routes:
+            samples = []
+            for _ in range(args.rounds):
+                env = child_env(stub.url)
+                history_dirs.append(env['HISTORY_DIR'])
+                samples.append(run_child(route, env))
+            imports += [s['import_ms'] for s in samples]
+            results[route] = {
+                'status': samples[-1]['status'],
+                'import_ms': round(statistics.median(s['import_ms'] for s in samples), 1),
+                'first_ms': round(statistics.median(s['first_ms'] for s in samples), 1),
+                'heavy_after': samples[-1]['heavy_after'],
+            }
+            heavy_at_import = samples[-1]['heavy_at_import']
+            print(f"{route:28} status {results[route]['status']}  import {results[route]['import_ms']:7.1f} ms  "
+                  f"first response {results[route]['first_ms']:7.1f} ms  heavy: {', '.join(results[route]['heavy_after']) or '-'}")
+        profile = import_profile(child_env(stub.url)) if args.importtime else None
+    finally:
+        stub.stop()
+        for directory in history_dirs:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    previous = last_result('startup')
+    summary = {
+        'config': {'rounds': args.rounds},
+        'import_ms': round(statistics.median(imports), 1),
+        'heavy_at_import': heavy_at_import,
+        'routes': results,
+    }
+    slower = regressions(results, previous and previous['results'], args.tolerance)
+    summary['regressions'] = slower
+    record = save_result('startup', summary)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(record, f, indent=2)
+
+    print(f"import app: {summary['import_ms']} ms median; heavy modules at import: {', '.join(heavy_at_import) or 'none'}")
+    if profile:
+        print("slowest imports (cumulative ms, self ms):")
+        for cumulative, self_us, name in profile:
+            print(f"  {cumulative / 1000:8.1f} {self_us / 1000:8.1f}  {name}")
+    if slower:
+        for route, change in slower.items():
+            print(f"REGRESSION {route}: first response {change['before_ms']} -> {change['now_ms']} ms "
+                  f"(previous run {previous['commit']})")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
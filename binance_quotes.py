@@ -0,0 +1,127 @@
+import json
+import threading
+
+import async_upstream
+import upstream
+
+TICKER_URL = "https://api.binance.com/api/v3/ticker/24hr"
+PRICE_URL = "https://api.binance.com/api/v3/ticker/price"
+
+# Above this many symbols the full 24hr ticker costs Binance the same request
+# weight as a symbols= list and keeps the URL short
+FULL_TICKER_THRESHOLD = 100
+
+# Binance answers a symbols= list containing any unknown symbol with
+# 400 {"code": -1121, "msg": "Invalid symbol."} for the whole batch
+INVALID_SYMBOL = -1121
+
+
+class QuoteEngine:
+    """Price and 24h stats for any number of Binance spot symbols in one
+    request per refresh.
+
+    `aliases` maps a code to the exchange symbols it has traded under, e.g.
+    {'POLUSDT': ['MATICUSDT']}. When a batch is rejected for an unknown
+    symbol, the listed symbols are looked up once, each code is pointed at the
+    first of its names that is listed and that choice is remembered, so later
+    refreshes are a single request again.
+
+    afetch is fetch for the event loop (ASGI mode); both share the request
+    building and parsing below.
+    """
+
+    def __init__(self, aliases=None):
+        self.aliases = aliases or {}
+        self.resolved = {}
+        self._lock = threading.Lock()
+
+    def symbol_for(self, code):
+        return self.resolved.get(code, code)
+
+    def fetch(self, codes):
+        # {code: {'price': last, 'prev_close': prev}} for the codes Binance knows
+        if not codes:
+            return {}
+        tickers = self._tickers(codes)
+        if tickers is None:
+            self._resolve(codes)
+            tickers = self._tickers(codes)
+            if tickers is None:
+                return {}
+        return self._quotes(codes, tickers)
+
+    async def afetch(self, codes):
+        if not codes:
+            return {}
+        tickers = await self._atickers(codes)
+        if tickers is None:
+            self._resolve_from(codes, await async_upstream.get(PRICE_URL))
+            tickers = await self._atickers(codes)
+            if tickers is None:
+                return {}
+        return self._quotes(codes, tickers)
+
+    def _quotes(self, codes, tickers):
+        results = {}
+        for code in codes:
+            ticker = tickers.get(self.symbol_for(code))
+            if ticker is None:
+                continue
+            price = float(ticker['lastPrice'])
+            prev_close = float(ticker.get('prevClosePrice') or 0) or price
+            results[code] = {'price': price, 'prev_close': prev_close}
+        return results
+
+    def _listed(self, codes):
+        # The exchange symbols to ask for, and the ticker request's params
+        listed = [self.symbol_for(code) for code in codes]
+        listed = [s for s in dict.fromkeys(listed) if s is not None]
+        if len(listed) > FULL_TICKER_THRESHOLD:
+            return listed, None
+        return listed, {'symbols': json.dumps(listed, separators=(',', ':'))}
+
+    def _tickers(self, codes):
+        # {exchange symbol: ticker}, or None if the batch has an unknown symbol
+        listed, params = self._listed(codes)
+        if not listed:
+            return {}
+        return _parse_tickers(upstream.get(TICKER_URL, params=params), listed)
+
+    async def _atickers(self, codes):
+        listed, params = self._listed(codes)
+        if not listed:
+            return {}
+        return _parse_tickers(await async_upstream.get(TICKER_URL, params=params), listed)
+
+    def _resolve(self, codes):
+        # One call listing every symbol's price tells which names exist
+        self._resolve_from(codes, upstream.get(PRICE_URL))
+
+    def _resolve_from(self, codes, r):
+        r.raise_for_status()
+        exchange = {t['symbol'] for t in r.json()}
+        with self._lock:
+            for code in codes:
+                names = [code] + list(self.aliases.get(code, ()))
+                found = next((name for name in names if name in exchange), None)
+                if found is None:
+                    print(f"Binance symbol not listed: {code}")
+                elif found != code:
+                    print(f"Binance symbol {code} trades as {found}")
+                # None drops the code from later batches instead of failing them
+                self.resolved[code] = found
+
+
+def _parse_tickers(r, listed):
+    if r.status_code == 400 and _error_code(r) == INVALID_SYMBOL:
+        return None
+    r.raise_for_status()
+    wanted = set(listed)
+    return {t['symbol']: t for t in r.json() if t['symbol'] in wanted}
+
+
+def _error_code(r):
+    try:
+        return r.json().get('code')
+    except ValueError:
+        return None
@@ -0,0 +1,112 @@
+import threading
+import time
+
+import requests
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpen(requests.ConnectionError):
+    # Raised instead of calling a host that is known to be down. A subclass of
+    # ConnectionError so every existing "upstream unreachable" path (fallbacks,
+    # stale snapshots) handles it without changes.
+    pass
+
+
+class Breaker:
+    """Circuit breaker for one upstream host.
+
+    closed: calls go through; `threshold` consecutive failures open it.
+    open: calls fail at once with CircuitOpen for `cooldown` seconds.
+    half_open: after the cooldown a single trial call goes through (others
+    still fail fast); its success closes the circuit, its failure re-opens it
+    with the cooldown doubled, up to `max_cooldown`.
+    """
+
+    def __init__(self, host, threshold=3, cooldown=30, max_cooldown=300):
+        self.host = host
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.cooldown = cooldown
+        self.opened_at = 0
+        self.rejected = 0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def before(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and time.time() - self.opened_at >= self.cooldown:
+                self.state = HALF_OPEN
+                self._trial = False
+            if self.state == HALF_OPEN and not self._trial:
+                self._trial = True
+                return
+            self.rejected += 1
+            retry_in = max(self.cooldown - (time.time() - self.opened_at), 0)
+            raise CircuitOpen(f"{self.host} is unavailable (circuit open, retry in {retry_in:.0f}s)")
+
+    def success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.cooldown = self.base_cooldown
+            self._trial = False
+
+    def release(self):
+        # The call ended without telling anything about the host
+        with self._lock:
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+                self._open()
+            elif self.state == CLOSED and self.failures >= self.threshold:
+                self._open()
+
+    def _open(self):
+        if self.state != OPEN:
+            print(f"Circuit for {self.host} opened after {self.failures} failures, cooling down {self.cooldown}s")
+        self.state = OPEN
+        self.opened_at = time.time()
+        self._trial = False
+
+    def status(self):
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'cooldown': self.cooldown,
+            'opened_at': self.opened_at or None,
+            'rejected': self.rejected,
+        }
+
+
+class Breakers:
+    # One Breaker per host, created on first use with that host's settings
+    def __init__(self, thresholds=None, cooldowns=None, threshold=3, cooldown=30):
+        self.thresholds = thresholds or {}
+        self.cooldowns = cooldowns or {}
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, host):
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(host, Breaker(
+                    host, self.thresholds.get(host, self.threshold), self.cooldowns.get(host, self.cooldown)))
+        return breaker
+
+    def status(self):
+        return {host: breaker.status() for host, breaker in self._breakers.items()}
@@ -0,0 +1,210 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+# Every cache by name, for stats reporting
+caches = {}
+
+
+class Entry:
+    # `rejected`: a result `accept` turned down, kept for error_ttl only
+    __slots__ = ('value', 'stored_at', 'rejected')
+
+    def __init__(self, value, stored_at, rejected=False):
+        self.value = value
+        self.stored_at = stored_at
+        self.rejected = rejected
+
+
+class Flight:
+    # One inline load in progress; concurrent misses for its key wait on it
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class Cache:
+    """Bounded key -> value cache with a TTL and stale-while-revalidate.
+
+    Younger than `ttl`: served as is. Older, but within `stale_ttl` more:
+    served as is while one background call to the loader replaces it. Older
+    than that, or missing: loaded inline, once: concurrent misses for the same
+    key wait for that load and share its result (or exception). At most
+    `max_size` keys are kept, least recently used first out.
+
+    Loader results `accept` rejects (by default empty ones, which is how the
+    fetchers report failure) are returned but not stored, so the last good
+    value keeps being served. With `error_ttl`, a rejected result for a key
+    with no good value left is served for that many seconds instead of
+    calling the loader again for every request.
+    """
+
+    def __init__(self, name, ttl, stale_ttl=0, max_size=128, accept=bool, error_ttl=0):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        self.accept = accept
+        self.error_ttl = error_ttl
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.evictions = 0
+        caches[name] = self
+
+    def get(self, key, loader):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry.stored_at
+                if entry.rejected:
+                    if age < self.error_ttl:
+                        self._entries.move_to_end(key)
+                        self.negative_hits += 1
+                        return entry.value
+                elif age < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.value
+                elif age < self.ttl + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        threading.Thread(target=self._revalidate, args=(key, loader),
+                                         name=f"cache-{self.name}", daemon=True).start()
+                    return entry.value
+            flight = self._flights.get(key)
+            loading = flight is None
+            if loading:
+                self.misses += 1
+                flight = self._flights[key] = Flight()
+            else:
+                self.coalesced += 1
+        if not loading:
+            return flight.wait()
+        try:
+            flight.value = loader()
+            self._store(key, flight.value)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.value
+
+    def peek(self, key):
+        """The value for `key` if it can be served without calling the loader
+        (fresh, or a rejected one within error_ttl), else None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            age = time.time() - entry.stored_at
+            if age < (self.error_ttl if entry.rejected else self.ttl):
+                self._entries.move_to_end(key)
+                if entry.rejected:
+                    self.negative_hits += 1
+                else:
+                    self.hits += 1
+                return entry.value
+            return None
+
+    def _revalidate(self, key, loader):
+        try:
+            self._store(key, loader())
+            self.refreshes += 1
+        except Exception as e:
+            self.refresh_errors += 1
+            print(f"Cache {self.name}: refreshing {key!r} failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _store(self, key, value):
+        accepted = self.accept(value)
+        if not accepted and not self.error_ttl:
+            return
+        with self._lock:
+            now = time.time()
+            if not accepted:
+                entry = self._entries.get(key)
+                if entry is not None and not entry.rejected and now - entry.stored_at < self.ttl + self.stale_ttl:
+                    return  # still a good value to serve
+            self._entries[key] = Entry(value, now, rejected=not accepted)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        # Every lookup but a miss was answered without calling the loader
+        lookups = self.hits + self.stale_hits + self.negative_hits + self.coalesced + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'stale_ttl': self.stale_ttl,
+            'error_ttl': self.error_ttl,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'hit_ratio': round(1 - self.misses / lookups, 3) if lookups else None,
+            'refreshes': self.refreshes,
+            'refresh_errors': self.refresh_errors,
+            'evictions': self.evictions,
+        }
+
+
+def cached(ttl, stale_ttl=0, max_size=128, accept=bool, error_ttl=0, name=None):
+    """Decorator: cache `fn` per positional/keyword arguments (see Cache)."""
+    def decorate(fn):
+        cache = Cache(name or fn.__name__, ttl, stale_ttl, max_size, accept, error_ttl)
+
+        def key(args, kwargs):
+            return (args, tuple(sorted(kwargs.items()))) if kwargs else args
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return cache.get(key(args, kwargs), lambda: fn(*args, **kwargs))
+
+        wrapper.cache = cache
+        wrapper.peek = lambda *args, **kwargs: cache.peek(key(args, kwargs))
+        return wrapper
+    return decorate
+
+
+def clear_all():
+    for cache in caches.values():
+        cache.clear()
+
+
+def stats():
+    return {name: cache.stats() for name, cache in caches.items()}
@@ -0,0 +1,356 @@
+import asyncio
+import os
+import threading
+import time
+
+import metrics
+from fanout import FanOut, Result
+
+fetch_seconds = metrics.histogram('collector_fetch_seconds', 'Duration of each source refresh (the fetch_* functions)', ['source'])
+fetch_outcomes = metrics.counter('collector_fetch_total', 'Source refreshes by outcome: ok, empty, timeout, error', ['source', 'outcome'])
+leader_gauge = metrics.gauge('collector_leader', '1 in the worker that refreshes the sources for all workers (shared snapshots)')
+shared_loads = metrics.counter('collector_shared_loads_total', 'Snapshots loaded from the shared directory, written by another worker', ['source'])
+
+# How often a worker that is not the leader checks the shared snapshot files
+# for changes (and tries to take over the leader lock)
+SHARED_POLL_INTERVAL = 0.25
+
+
+class Snapshot:
+    # One published value of a source. `version` is global across sources and
+    # only ever grows, so a reader can tell "has anything changed" cheaply.
+    # `status` is 'ok', or 'stale' when the latest refresh missed its deadline
+    # or failed and `data` is the previous good value.
+    __slots__ = ('version', 'data', 'updated_at', 'status')
+
+    def __init__(self, version, data, updated_at, status='ok'):
+        self.version = version
+        self.data = data
+        self.updated_at = updated_at
+        self.status = status
+
+
+class Source:
+    # `afetch`: optional coroutine function doing what `fetch` does without
+    # blocking, used when the collector refreshes on an event loop.
+    # `accept(data)`: whether a result is a good one (default: not empty)
+    __slots__ = ('name', 'fetch', 'interval', 'deadline', 'afetch', 'accept')
+
+    def __init__(self, name, fetch, interval, deadline, afetch=None, accept=bool):
+        self.name = name
+        self.fetch = fetch
+        self.interval = interval
+        self.deadline = deadline
+        self.afetch = afetch
+        self.accept = accept
+
+
+class Collector:
+    """Refreshes each registered source on its own schedule in the background
+    and keeps the latest good value of every source in memory.
+
+    Routes read from here instead of calling upstreams, so the upstream load is
+    one request per source per interval no matter how many clients poll.
+    With `shared` (a shared_snapshots.SharedSnapshots) that holds across
+    worker processes too: only the leader worker refreshes, the others load
+    what it publishes.
+
+    Under ASGI (asgi.py) the refreshes run on the server's event loop instead
+    of a thread per source; see run_on.
+    """
+
+    def __init__(self, background=True, shared=None):
+        self.background = background
+        self.shared = shared
+        self._sources = {}
+        self._snapshots = {}
+        self._views = {}
+        self._version = 0
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._refresh_locks = {}
+        self._listeners = []
+        self._started = False
+        self._stop = threading.Event()
+        self._pool = FanOut(16, 'collector')
+        self.loop = None
+        self._loop_thread = None
+
+    def register(self, name, fetch, interval, deadline=10, afetch=None, accept=bool):
+        self._sources[name] = Source(name, fetch, interval, deadline, afetch, accept)
+        self._refresh_locks[name] = threading.Lock()
+
+    def run_on(self, loop):
+        """Refresh on `loop` (call from its thread, before start()): sources
+        with an `afetch` are awaited, the others run on a worker thread.
+        Reads made on the loop thread never fetch inline, so they never
+        block it; they see the last published values."""
+        self.loop = loop
+        self._loop_thread = threading.get_ident()
+
+    def add_listener(self, fn):
+        # fn() is called after every publish, from the publishing thread
+        self._listeners.append(fn)
+
+    def start(self):
+        # Threads are started lazily from the first read so that each gunicorn
+        # worker starts its own after the fork.
+        with self._lock:
+            if self._started or not self.background:
+                return
+            self._started = True
+        if self.shared is not None:
+            threading.Thread(target=self._follow, name='collector-shared', daemon=True).start()
+            return
+        self._start_refreshing()
+
+    def _start_refreshing(self):
+        for source in self._sources.values():
+            if self.loop is not None:
+                asyncio.run_coroutine_threadsafe(self._arun(source), self.loop)
+                continue
+            t = threading.Thread(target=self._run, args=(source,), name=f"collector-{source.name}", daemon=True)
+            t.start()
+
+    def _follow(self):
+        # Load what the leader publishes until this worker becomes the leader
+        # (the first to try, or the next one after the leader exits)
+        while not self._stop.is_set():
+            if self.shared.try_lead():
+                leader_gauge.set(1)
+                print(f"Collector: worker {os.getpid()} refreshes the shared snapshots")
+                self._start_refreshing()
+                return
+            self._load_shared(self._sources)
+            self._stop.wait(SHARED_POLL_INTERVAL)
+
+    def _load_shared(self, names, fresh_only=False):
+        now = time.time()
+        for name in names:
+            found = self.shared.read(name)
+            if found is None:
+                continue
+            payload, written_at = found
+            if fresh_only and now - written_at > self._sources[name].interval:
+                continue  # not refreshed lately (or left over from an earlier run)
+            shared_loads.inc(name)
+            self.publish(name, payload['data'], status=payload['status'], updated_at=payload['updated_at'], share=False)
+
+    @property
+    def role(self):
+        if self.shared is None:
+            return 'standalone'
+        return 'leader' if self.shared.is_leader else 'follower'
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, source):
+        while not self._stop.is_set():
+            started = time.time()
+            self.refresh(source.name)
+            elapsed = time.time() - started
+            self._stop.wait(max(source.interval - elapsed, 0.5))
+
+    async def _arun(self, source):
+        while not self._stop.is_set():
+            started = time.time()
+            await self.arefresh(source.name)
+            elapsed = time.time() - started
+            await asyncio.sleep(max(source.interval - elapsed, 0.5))
+
+    async def arefresh(self, name):
+        # refresh() on the event loop. It takes neither the refresh lock nor
+        # the shared file lock (both block); only the leader refreshes on a
+        # schedule, so at worst a cold-starting reader fetches once as well.
+        source = self._sources[name]
+        start = time.monotonic()
+        fetch = source.afetch or (lambda: asyncio.to_thread(source.fetch))
+        task = asyncio.ensure_future(_atimed(fetch))
+        try:
+            data, elapsed = await asyncio.wait_for(asyncio.shield(task), source.deadline)
+            result = Result(name, data, 'ok', elapsed)
+        except asyncio.TimeoutError:
+            result = Result(name, None, 'timeout', time.monotonic() - start, future=task)
+        except Exception as e:
+            result = Result(name, None, 'error', time.monotonic() - start, error=e)
+        self._pool.record(result)
+        return self._handle(result)
+
+    def refresh(self, name):
+        return self.refresh_many([name]).get(name)
+
+    def refresh_many(self, names, due_only=False):
+        # All sources are fetched at once, each bounded by its own deadline, so
+        # a refresh takes as long as the slowest source rather than the sum.
+        locks = [self._refresh_locks[name] for name in sorted(names)]
+        for lock in locks:
+            lock.acquire()
+        try:
+            if self.shared is None:
+                return self._refresh(names, due_only)
+            # The same, across processes: whoever waited on the file locks
+            # reads the snapshot the holder wrote instead of fetching again
+            with self.shared.lock(names):
+                if due_only:
+                    self._load_shared([name for name in names if self._is_due(name, time.time())], fresh_only=True)
+                return self._refresh(names, due_only)
+        finally:
+            for lock in locks:
+                lock.release()
+
+    def _refresh(self, names, due_only):
+        if due_only:
+            # Concurrent cold-start readers wait for one fetch instead of
+            # each making their own.
+            now = time.time()
+            names = [name for name in names if self._is_due(name, now)]
+        jobs = {name: (self._sources[name].fetch, self._sources[name].deadline) for name in names}
+        results = self._pool.run(jobs) if jobs else {}
+        return {name: self._handle(result) for name, result in results.items()}
+
+    def _handle(self, result):
+        name = result.name
+        fetch_seconds.observe(result.elapsed, name)
+        empty = result.status == 'ok' and not self._sources[name].accept(result.data)
+        fetch_outcomes.inc(name, 'empty' if empty else result.status)
+        if result.status == 'ok':
+            return self._accept(name, result.data)
+        if result.status == 'timeout':
+            print(f"Collector: {name} missed its {self._sources[name].deadline}s deadline")
+            # Still take the value if it arrives late
+            result.future.add_done_callback(lambda f, name=name: self._late(name, f))
+        else:
+            print(f"Collector: refreshing {name} failed: {result.error}")
+        return self._mark_stale(name)
+
+    def _accept(self, name, data):
+        # Fetchers swallow their errors and return an empty (or fallback)
+        # result; keep serving the last good value in that case.
+        if not self._sources[name].accept(data) and name in self._snapshots:
+            return self._mark_stale(name)
+        return self.publish(name, data)
+
+    def _late(self, name, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        snapshot = self._snapshots.get(name)
+        # A later refresh may already have published something newer
+        if snapshot is not None and snapshot.status == 'ok':
+            return
+        data, _ = future.result()
+        self._accept(name, data)
+
+    def _mark_stale(self, name):
+        snapshot = self._snapshots.get(name)
+        if snapshot is None or snapshot.status == 'stale':
+            return snapshot
+        return self.publish(name, snapshot.data, status='stale', updated_at=snapshot.updated_at)
+
+    def publish(self, name, data, status='ok', updated_at=None, share=True):
+        with self._lock:
+            self._version += 1
+            snapshot = Snapshot(self._version, data, updated_at or time.time(), status)
+            self._snapshots[name] = snapshot
+            self._changed.notify_all()
+        for listener in self._listeners:
+            listener()
+        if share and self.shared is not None:
+            try:
+                self.shared.write(name, snapshot)
+            except (OSError, TypeError, ValueError) as e:
+                print(f"Collector: could not share {name}: {e}")
+        return snapshot
+
+    @property
+    def version(self):
+        return self._version
+
+    def wait(self, version, timeout):
+        """Block until something is published after `version` (or `timeout`
+        seconds pass) and return the current version."""
+        with self._changed:
+            self._changed.wait_for(lambda: self._version > version, timeout)
+            return self._version
+
+    def snapshot(self, name):
+        return self.snapshots([name])[0]
+
+    def snapshots(self, names):
+        self.start()
+        if self._loop_thread is None or threading.get_ident() != self._loop_thread:
+            now = time.time()
+            due = [name for name in names if self._is_due(name, now)]
+            if due:
+                self.refresh_many(due, due_only=True)
+        return [self._snapshots.get(name) for name in names]
+
+    def _is_due(self, name, now):
+        # First read in this process, or serverless mode where there is no
+        # background thread: the reader fetches inline.
+        snapshot = self._snapshots.get(name)
+        if snapshot is None:
+            return True
+        return not self.background and now - snapshot.updated_at > self._sources[name].interval
+
+    def get(self, name, default=None):
+        snapshot = self.snapshot(name)
+        return snapshot.data if snapshot is not None else default
+
+    def reset(self):
+        # Forget every value, so the next read fetches again (benchmarks)
+        with self._lock:
+            self._snapshots.clear()
+            self._views.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stale(self, names):
+        return {name for name in names if name in self._snapshots and self._snapshots[name].status == 'stale'}
+
+    def view(self, key, deps, build):
+        """Memoize `build(*datas)` on the versions of the `deps` sources.
+
+        The result is rebuilt only when one of the sources publishes a new
+        value, so serving it costs a dict lookup per request.
+        """
+        snapshots = self.snapshots(deps)
+        versions = tuple(s.version if s is not None else 0 for s in snapshots)
+        cached = self._views.get(key)
+        if cached is not None and cached[0] == versions:
+            return cached[1]
+        value = build(*[s.data if s is not None else None for s in snapshots])
+        self._views[key] = (versions, value)
+        return value
+
+    def status(self):
+        now = time.time()
+        sources = {}
+        for name, source in self._sources.items():
+            s = self._snapshots.get(name)
+            sources[name] = {
+                'status': s.status if s else 'missing',
+                'version': s.version if s else 0,
+                'age': round(now - s.updated_at, 3) if s else None,
+                'interval': source.interval,
+                'deadline': source.deadline,
+                'last_fetch': self._pool.timings.get(name),
+            }
+        return sources
+
+
+async def _atimed(fn):
+    # fanout._timed for coroutines: the same (data, elapsed) result, so _late
+    # handles both
+    started = time.monotonic()
+    data = await fn()
+    return data, time.monotonic() - started
+
+
+def background_enabled():
+    # Serverless deploys (vercel.json) freeze the process between requests, so
+    # background threads never run there; fall back to refresh-on-read.
+    setting = os.environ.get('COLLECTOR_BACKGROUND')
+    if setting is not None:
+        return setting not in ('0', 'false', 'no')
+    return not os.environ.get('VERCEL')
@@ -0,0 +1,32 @@
+"""Setup shared by the offline tests, in one pytest session or in a test file
+run as a script (python test_history.py), which imports it.
+
+upstream.py, the collector and the history store read their settings from the
+environment at import time, so they are set here, before any test module
+imports them: every upstream call goes to one stub server on STUB_PORT,
+nothing refreshes in the background and history is kept in a temporary
+directory.
+"""
+import os
+import socket
+import tempfile
+
+import pytest
+
+with socket.socket() as s:
+    s.bind(('127.0.0.1', 0))
+    STUB_PORT = s.getsockname()[1]
+os.environ.update(UPSTREAM_OVERRIDE=f"http://127.0.0.1:{STUB_PORT}", COLLECTOR_BACKGROUND='0', SHARED_SNAPSHOTS='0',
+                  DEPTH_STREAM='0', LIQUIDATION_STREAM='0', HISTORY_DIR=tempfile.mkdtemp())
+
+
+def start_stub():
+    from stub_upstream_server import StubUpstreams
+    return StubUpstreams(port=STUB_PORT, latency_ms=0).start()
+
+
+@pytest.fixture(scope='session')
+def stub():
+    server = start_stub()
+    yield server
+    server.stop()
@@ -0,0 +1,191 @@
+"""Local stand-in for Binance's depth endpoints, for testing orderbook.DepthStream.
+
+Replays a recorded (or synthetic) session of diff-depth events over a WebSocket
+and serves a matching REST snapshot. The snapshot always reflects the book as of
+the last event sent, so a client that resyncs mid-stream lines up again, just as
+it would against Binance.
+
+    python depth_replay_server.py --record session.jsonl --seconds 60
+    python depth_replay_server.py --session session.jsonl --speed 10
+    python depth_replay_server.py --synthetic 5000 --drop 2500
+
+then run the app with
+    DEPTH_WS_URL=ws://127.0.0.1:8765/ws DEPTH_SNAPSHOT_URL=http://127.0.0.1:8766/api/v3/depth
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from orderbook import OrderBook
+
+BINANCE_WS = 'wss://stream.binance.com:9443/ws/btcusdt@depth@100ms'
+BINANCE_SNAPSHOT = 'https://api.binance.com/api/v3/depth?symbol=BTCUSDT&limit=1000'
+
+
+def load_session(path):
+    # Line 1: {"snapshot": {...}}; then one {"t": seconds, "event": {...}} per line
+    with open(path) as f:
+        snapshot = json.loads(f.readline())['snapshot']
+        events = [json.loads(line) for line in f if line.strip()]
+    return snapshot, events
+
+
+def synthetic_session(n_events, levels=200, mid=95000.0, seed=1):
+    rng = random.Random(seed)
+    bids = [[f"{mid - 0.01 * (i + 1):.2f}", f"{rng.uniform(0.001, 3):.5f}"] for i in range(levels)]
+    asks = [[f"{mid + 0.01 * (i + 1):.2f}", f"{rng.uniform(0.001, 3):.5f}"] for i in range(levels)]
+    last_id = 1000
+    snapshot = {'lastUpdateId': last_id, 'bids': bids, 'asks': asks}
+    events = []
+    for n in range(n_events):
+        first = last_id + 1
+        last_id += rng.randint(1, 5)
+        b = [[f"{mid - 0.01 * rng.randint(1, levels + 20):.2f}", f"{rng.choice([0, rng.uniform(0.001, 3)]):.5f}"] for _ in range(rng.randint(1, 4))]
+        a = [[f"{mid + 0.01 * rng.randint(1, levels + 20):.2f}", f"{rng.choice([0, rng.uniform(0.001, 3)]):.5f}"] for _ in range(rng.randint(1, 4))]
+        events.append({'t': n * 0.1, 'event': {'e': 'depthUpdate', 'E': n, 's': 'BTCUSDT', 'U': first, 'u': last_id, 'b': b, 'a': a}})
+    return snapshot, events
+
+
+def record(path, seconds):
+    from websockets.sync.client import connect
+    import upstream
+
+    with connect(BINANCE_WS, max_size=None) as ws:
+        started = time.time()
+        events = []
+        # Buffer a little first so the snapshot lands inside the recording
+        while time.time() - started < 1:
+            events.append((time.time() - started, ws.recv()))
+        snapshot = upstream.get(BINANCE_SNAPSHOT).json()
+        while time.time() - started < seconds:
+            events.append((time.time() - started, ws.recv()))
+    with open(path, 'w') as f:
+        f.write(json.dumps({'snapshot': snapshot}) + '\n')
+        for t, raw in events:
+            f.write(json.dumps({'t': round(t, 4), 'event': json.loads(raw)}) + '\n')
+    print(f"Recorded {len(events)} events to {path}")
+
+
+class ReplayServer:
+    def __init__(self, snapshot, events, speed=1.0, drop=None, host='127.0.0.1', ws_port=8765, http_port=8766):
+        self.events = events
+        self.speed = speed
+        self.drop = set(drop or ())
+        self.host = host
+        self.ws_port = ws_port
+        self.http_port = http_port
+        self.book = OrderBook()
+        self.book.load_snapshot(snapshot)
+        self.sent = 0
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+        self._ws_server = None
+        self._http_server = None
+
+    @property
+    def ws_url(self):
+        return f"ws://{self.host}:{self.ws_server_port}/ws"
+
+    @property
+    def snapshot_url(self):
+        return f"http://{self.host}:{self._http_server.server_address[1]}/api/v3/depth"
+
+    @property
+    def ws_server_port(self):
+        return self._ws_server.socket.getsockname()[1]
+
+    def current_snapshot(self):
+        with self._lock:
+            bid_prices, bid_amounts = self.book.bids.top(len(self.book.bids))
+            ask_prices, ask_amounts = self.book.asks.top(len(self.book.asks))
+            return {
+                'lastUpdateId': self.book.last_update_id,
+                'bids': [[repr(p), repr(a)] for p, a in zip(bid_prices, bid_amounts)],
+                'asks': [[repr(p), repr(a)] for p, a in zip(ask_prices, ask_amounts)],
+            }
+
+    def _replay(self, ws):
+        started = time.time()
+        for i, item in enumerate(self.events):
+            delay = started + item['t'] / self.speed - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            event = item['event']
+            with self._lock:
+                # The exchange's book moves on even when the client misses an event
+                if event['u'] > self.book.last_update_id:
+                    self.book.update(event)
+            if i not in self.drop:
+                ws.send(json.dumps(event))
+            self.sent = i + 1
+        self.done.set()
+        # Keep the connection open until the client leaves, so it does not
+        # reconnect and resync
+        try:
+            for _ in ws:
+                pass
+        except Exception:
+            pass
+
+    def start(self):
+        from websockets.sync.server import serve
+
+        server = self
+
+        class SnapshotHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(server.current_snapshot()).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._http_server = ThreadingHTTPServer((self.host, self.http_port), SnapshotHandler)
+        threading.Thread(target=self._http_server.serve_forever, daemon=True).start()
+        self._ws_server = serve(self._replay, self.host, self.ws_port)
+        threading.Thread(target=self._ws_server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._ws_server.shutdown()
+        self._http_server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--session', help='recorded session (JSONL) to replay')
+    parser.add_argument('--synthetic', type=int, help='replay N generated events instead')
+    parser.add_argument('--record', help='record a session from Binance to this path')
+    parser.add_argument('--seconds', type=float, default=60)
+    parser.add_argument('--speed', type=float, default=1.0, help='replay speed multiplier')
+    parser.add_argument('--drop', type=int, action='append', help='skip sending event #N (forces a resync)')
+    parser.add_argument('--ws-port', type=int, default=8765)
+    parser.add_argument('--http-port', type=int, default=8766)
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record, args.seconds)
+        return
+    if args.session:
+        snapshot, events = load_session(args.session)
+    else:
+        snapshot, events = synthetic_session(args.synthetic or 1000)
+    server = ReplayServer(snapshot, events, args.speed, args.drop, ws_port=args.ws_port, http_port=args.http_port).start()
+    print(f"Replaying {len(events)} events at {args.speed}x")
+    print(f"DEPTH_WS_URL={server.ws_url} DEPTH_SNAPSHOT_URL={server.snapshot_url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+
+class Result:
+    # status is 'ok', 'timeout' (deadline passed, the call may still finish
+    # later on `future`) or 'error'
+    __slots__ = ('name', 'data', 'status', 'elapsed', 'error', 'future')
+
+    def __init__(self, name, data, status, elapsed, error=None, future=None):
+        self.name = name
+        self.data = data
+        self.status = status
+        self.elapsed = elapsed
+        self.error = error
+        self.future = future
+
+
+class FanOut:
+    """Runs a batch of blocking calls at once on a thread pool, waiting at most
+    each call's own deadline for it, and remembers how long every call took.
+
+    Pools must not be nested (a job submitting to the pool it runs on can
+    starve it), which is why the collector and the fetchers use separate ones.
+    """
+
+    def __init__(self, max_workers, name):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.timings = {}
+
+    def run(self, jobs):
+        """`jobs` maps a name to `(fn, deadline_seconds)`; returns name -> Result."""
+        start = time.monotonic()
+        futures = {name: self._executor.submit(_timed, fn) for name, (fn, _) in jobs.items()}
+        results = {}
+        for name, (_, deadline) in jobs.items():
+            future = futures[name]
+            remaining = start + deadline - time.monotonic()
+            try:
+                data, elapsed = future.result(timeout=max(remaining, 0))
+                result = Result(name, data, 'ok', elapsed)
+            except FutureTimeout:
+                result = Result(name, None, 'timeout', time.monotonic() - start, future=future)
+            except Exception as e:
+                result = Result(name, None, 'error', time.monotonic() - start, error=e)
+            results[name] = result
+            self.record(result)
+        return results
+
+    def record(self, result):
+        with self._lock:
+            self.timings[result.name] = {
+                'status': result.status,
+                'elapsed_ms': round(result.elapsed * 1000, 1),
+                'at': time.time(),
+            }
+
+
+def _timed(fn):
+    started = time.monotonic()
+    data = fn()
+    return data, time.monotonic() - started
+
+
+# Shared pool for the leaf requests inside a fetch_* function
+fetch_pool = FanOut(32, 'fetch')
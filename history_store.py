@@ -0,0 +1,204 @@
+import datetime
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Serverless deploys (vercel.json) can only write under /tmp
+if os.environ.get('VERCEL'):
+    DEFAULT_HISTORY_DIR = os.path.join(tempfile.gettempdir(), 'history')
+else:
+    DEFAULT_HISTORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'history')
+HISTORY_DIR = os.environ.get('HISTORY_DIR', DEFAULT_HISTORY_DIR)
+
+# Re-download new bars for a code at most this often (seconds)
+REFRESH_INTERVAL = 120
+
+COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+# Bar resolutions (seconds per bar) and how far back each is kept: a year of
+# minute bars would be a 25 MB file rewritten on every refresh
+RESOLUTIONS = {'1m': 60, '5m': 300, '1h': 3600, '1d': 86400}
+RETENTION = {'1m': 30 * 86400, '5m': 365 * 86400, '1h': 5 * 365 * 86400, '1d': None}
+
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+def date_to_ts(date_str):
+    # 'YYYY-MM-DD' -> epoch seconds at 00:00 UTC
+    return (datetime.date.fromisoformat(date_str[:10]).toordinal() - EPOCH_ORDINAL) * 86400
+
+
+def ts_to_date(ts):
+    return datetime.date.fromordinal(ts // 86400 + EPOCH_ORDINAL).isoformat()
+
+
+class Series:
+    """Bars of one code as columns: `t` (epoch seconds, ascending) plus one
+    float array per value column. Range queries are binary searches on `t`."""
+
+    def __init__(self, columns, t=None, values=None, refreshed_at=0):
+        self.columns = list(columns)
+        self.t = t if t is not None else array('q')
+        self.values = values if values is not None else {name: array('d') for name in self.columns}
+        self.refreshed_at = refreshed_at
+
+    def __len__(self):
+        return len(self.t)
+
+    @property
+    def last_ts(self):
+        return self.t[-1] if self.t else None
+
+    def merge(self, rows):
+        """Add `rows` [(ts, {column: value})] sorted by ts. Bars from the first
+        new ts onwards are replaced, so re-fetching the still-open last bar
+        updates it instead of duplicating it."""
+        if not rows:
+            return
+        cut = bisect_left(self.t, rows[0][0])
+        del self.t[cut:]
+        for name in self.columns:
+            del self.values[name][cut:]
+        for ts, row in rows:
+            self.t.append(ts)
+            for name in self.columns:
+                value = row.get(name)
+                self.values[name].append(float('nan') if value is None else value)
+
+    def trim(self, before):
+        # Drop the bars older than `before`
+        cut = bisect_left(self.t, before)
+        if cut:
+            del self.t[:cut]
+            for name in self.columns:
+                del self.values[name][:cut]
+
+    def range(self, start=None, end=None):
+        lo = bisect_left(self.t, start) if start is not None else 0
+        hi = bisect_right(self.t, end) if end is not None else len(self.t)
+        return lo, hi
+
+    def to_bytes(self):
+        header = json.dumps({'columns': self.columns, 'rows': len(self.t), 'refreshed_at': self.refreshed_at}).encode()
+        parts = [struct.pack('<I', len(header)), header, self.t.tobytes()]
+        parts.extend(self.values[name].tobytes() for name in self.columns)
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        (header_len,) = struct.unpack_from('<I', data)
+        header = json.loads(data[4:4 + header_len])
+        n = header['rows']
+        offset = 4 + header_len
+        t = array('q')
+        t.frombytes(data[offset:offset + 8 * n])
+        offset += 8 * n
+        values = {}
+        for name in header['columns']:
+            values[name] = array('d')
+            values[name].frombytes(data[offset:offset + 8 * n])
+            offset += 8 * n
+        return cls(header['columns'], t, values, header.get('refreshed_at', 0))
+
+
+class HistoryStore:
+    """Local on-disk time series per code and resolution, refreshed incrementally.
+
+    Each series is one file of columnar binary arrays, replaced atomically on
+    write so readers (in any worker process) never see a half-written file.
+    A refresh asks the provider only for bars from the last stored one on,
+    and drops those older than the resolution's RETENTION.
+    """
+
+    def __init__(self, directory=HISTORY_DIR, columns=COLUMNS):
+        self.directory = directory
+        self.columns = columns
+        self._cache = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _path(self, code, resolution):
+        safe = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in code)
+        # Daily series keep the name they had before there were resolutions
+        suffix = '' if resolution == '1d' else f"@{resolution}"
+        return os.path.join(self.directory, f"{safe}{suffix}.bin")
+
+    def load(self, code, resolution='1d'):
+        path = self._path(code, resolution)
+        key = (code, resolution)
+        cached = self._cache.get(key)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except (FileNotFoundError, NotADirectoryError):
+            # Kept in memory only when it could not be saved
+            if cached is not None and cached[0] is None:
+                return cached[1]
+            return Series(self.columns)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with open(path, 'rb') as f:
+            series = Series.from_bytes(f.read())
+        self._cache[key] = (mtime, series)
+        return series
+
+    def save(self, code, series, resolution='1d'):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(code, resolution)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(series.to_bytes())
+        os.replace(tmp, path)
+        self._cache[(code, resolution)] = (os.stat(path).st_mtime_ns, series)
+
+    def _code_lock(self, code, resolution):
+        with self._lock:
+            return self._locks.setdefault((code, resolution), threading.Lock())
+
+    def _fresh(self, series, max_age):
+        return series and series.columns == list(self.columns) and time.time() - series.refreshed_at < max_age
+
+    def refresh(self, code, provider, max_age=None, resolution='1d'):
+        """Bring `code` up to date via `provider(since)` -> [(ts, {column: value})],
+        where since is the epoch seconds of the last stored bar, or None for a
+        full download (as far back as RETENTION). Returns the series.
+
+        Bars are re-downloaded at most every REFRESH_INTERVAL, or every bar
+        for the resolutions finer than that.
+
+        A series stored with fewer columns (files written before open, high,
+        low and volume were kept) is downloaded in full once; the columns it
+        lacks are NaN for bars older than the provider goes back."""
+        if max_age is None:
+            max_age = min(REFRESH_INTERVAL, RESOLUTIONS[resolution])
+        series = self.load(code, resolution)
+        if self._fresh(series, max_age):
+            return series
+        with self._code_lock(code, resolution):
+            series = self.load(code, resolution)
+            if self._fresh(series, max_age):
+                return series
+            complete = series.columns == list(self.columns)
+            since = series.last_ts if series and complete else None
+            rows = provider(since)
+            # Copy so concurrent readers of the cached series are unaffected
+            updated = Series(self.columns, array('q', series.t), {
+                name: array('d', series.values[name]) if name in series.values else array('d', [float('nan')]) * len(series)
+                for name in self.columns
+            })
+            updated.merge(rows)
+            if RETENTION[resolution]:
+                updated.trim(time.time() - RETENTION[resolution])
+            updated.refreshed_at = time.time()
+            try:
+                self.save(code, updated, resolution)
+            except OSError as e:
+                # An unwritable disk costs the next download its head start,
+                # not this answer
+                print(f"Error saving {resolution} history for {code}: {e}")
+                self._cache[(code, resolution)] = (None, updated)
+            return updated
@@ -0,0 +1,177 @@
+"""Technical indicators over a close series, vectorized with NumPy.
+
+Every function takes a float array (oldest first) and returns arrays of the
+same length, NaN where the window is not filled yet, so callers can compute
+over the whole stored history and slice out the requested range with the
+warm-up already done.
+
+    indicators.compute(closes, parse('sma:20,rsi:14,bb:20'), periods_per_year=365)
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# name -> default period; 'returns' has none
+DEFAULTS = {'sma': 20, 'ema': 20, 'rsi': 14, 'bb': 20, 'vol': 20, 'returns': None}
+DEFAULT_SET = 'sma:20,sma:50,ema:20,rsi:14,bb:20,vol:20,returns'
+MAX_PERIOD = 1000
+
+
+def parse(spec):
+    """'sma:20,rsi,returns' -> (('returns', None), ('rsi', 14), ('sma', 20)),
+    sorted and deduplicated so equal sets make equal cache keys. Raises
+    ValueError on an unknown name or a bad period."""
+    wanted = set()
+    for part in (spec or DEFAULT_SET).split(','):
+        part = part.strip().lower()
+        if not part:
+            continue
+        name, _, period = part.partition(':')
+        if name not in DEFAULTS:
+            raise ValueError(f"unknown indicator {name!r}")
+        if DEFAULTS[name] is None:
+            wanted.add((name, None))
+            continue
+        period = int(period) if period else DEFAULTS[name]
+        if not 2 <= period <= MAX_PERIOD:
+            raise ValueError(f"{name} period must be between 2 and {MAX_PERIOD}")
+        wanted.add((name, period))
+    return tuple(sorted(wanted, key=lambda item: (item[0], item[1] or 0)))
+
+
+def fill_gaps(x):
+    # Carry the last known value over NaN bars (days a market had no close)
+    x = np.asarray(x, dtype=float)
+    valid = ~np.isnan(x)
+    if valid.all() or not valid.any():
+        return x
+    index = np.where(valid, np.arange(len(x)), 0)
+    np.maximum.accumulate(index, out=index)
+    filled = x[index]
+    filled[:np.argmax(valid)] = np.nan
+    return filled
+
+
+def _nan(n):
+    return np.full(n, np.nan)
+
+
+def sma(x, period):
+    out = _nan(len(x))
+    if len(x) >= period:
+        out[period - 1:] = sliding_window_view(x, period).mean(axis=1)
+    return out
+
+
+def rolling_std(x, period):
+    # Population standard deviation per window (as Bollinger bands use)
+    out = _nan(len(x))
+    if len(x) >= period:
+        out[period - 1:] = sliding_window_view(x, period).std(axis=1)
+    return out
+
+
+def _smooth(x, alpha, start, seed):
+    """y[start] = seed, then y[i] = (1 - alpha) * y[i-1] + alpha * x[i].
+
+    The recurrence unrolled: y[s+j] = d^(j+1) * (y[s-1] + alpha * cumsum(x[s+i] / d^(i+1))),
+    d = 1 - alpha. d^-j overflows for long series, so it is evaluated in
+    blocks short enough to stay finite, carrying y across blocks.
+    """
+    out = _nan(len(x))
+    if start >= len(x):
+        return out
+    out[start] = prev = seed
+    decay = 1 - alpha
+    block = max(1, int(600 / -np.log(decay)))
+    i = start + 1
+    while i < len(x):
+        segment = x[i:i + block]
+        powers = decay ** np.arange(1, len(segment) + 1)
+        values = powers * (prev + alpha * np.cumsum(segment / powers))
+        out[i:i + len(segment)] = values
+        prev = values[-1]
+        i += len(segment)
+    return out
+
+
+def ema(x, period):
+    # Seeded with the simple average of the first `period` values
+    if len(x) < period:
+        return _nan(len(x))
+    return _smooth(x, 2 / (period + 1), period - 1, x[:period].mean())
+
+
+def rsi(x, period):
+    # Wilder's RSI: gains and losses smoothed with alpha = 1/period, seeded
+    # with their simple averages over the first `period` changes
+    out = _nan(len(x))
+    if len(x) <= period:
+        return out
+    change = np.diff(x)
+    gains = np.where(change > 0, change, 0.0)
+    losses = np.where(change < 0, -change, 0.0)
+    avg_gain = _smooth(gains, 1 / period, period - 1, gains[:period].mean())
+    avg_loss = _smooth(losses, 1 / period, period - 1, losses[:period].mean())
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = 100 - 100 / (1 + avg_gain / avg_loss)
+    # No losses at all: 100; flat: undefined
+    value = np.where(avg_loss == 0, np.where(avg_gain == 0, np.nan, 100.0), value)
+    out[1:] = value
+    return out
+
+
+def bollinger(x, period, width=2):
+    mid = sma(x, period)
+    spread = width * rolling_std(x, period)
+    return {'mid': mid, 'upper': mid + spread, 'lower': mid - spread}
+
+
+def log_returns(x):
+    out = _nan(len(x))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[1:] = np.diff(np.log(x))
+    return out
+
+
+def volatility(x, period, periods_per_year=252):
+    # Realized volatility: sample std of log returns over the window, annualized
+    r = log_returns(x)
+    out = _nan(len(x))
+    if len(x) > period:
+        out[period:] = sliding_window_view(r[1:], period).std(axis=1, ddof=1) * np.sqrt(periods_per_year)
+    return out
+
+
+def returns(x):
+    out = _nan(len(x))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[1:] = x[1:] / x[:-1] - 1
+    return out
+
+
+def compute(closes, wanted, periods_per_year=252):
+    """{'sma:20': array, 'bb:20': {'mid', 'upper', 'lower'}, ...} for the
+    parsed indicator set `wanted`."""
+    x = fill_gaps(closes)
+    result = {}
+    for name, period in wanted:
+        key = name if period is None else f"{name}:{period}"
+        if name == 'sma':
+            result[key] = sma(x, period)
+        elif name == 'ema':
+            result[key] = ema(x, period)
+        elif name == 'rsi':
+            result[key] = rsi(x, period)
+        elif name == 'bb':
+            result[key] = bollinger(x, period)
+        elif name == 'vol':
+            result[key] = volatility(x, period, periods_per_year)
+        elif name == 'returns':
+            result[key] = returns(x)
+    return result
+
+
+def to_list(values, lo=0, hi=None):
+    # JSON-ready slice: NaN -> None
+    values = values[lo:hi]
+    return [None if v != v else v for v in np.round(values, 8).tolist()]
@@ -0,0 +1,247 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import upstream
+
+# All-market force orders: at most one (the latest) liquidation per symbol
+# per second
+LIQUIDATION_WS_URL = os.environ.get('LIQUIDATION_WS_URL', 'wss://fstream.binance.com/ws/!forceOrder@arr')
+
+# Window name -> (span seconds, buckets). Totals move in bucket-sized steps.
+WINDOWS = {
+    '1m': (60, 60),
+    '5m': (300, 60),
+    '1h': (3600, 60),
+    '24h': (86400, 96),
+}
+SIDES = ('Long', 'Short')
+
+# Events kept per symbol for the recent list
+RING_SIZE = 500
+
+# Source of the made-up events shown while fapi is unreachable (app.py)
+SIMULATION = 'simulation'
+
+
+class RollingWindow:
+    """Sum and count of the values added over the last `span` seconds.
+
+    The span is split into `buckets` slots of a circular array with running
+    totals; moving forward in time subtracts the slots that fall out, so
+    neither adding nor reading rescans events.
+    """
+
+    __slots__ = ('width', 'n', 'ids', 'amounts', 'counts', 'amount', 'count', 'head')
+
+    def __init__(self, span, buckets):
+        self.width = span / buckets
+        self.n = buckets
+        self.ids = [None] * buckets
+        self.amounts = [0.0] * buckets
+        self.counts = [0] * buckets
+        self.amount = 0.0
+        self.count = 0
+        self.head = None
+
+    def _advance(self, bucket):
+        # Make `bucket` the newest slot, expiring what drops out of the span
+        if self.head is not None and bucket <= self.head:
+            return
+        first = bucket - self.n + 1 if self.head is None else max(self.head + 1, bucket - self.n + 1)
+        for b in range(first, bucket + 1):
+            slot = b % self.n
+            if self.ids[slot] is not None:
+                self.amount -= self.amounts[slot]
+                self.count -= self.counts[slot]
+            self.ids[slot] = b
+            self.amounts[slot] = 0.0
+            self.counts[slot] = 0
+        self.head = bucket
+        if self.count == 0:
+            # Drop accumulated float error whenever the window empties
+            self.amount = 0.0
+
+    def add(self, ts, amount):
+        bucket = int(ts // self.width)
+        self._advance(bucket)
+        slot = bucket % self.n
+        if self.ids[slot] != bucket:
+            return  # older than the window
+        self.amounts[slot] += amount
+        self.counts[slot] += 1
+        self.amount += amount
+        self.count += 1
+
+    def totals(self, now):
+        self._advance(int(now // self.width))
+        return self.amount, self.count
+
+
+class SymbolLiquidations:
+    __slots__ = ('events', 'windows', 'last_time')
+
+    def __init__(self, ring_size):
+        self.events = deque(maxlen=ring_size)
+        self.windows = {(name, side): RollingWindow(*WINDOWS[name]) for name in WINDOWS for side in SIDES}
+        self.last_time = 0
+
+    def add(self, event, counted=True):
+        self.events.append(event)
+        if not counted:
+            # Simulated: not a cursor for the real events polled later
+            return
+        self.last_time = max(self.last_time, event['time'])
+        ts = event['time'] / 1000
+        for (_, side), window in self.windows.items():
+            if side == event['side']:
+                window.add(ts, event['amount_usd'])
+
+    def summary(self, now):
+        result = {}
+        for name in WINDOWS:
+            totals = {}
+            for side in SIDES:
+                amount, count = self.windows[(name, side)].totals(now)
+                totals[f"{side.lower()}_usd"] = amount
+                totals[f"{side.lower()}_count"] = count
+            result[name] = totals
+        return result
+
+
+class LiquidationStore:
+    """Liquidation events per symbol in fixed-size ring buffers, with rolling
+    per-side totals over each of WINDOWS kept up to date on insert.
+
+    Events are the dashboard rows: {'symbol', 'side' ('Long'/'Short'),
+    'price', 'qty', 'amount_usd', 'time' (ms)}. The market-wide totals are kept
+    under the '*' symbol. Simulated events are listed but never counted in the
+    totals, and the summary's `source` is that of the last real event.
+    """
+
+    ALL = '*'
+
+    def __init__(self, ring_size=RING_SIZE):
+        self.ring_size = ring_size
+        self.symbols = {}
+        self.version = 0
+        self.source = None
+        self._lock = threading.Lock()
+
+    def _symbol(self, symbol):
+        state = self.symbols.get(symbol)
+        if state is None:
+            state = self.symbols[symbol] = SymbolLiquidations(self.ring_size)
+        return state
+
+    def add(self, event, source='stream'):
+        counted = source != SIMULATION
+        with self._lock:
+            self._symbol(event['symbol']).add(event, counted)
+            self._symbol(self.ALL).add(event, counted)
+            if counted:
+                self.source = source
+            self.version += 1
+
+    def add_new(self, events, source):
+        """Add polled `events`, skipping any not newer than the latest already
+        stored for their symbol (a poll returns the same recent orders again)."""
+        added = 0
+        for event in sorted(events, key=lambda e: e['time']):
+            state = self.symbols.get(event['symbol'])
+            if state is not None and event['time'] <= state.last_time:
+                continue
+            self.add(event, source)
+            added += 1
+        return added
+
+    def recent(self, limit=20):
+        with self._lock:
+            events = [e for symbol, state in self.symbols.items() if symbol != self.ALL for e in state.events]
+        events.sort(key=lambda e: e['time'], reverse=True)
+        return events[:limit]
+
+    def summary(self, now=None):
+        now = now or time.time()
+        with self._lock:
+            symbols = {symbol: state.summary(now) for symbol, state in self.symbols.items() if symbol != self.ALL}
+            total = self.symbols[self.ALL].summary(now) if self.ALL in self.symbols else {}
+        return {
+            'updated_at': now,
+            'source': self.source,
+            'windows': list(WINDOWS),
+            'total': total,
+            'symbols': symbols,
+        }
+
+
+def parse_force_order(message):
+    # forceOrder event -> dashboard row. A SELL order liquidates a long.
+    order = message['o']
+    price = float(order.get('ap') or order['p'])
+    qty = float(order.get('z') or order['q'])
+    return {
+        'symbol': order['s'].replace('USDT', ''),
+        'side': 'Long' if order['S'] == 'SELL' else 'Short',
+        'price': price,
+        'qty': qty,
+        'amount_usd': price * qty,
+        'time': order['T'],
+    }
+
+
+class LiquidationStream:
+    """Feeds a LiquidationStore from the force-order WebSocket stream in a
+    background thread, reconnecting with backoff."""
+
+    def __init__(self, store, ws_url=LIQUIDATION_WS_URL):
+        self.store = store
+        self.ws_url = ws_url
+        self.connected = False
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='liquidation-stream', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        # Imported here so the REST-only code path works without websockets
+        from websockets.sync.client import connect
+
+        attempt = 0
+        while not self._stop.is_set():
+            try:
+                with connect(self.ws_url, open_timeout=10, max_size=None) as ws:
+                    attempt = 0
+                    self.connected = True
+                    while not self._stop.is_set():
+                        message = json.loads(ws.recv(timeout=60))
+                        # The @arr stream sends single events; accept lists too
+                        for event in message if isinstance(message, list) else [message]:
+                            if event.get('e') == 'forceOrder':
+                                self.store.add(parse_force_order(event))
+            except Exception as e:
+                print(f"Liquidation stream error: {e}")
+            self.connected = False
+            if self._stop.is_set():
+                break
+            upstream.backoff(attempt, base=1.0, cap=30.0)
+            attempt += 1
+
+
+def stream_enabled():
+    # Same rule as the depth stream: only in long-lived processes
+    setting = os.environ.get('LIQUIDATION_STREAM')
+    if setting is not None:
+        return setting not in ('0', 'false', 'no')
+    return not os.environ.get('VERCEL')
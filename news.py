@@ -0,0 +1,137 @@
+import re
+import threading
+import time
+
+import async_upstream
+import upstream
+
+# Jin10 flash news
+# https://flash-api.jin10.com/get_flash_list
+JIN10_URL = "https://flash-api.jin10.com/get_flash_list"
+JIN10_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "x-app-id": "bVBF4FyRTn5NJF5n",
+    "x-version": "1.0.0",
+    "Origin": "https://www.jin10.com",
+    "Referer": "https://www.jin10.com/"
+}
+
+# The few tags flash items carry; <br> becomes a space, <b> is dropped
+_TAGS = re.compile(r'<br\s*/?>|</?b>')
+
+
+def _strip_tags(text):
+    return _TAGS.sub(lambda m: ' ' if m.group(0).startswith('<br') else '', text)
+
+
+def _flash_params():
+    # Channel 1 seems to work for general news based on test
+    return {
+        "channel": 1,
+        "vip": "1",
+        "t": int(time.time() * 1000)
+    }
+
+
+def _flash_items(r):
+    r.raise_for_status()
+    json_data = r.json()
+    if json_data.get("status") != 200:
+        raise ValueError(f"Jin10 API Error: {json_data}")
+    return json_data.get("data", [])
+
+
+def fetch_flash_list():
+    return _flash_items(upstream.get(JIN10_URL, headers=JIN10_HEADERS, params=_flash_params()))
+
+
+async def afetch_flash_list():
+    return _flash_items(await async_upstream.get(JIN10_URL, headers=JIN10_HEADERS, params=_flash_params()))
+
+
+def item_key(item_id):
+    # Jin10 ids are timestamps with microseconds ("20260108182530744800"), so
+    # they order by time; compare by length first in case that ever changes
+    return (len(item_id), item_id)
+
+
+def parse_item(raw):
+    data_payload = raw.get('data') or {}
+    # Jin10 sometimes has title, sometimes just content
+    title = data_payload.get('title') or data_payload.get('content') or ''
+    # '2026-01-08 18:25:30' -> '01-08 18:25'
+    time_str = raw.get('time') or ''
+    return {
+        'id': str(raw['id']),
+        'title': _strip_tags(title),
+        'url': data_payload.get('link') or "https://www.jin10.com",  # Jin10 flash news often has no link
+        'time': time_str[5:16] if len(time_str) >= 16 else time_str,
+        'source': '金十数据',
+    }
+
+
+class NewsStore:
+    """The latest `capacity` flash items, deduplicated by id and ordered by it.
+
+    The cursor is the newest item id. Ids order by time on their own, so a
+    cursor handed out by one worker process means the same in any other.
+    """
+
+    def __init__(self, capacity=200):
+        self.capacity = capacity
+        self.items = []
+        self.keys = []
+        self._lock = threading.Lock()
+
+    @property
+    def cursor(self):
+        return self.items[-1]['id'] if self.items else None
+
+    def ingest(self, raw_items):
+        """Add the items of a flash list (newest first) not seen yet; only
+        those are parsed. Returns how many were added."""
+        with self._lock:
+            newest = self.keys[-1] if self.keys else None
+            fresh = []
+            for raw in raw_items:
+                if raw.get('id') is None:
+                    continue
+                key = item_key(str(raw['id']))
+                if newest is not None and key <= newest:
+                    continue
+                fresh.append((key, raw))
+            if not fresh:
+                return 0
+            fresh.sort(key=lambda pair: pair[0])
+            added = 0
+            for key, raw in fresh:
+                if self.keys and key == self.keys[-1]:
+                    continue  # listed twice in one response
+                self.keys.append(key)
+                self.items.append(parse_item(raw))
+                added += 1
+            if len(self.items) > self.capacity:
+                del self.items[:-self.capacity]
+                del self.keys[:-self.capacity]
+            return added
+
+    def latest(self, limit=20):
+        with self._lock:
+            return self.items[-limit:][::-1]
+
+
+# The routes read the collector's 'news' snapshot (the latest items, newest
+# first) rather than a NewsStore, which only the worker refreshing the
+# collector's sources keeps up to date.
+def since(items, cursor, limit=20):
+    # Items newer than `cursor`
+    key = item_key(cursor)
+    return [item for item in items if item_key(item['id']) > key][:limit]
+
+
+def next_cursor(items, cursor=None):
+    # The newer of the client's cursor and ours (another worker may be ahead)
+    newest = items[0]['id'] if items else None
+    if cursor and (newest is None or item_key(cursor) > item_key(newest)):
+        return cursor
+    return newest
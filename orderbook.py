@@ -0,0 +1,248 @@
+import json
+import os
+import threading
+from bisect import bisect_left
+
+import upstream
+
+DEPTH_WS_URL = os.environ.get('DEPTH_WS_URL', 'wss://stream.binance.com:9443/ws/btcusdt@depth@100ms')
+DEPTH_SNAPSHOT_URL = os.environ.get('DEPTH_SNAPSHOT_URL', 'https://api.binance.com/api/v3/depth?symbol=BTCUSDT&limit=1000')
+
+
+class OutOfSync(Exception):
+    pass
+
+
+class BookSide:
+    # Price levels kept as two parallel arrays sorted by ascending price, so an
+    # update is a binary search and reading the best k levels is a slice.
+    __slots__ = ('prices', 'amounts', 'descending')
+
+    def __init__(self, descending):
+        self.prices = []
+        self.amounts = []
+        self.descending = descending
+
+    def clear(self):
+        self.prices = []
+        self.amounts = []
+
+    def set(self, price, amount):
+        i = bisect_left(self.prices, price)
+        found = i < len(self.prices) and self.prices[i] == price
+        if amount == 0:
+            if found:
+                del self.prices[i]
+                del self.amounts[i]
+        elif found:
+            self.amounts[i] = amount
+        else:
+            self.prices.insert(i, price)
+            self.amounts.insert(i, amount)
+
+    def best(self):
+        if not self.prices:
+            return None
+        return self.prices[-1] if self.descending else self.prices[0]
+
+    def top(self, k):
+        # Best first: highest bids, lowest asks
+        if self.descending:
+            start = max(len(self.prices) - k, 0)
+            return self.prices[start:][::-1], self.amounts[start:][::-1]
+        return self.prices[:k], self.amounts[:k]
+
+    def __len__(self):
+        return len(self.prices)
+
+
+class OrderBook:
+    """Local copy of a Binance spot order book, kept current by diff events.
+
+    Follows Binance's "how to manage a local order book" rules: events older
+    than the snapshot are dropped, the first applied event must straddle the
+    snapshot's lastUpdateId and every later event must continue exactly where
+    the previous one ended (U == previous u + 1), otherwise OutOfSync.
+    """
+
+    def __init__(self):
+        self.bids = BookSide(descending=True)
+        self.asks = BookSide(descending=False)
+        self.last_update_id = None
+        self.synced = False
+        self.version = 0
+
+    def load_snapshot(self, snapshot):
+        self.bids.clear()
+        self.asks.clear()
+        for price, amount in snapshot.get('bids', []):
+            self.bids.set(float(price), float(amount))
+        for price, amount in snapshot.get('asks', []):
+            self.asks.set(float(price), float(amount))
+        self.last_update_id = snapshot['lastUpdateId']
+        self.synced = False
+        self.version += 1
+
+    def apply(self, event):
+        """Apply one depthUpdate event; returns False if it predates the book."""
+        first, last = event['U'], event['u']
+        if last <= self.last_update_id:
+            return False
+        if self.synced:
+            if first != self.last_update_id + 1:
+                raise OutOfSync(f"expected U={self.last_update_id + 1}, got U={first}")
+        elif not first <= self.last_update_id + 1 <= last:
+            raise OutOfSync(f"first event U={first} u={last} does not cover {self.last_update_id + 1}")
+        self.update(event)
+        self.synced = True
+        return True
+
+    def update(self, event):
+        # Apply the event's levels without any sequence checks
+        for price, amount in event['b']:
+            self.bids.set(float(price), float(amount))
+        for price, amount in event['a']:
+            self.asks.set(float(price), float(amount))
+        self.last_update_id = event['u']
+        self.version += 1
+
+    def depth(self, levels):
+        # Best `levels` per side as parallel price/amount arrays, best first
+        bid_prices, bid_amounts = self.bids.top(levels)
+        ask_prices, ask_amounts = self.asks.top(levels)
+        return {
+            'bids': {'price': bid_prices, 'amount': bid_amounts},
+            'asks': {'price': ask_prices, 'amount': ask_amounts},
+        }
+
+
+class DepthStream:
+    """Keeps an OrderBook current from the diff-depth WebSocket stream.
+
+    Runs in a background thread: connects, buffers events while it loads a REST
+    snapshot, replays the buffer and then applies live events. A sequence gap
+    triggers a resync from a fresh snapshot on the same connection; a dropped
+    connection reconnects with backoff.
+    """
+
+    def __init__(self, ws_url=DEPTH_WS_URL, snapshot_url=DEPTH_SNAPSHOT_URL):
+        self.ws_url = ws_url
+        self.snapshot_url = snapshot_url
+        self.book = OrderBook()
+        self.resyncs = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='depth-stream', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def ready(self):
+        return self.book.synced
+
+    def depth(self, levels=1000):
+        with self._lock:
+            if not self.book.synced:
+                return None
+            return self.book.depth(levels)
+
+    def _run(self):
+        # Imported here so the REST-only code path works without websockets
+        from websockets.sync.client import connect
+
+        attempt = 0
+        while not self._stop.is_set():
+            try:
+                with connect(self.ws_url, open_timeout=10, max_size=None) as ws:
+                    attempt = 0
+                    self._consume(ws)
+            except Exception as e:
+                print(f"Depth stream error: {e}")
+            with self._lock:
+                self.book.synced = False
+            if self._stop.is_set():
+                break
+            upstream.backoff(attempt, base=1.0, cap=30.0)
+            attempt += 1
+
+    def _consume(self, ws):
+        buffered = []
+        need_snapshot = True
+        while not self._stop.is_set():
+            if need_snapshot:
+                # Events keep arriving while the snapshot is fetched; everything
+                # received in the meantime is buffered and replayed on top.
+                buffered.extend(self._drain(ws))
+                snapshot = upstream.get(self.snapshot_url).json()
+                buffered.extend(self._drain(ws))
+                with self._lock:
+                    self.book.load_snapshot(snapshot)
+                need_snapshot = False
+                events, buffered = buffered, []
+            else:
+                events = [json.loads(ws.recv(timeout=30))]
+            try:
+                with self._lock:
+                    for event in events:
+                        self.book.apply(event)
+            except OutOfSync as e:
+                print(f"Depth stream out of sync, resyncing: {e}")
+                self.resyncs += 1
+                need_snapshot = True
+
+    def _drain(self, ws):
+        events = []
+        while True:
+            try:
+                events.append(json.loads(ws.recv(timeout=0)))
+            except TimeoutError:
+                return events
+
+
+def aggregate(depth, bucket=0, levels=100):
+    """Group `depth` (as returned by OrderBook.depth) into price buckets and
+    return the best `levels` per side with cumulative amounts, as parallel
+    arrays: {'bids': {'price', 'amount', 'cum'}, 'asks': {...}}.
+
+    Bids are floored and asks ceiled to the bucket so that grouped levels never
+    cross. bucket=0 keeps the raw levels.
+    """
+    # numpy is imported on first use: it only serves this function, and
+    # serverless cold starts (vercel.json) should not pay for it otherwise
+    import numpy as np
+    result = {'bucket': bucket, 'levels': levels}
+    # The nudge keeps e.g. 94999.99 / 0.01 from flooring to 9499998
+    for side, round_fn, nudge in (('bids', np.floor, 1e-9), ('asks', np.ceil, -1e-9)):
+        prices = np.asarray(depth[side]['price'], dtype=np.float64)
+        amounts = np.asarray(depth[side]['amount'], dtype=np.float64)
+        if bucket and len(prices):
+            keys = np.round(round_fn(prices / bucket + nudge) * bucket, 8)
+            # Levels are sorted, so equal keys are contiguous runs
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+            prices = keys[starts]
+            amounts = np.add.reduceat(amounts, starts)
+        prices = prices[:levels]
+        amounts = amounts[:levels]
+        result[side] = {
+            'price': prices.tolist(),
+            'amount': amounts.tolist(),
+            'cum': np.cumsum(amounts).tolist(),
+        }
+    return result
+
+
+def stream_enabled():
+    # A WebSocket needs a long-lived process; serverless deploys keep using the
+    # REST snapshot.
+    setting = os.environ.get('DEPTH_STREAM')
+    if setting is not None:
+        return setting not in ('0', 'false', 'no')
+    return not os.environ.get('VERCEL')
@@ -0,0 +1,160 @@
+"""Record every upstream response to an archive and replay it later, offline.
+
+    UPSTREAM_MODE=record python app.py        # browse, then stop the app
+    UPSTREAM_MODE=replay UPSTREAM_REPLAY_SPEED=10 python app.py
+
+The archive (UPSTREAM_ARCHIVE, gzip'd JSON lines) holds one record per
+upstream.get attempt: request key, status, a few headers, the body and how long
+the call took, or the connection error it raised. Replay serves the records of
+each request key in recorded order (starting over when they run out) after
+the recorded latency divided by the speed; speed 0 answers at once.
+
+Only calls made through upstream.get are covered: yfinance downloads and the
+WebSocket streams are not (depth_replay_server.py replays the depth stream);
+in replay mode yfinance calls fail as if Yahoo were unreachable.
+"""
+import base64
+import gzip
+import io
+import json
+import os
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+UPSTREAM_MODE = os.environ.get('UPSTREAM_MODE', 'live')
+UPSTREAM_ARCHIVE = os.environ.get('UPSTREAM_ARCHIVE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'upstream.jsonl.gz'))
+REPLAY_SPEED = float(os.environ.get('UPSTREAM_REPLAY_SPEED', '1'))
+
+# Query parameters that change on every call (cache busters) and would make
+# every request key unique
+VOLATILE_PARAMS = {'t', '_'}
+
+# Response headers worth keeping; the body is stored decoded, so no encodings
+KEPT_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Cache-Control', 'Date')
+
+
+def request_key(url, params=None):
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        query += list(params.items()) if isinstance(params, dict) else list(params)
+    query = sorted((k, str(v)) for k, v in query if k not in VOLATILE_PARAMS)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ''))
+
+
+class _Body(io.BytesIO):
+    # Stands in for urllib3's raw stream (which has decode_content)
+    decode_content = True
+
+
+def build_response(url, status, headers, body):
+    r = requests.Response()
+    r.status_code = status
+    r.url = url
+    r.headers = CaseInsensitiveDict(headers)
+    r.encoding = requests.utils.get_encoding_from_headers(r.headers)
+    r._content = body
+    r.raw = _Body(body)
+    return r
+
+
+class Recorder:
+    def __init__(self, path=UPSTREAM_ARCHIVE):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.started = time.time()
+        self.count = 0
+        self._file = gzip.open(path, 'at', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def record(self, url, params, elapsed, response=None, error=None):
+        """Append one call; returns a response that can still be read (the
+        original's body has been consumed into the archive)."""
+        entry = {
+            'key': request_key(url, params),
+            'at': round(time.time() - self.started, 3),
+            'elapsed': round(elapsed, 4),
+        }
+        if error is not None:
+            entry['error'] = type(error).__name__
+            entry['message'] = str(error)[:200]
+        else:
+            body = response.content
+            entry['status'] = response.status_code
+            entry['headers'] = {h: response.headers[h] for h in KEPT_HEADERS if h in response.headers}
+            try:
+                entry['text'] = body.decode('utf-8')
+            except UnicodeDecodeError:
+                entry['b64'] = base64.b64encode(body).decode('ascii')
+            response = build_response(response.url, response.status_code, response.headers, body)
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            self._file.write(line + '\n')
+            self.count += 1
+            if self.count % 50 == 0:
+                self._file.flush()
+        return response
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class Player:
+    def __init__(self, path=UPSTREAM_ARCHIVE, speed=REPLAY_SPEED):
+        self.path = path
+        self.speed = speed
+        self.records = load_archive(path)
+        self.misses = 0
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None):
+        key = request_key(url, params)
+        with self._lock:
+            records = self.records.get(key)
+            if not records:
+                self.misses += 1
+                raise requests.ConnectionError(f"{key} is not in the replay archive")
+            i = self._next.get(key, 0)
+            self._next[key] = (i + 1) % len(records)
+        entry = records[i]
+        if self.speed > 0:
+            time.sleep(entry['elapsed'] / self.speed)
+        if 'error' in entry:
+            error = requests.Timeout if 'Timeout' in entry['error'] else requests.ConnectionError
+            raise error(entry.get('message', entry['error']))
+        body = entry['text'].encode('utf-8') if 'text' in entry else base64.b64decode(entry['b64'])
+        return build_response(key, entry['status'], entry['headers'], body)
+
+
+def load_archive(path):
+    # key -> records in recorded order
+    records = {}
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                entry = json.loads(line)
+                records.setdefault(entry['key'], []).append(entry)
+        except (EOFError, ValueError):
+            pass  # a recording cut off mid-write; keep what was complete
+    return records
+
+
+def from_env():
+    # The recorder or player for UPSTREAM_MODE, or None for live calls
+    if UPSTREAM_MODE == 'record':
+        recorder = Recorder()
+        import atexit
+        atexit.register(recorder.close)
+        print(f"Recording upstream responses to {recorder.path}")
+        return recorder
+    if UPSTREAM_MODE == 'replay':
+        player = Player()
+        print(f"Replaying upstream responses from {player.path} at speed {player.speed}")
+        return player
+    return None
@@ -0,0 +1,58 @@
+import json
+import os
+from collections import namedtuple
+
+SYMBOLS_FILE = os.environ.get('SYMBOLS_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'symbols.json'))
+
+# One watched instrument. `source` is the quote feed (sina/binance/nft),
+# `history` the history provider (None: no chart), `hidden` symbols are
+# fetched (e.g. for conversions) but not listed. `aliases` are other names
+# the instrument has traded under upstream (e.g. after a rename).
+Symbol = namedtuple('Symbol', ['code', 'name', 'source', 'market', 'suffix', 'history', 'yfinance', 'hidden', 'aliases'])
+
+
+class Registry:
+    def __init__(self, symbols):
+        self.symbols = symbols
+        self.by_code = {s.code: s for s in symbols}
+        self.by_source = {}
+        for s in symbols:
+            self.by_source.setdefault(s.source, []).append(s)
+        self.markets = {s.market for s in symbols}
+        self.visible = [s for s in symbols if not s.hidden]
+
+    @classmethod
+    def load(cls, path=SYMBOLS_FILE):
+        with open(path, encoding='utf-8') as f:
+            entries = json.load(f)
+        return cls([
+            Symbol(e['code'], e.get('name', e['code']), e['source'], e.get('market', e['source']),
+                   e.get('suffix', ''), e.get('history'), e.get('yfinance'), e.get('hidden', False),
+                   tuple(e.get('aliases', ())))
+            for e in entries
+        ])
+
+    def get(self, code):
+        return self.by_code.get(code)
+
+    def codes(self, source):
+        return [s.code for s in self.by_source.get(source, [])]
+
+    def aliases(self, source):
+        return {s.code: s.aliases for s in self.by_source.get(source, []) if s.aliases}
+
+
+def batches(codes, max_size, max_chars=None):
+    """Split `codes` into batches of at most `max_size` codes and, if given,
+    at most `max_chars` characters when joined with commas (URL length)."""
+    batch, length = [], 0
+    for code in codes:
+        extra = len(code) + (1 if batch else 0)
+        if batch and (len(batch) >= max_size or (max_chars and length + extra > max_chars)):
+            yield batch
+            batch, length = [], 0
+            extra = len(code)
+        batch.append(code)
+        length += extra
+    if batch:
+        yield batch
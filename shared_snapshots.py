@@ -0,0 +1,127 @@
+"""Collector snapshots shared by every worker process on the host, through files.
+
+gunicorn forks several workers, each with its own Collector. Without sharing,
+every worker refreshes every source, so the upstream load grows with the
+worker count. With a SharedSnapshots directory:
+
+- one process holds the leader lock (an flock on `leader.lock`) and is the
+  only one that refreshes sources on their schedule; when it exits the lock
+  is released and another worker takes over within a poll interval
+- every published snapshot is written to `<source>.json` (written to a
+  temporary file, then renamed over the old one, so readers never see half a
+  file) and the other workers load it when the file changes
+- a refresh takes the source's own lock (`<source>.lock`) and workers that
+  need a value at the same time (cold start, refresh-on-read deploys) wait for
+  it and read its result instead of fetching too
+
+flock is POSIX only; without fcntl (Windows) every process refreshes for
+itself as before.
+"""
+import json
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'snapshots'))
+
+
+class SharedSnapshots:
+    def __init__(self, directory=SNAPSHOT_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._leader_file = None
+        # name -> (inode, mtime) of the file last read, to skip unchanged ones
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def _path(self, name, suffix):
+        return os.path.join(self.directory, f"{name}{suffix}")
+
+    @property
+    def is_leader(self):
+        return self._leader_file is not None
+
+    def try_lead(self):
+        """Take the leader lock if nobody holds it; kept until the process exits."""
+        with self._lock:
+            if self._leader_file is not None:
+                return True
+            f = open(self._path('leader', '.lock'), 'a')
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                return False
+            self._leader_file = f
+            return True
+
+    def lock(self, names):
+        return _FileLocks([self._path(name, '.lock') for name in sorted(names)])
+
+    def write(self, name, snapshot):
+        payload = {'status': snapshot.status, 'updated_at': snapshot.updated_at, 'data': snapshot.data}
+        tmp = self._path(f".{name}.{os.getpid()}.{threading.get_ident()}", '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp, self._path(name, '.json'))
+
+    def read(self, name, changed_only=True):
+        """The payload of `name` and the file's mtime, or None when there is
+        none (or, with `changed_only`, it has not changed since the last read)."""
+        path = self._path(name, '.json')
+        try:
+            with open(path, encoding='utf-8') as f:
+                st = os.fstat(f.fileno())
+                stamp = (st.st_ino, st.st_mtime_ns)
+                if changed_only and self._seen.get(name) == stamp:
+                    return None
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._seen[name] = stamp
+        return payload, st.st_mtime
+
+    def clear(self):
+        self._seen.clear()
+        for entry in os.listdir(self.directory):
+            if entry.endswith('.json'):
+                try:
+                    os.remove(os.path.join(self.directory, entry))
+                except OSError:
+                    pass
+
+
+class _FileLocks:
+    # Exclusive flocks on several files, taken in the given (sorted) order
+    def __init__(self, paths):
+        self.paths = paths
+        self._files = []
+
+    def __enter__(self):
+        for path in self.paths:
+            f = open(path, 'a')
+            fcntl.flock(f, fcntl.LOCK_EX)
+            self._files.append(f)
+        return self
+
+    def __exit__(self, *exc):
+        for f in reversed(self._files):
+            f.close()  # closing releases the flock
+        self._files = []
+
+
+def from_env():
+    # The shared directory for this deploy, or None: serverless instances
+    # (vercel.json) share no disk, and SHARED_SNAPSHOTS=0 turns it off
+    setting = os.environ.get('SHARED_SNAPSHOTS')
+    if setting is not None and setting in ('0', 'false', 'no'):
+        return None
+    if setting is None and os.environ.get('VERCEL'):
+        return None
+    if fcntl is None:
+        return None
+    return SharedSnapshots()
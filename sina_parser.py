@@ -0,0 +1,86 @@
+from collections import namedtuple
+
+# A parsed hq.sinajs.cn line. Fields a market does not provide are None.
+Quote = namedtuple('Quote', ['code', 'market', 'price', 'prev_close', 'open', 'high', 'low', 'volume', 'name'],
+                   defaults=(None,) * 5)
+
+# Field -> index into the comma-separated values, per market. Adding a symbol
+# of a known market needs no code; adding a market is one entry here.
+SCHEMAS = {
+    # var hq_str_sh600519="贵州茅台,open,prev_close,price,high,low,bid,ask,volume,..."
+    'a': {'name': 0, 'open': 1, 'prev_close': 2, 'price': 3, 'high': 4, 'low': 5, 'volume': 8},
+    # var hq_str_hk03690="MEITUAN-W,美团-W,open,prev_close,high,low,price,change,pct,..."
+    'hk': {'name': 1, 'open': 2, 'prev_close': 3, 'high': 4, 'low': 5, 'price': 6, 'volume': 12},
+    # var hq_str_gb_crcl="Circle,price,pct,time,change,open,high,low,...,prev_close(26),..."
+    'us': {'name': 0, 'price': 1, 'open': 5, 'high': 6, 'low': 7, 'volume': 10, 'prev_close': 26},
+    # var hq_str_hf_GC="price,,bid,ask,high,low,time,prev_close,open,..."
+    'futures': {'price': 0, 'high': 4, 'low': 5, 'prev_close': 7, 'open': 8},
+    # var hq_str_fx_susdcny="time,price,ask,prev_close,..."
+    'forex': {'price': 1, 'prev_close': 3},
+}
+
+# Code prefix -> market; three-character prefixes are checked first
+PREFIXES = {
+    'gb_': 'us', 'hf_': 'futures', 'fx_': 'forex',
+    'sh': 'a', 'sz': 'a', 'bj': 'a', 'hk': 'hk',
+}
+
+# Markets whose prev_close field may be empty; the price stands in for it
+PREV_CLOSE_OPTIONAL = {'futures', 'forex'}
+
+LINE_PREFIX = 'var hq_str_'
+
+
+def market_of(code):
+    return PREFIXES.get(code[:3]) or PREFIXES.get(code[:2])
+
+
+def parse(payload):
+    """Parse a raw hq.sinajs.cn response (bytes, gb18030) into {code: Quote}.
+
+    The payload is decoded once; each line is then sliced by position rather
+    than split on '=' and searched for the code.
+    """
+    text = payload.decode('gb18030', errors='replace') if isinstance(payload, bytes) else payload
+    quotes = {}
+    prefix_len = len(LINE_PREFIX)
+    for line in text.split('\n'):
+        eq = line.find('=', prefix_len)
+        if eq < 0 or not line.startswith(LINE_PREFIX):
+            continue
+        code = line[prefix_len:eq]
+        market = market_of(code)
+        if market is None:
+            continue
+        # Value sits between the quotes after '='; empty for unknown codes
+        end = line.rfind('"')
+        if end <= eq + 2:
+            continue
+        quote = parse_values(code, market, line[eq + 2:end].split(','))
+        if quote is not None:
+            quotes[code] = quote
+    return quotes
+
+
+def parse_values(code, market, values):
+    fields = {}
+    n = len(values)
+    for field, index in SCHEMAS[market].items():
+        if index >= n:
+            continue
+        raw = values[index]
+        if field == 'name':
+            fields[field] = raw
+            continue
+        try:
+            fields[field] = float(raw)
+        except ValueError:
+            pass
+    price = fields.get('price')
+    if price is None:
+        return None
+    if fields.get('prev_close') is None:
+        if market not in PREV_CLOSE_OPTIONAL:
+            return None
+        fields['prev_close'] = price
+    return Quote(code, market, **fields)
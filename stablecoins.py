@@ -0,0 +1,100 @@
+import json
+
+import upstream
+
+try:
+    import ijson
+except ImportError:  # falls back to loading the whole document
+    ijson = None
+
+STABLECOINS_URL = "https://stablecoins.llama.fi/stablecoins?includePrices=true"
+
+TARGET_COINS = ('USDT', 'USDC')
+
+ASSETS_PREFIX = 'peggedAssets.item'
+
+
+def iter_assets(fp):
+    """Yield one small dict per peggedAssets entry, reading `fp` (a binary
+    file-like) incrementally: only one asset is decoded at a time and only the
+    fields the summary needs are kept from it."""
+    if ijson is None:
+        assets = json.load(fp).get('peggedAssets', [])
+    else:
+        assets = ijson.items(fp, ASSETS_PREFIX, use_float=True)
+    for asset in assets:
+        record = {
+            'symbol': asset.get('symbol'),
+            'name': asset.get('name'),
+            'circulating': (asset.get('circulating') or {}).get('peggedUSD', 0),
+            'prev_day': (asset.get('circulatingPrevDay') or {}).get('peggedUSD', 0),
+        }
+        if 'price' in asset:
+            record['price'] = asset['price']
+        yield record
+
+
+def summarize(assets, targets=TARGET_COINS):
+    # The dashboard's view: target coins with 24h issuance, plus market share
+    coins_list = []
+    market_share = {symbol: 0 for symbol in targets}
+    market_share['Others'] = 0
+    total_mcap = 0
+    for asset in assets:
+        circulating = asset.get('circulating') or 0
+        total_mcap += circulating
+        symbol = asset.get('symbol')
+        if symbol not in targets:
+            continue
+        market_share[symbol] = circulating
+        # Prev Day (to calc 24h change/issuance)
+        prev_day = asset.get('prev_day') or 0
+        change_24h = circulating - prev_day
+        coins_list.append({
+            'name': asset.get('name'),
+            'symbol': symbol,
+            'price': asset.get('price', 1.0),
+            'total_supply': circulating,
+            'change_24h': change_24h,
+            'change_24h_pct': (change_24h / prev_day * 100) if prev_day else 0,
+        })
+    market_share['Others'] = total_mcap - sum(market_share[symbol] for symbol in targets)
+    return {'coins': coins_list, 'market_share': market_share}
+
+
+class StablecoinFeed:
+    """The DeFiLlama stablecoin summary, refreshed with conditional requests.
+
+    The validators (ETag / Last-Modified) of the last good response are sent
+    back; a 304 reuses the previous summary without downloading or parsing
+    anything.
+    """
+
+    def __init__(self, url=STABLECOINS_URL):
+        self.url = url
+        self.etag = None
+        self.last_modified = None
+        self.result = None
+        self.not_modified = 0
+
+    def fetch(self):
+        headers = {}
+        if self.result is not None:
+            if self.etag:
+                headers['If-None-Match'] = self.etag
+            if self.last_modified:
+                headers['If-Modified-Since'] = self.last_modified
+        r = upstream.get(self.url, headers=headers, stream=True)
+        try:
+            if r.status_code == 304 and self.result is not None:
+                self.not_modified += 1
+                return self.result
+            r.raise_for_status()
+            r.raw.decode_content = True
+            result = summarize(iter_assets(r.raw))
+        finally:
+            r.close()
+        self.etag = r.headers.get('ETag')
+        self.last_modified = r.headers.get('Last-Modified')
+        self.result = result
+        return result
@@ -0,0 +1,102 @@
+import json
+import os
+import threading
+
+
+def sse(event, data, event_id=None):
+    # One Server-Sent Events message
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class StreamClient:
+    """What one /api/stream connection has already been sent, so that each push
+    carries only what changed since the last one."""
+
+    def __init__(self):
+        self.versions = {}
+        self.rows = {}
+        self.seen = {}
+        self.depth = None
+
+    def changed(self, group, versions):
+        if self.versions.get(group) == versions:
+            return False
+        self.versions[group] = versions
+        return True
+
+    def price_changes(self, rows):
+        changed = [row for row in rows if self.rows.get(row['code']) != row]
+        self.rows = {row['code']: row for row in rows}
+        return changed
+
+    def new_items(self, kind, items, key):
+        # Items not present in the previously sent batch
+        seen = self.seen.get(kind, set())
+        fresh = [item for item in items if key(item) not in seen]
+        self.seen[kind] = {key(item) for item in items}
+        return fresh
+
+    def depth_delta(self, view, deltas):
+        # The levels of the shared aggregated `view` that differ from the one
+        # sent last; the first message resets the client's book
+        delta = deltas.between(self.depth, view)
+        self.depth = view
+        if delta['reset'] or delta['bids'] or delta['asks']:
+            return delta
+        return None
+
+
+class DepthDeltas:
+    """Level changes between two aggregated depth views (orderbook.aggregate),
+    as [price, amount] pairs per side with amount 0 for a level that is gone.
+
+    The views are shared by every stream client and clients move from one book
+    version to the next together, so the last delta is kept and reused by all
+    of them instead of being diffed once per client."""
+
+    def __init__(self):
+        self._last = None
+
+    def between(self, previous, current):
+        last = self._last
+        if last is not None and last[0] is previous and last[1] is current:
+            return last[2]
+        delta = {'bucket': current['bucket'], 'levels': current['levels'], 'reset': previous is None}
+        for side in ('bids', 'asks'):
+            now = dict(zip(current[side]['price'], current[side]['amount']))
+            before = dict(zip(previous[side]['price'], previous[side]['amount'])) if previous is not None else {}
+            changes = [[price, amount] for price, amount in now.items() if before.get(price) != amount]
+            changes += [[price, 0] for price in before if price not in now]
+            delta[side] = changes
+        self._last = (previous, current, delta)
+        return delta
+
+
+class StreamSlots:
+    """Caps the open /api/stream connections of a threaded WSGI server, where
+    each one holds a server thread for as long as it stays open. Past the cap
+    the route answers 503 and the dashboard polls instead, so the other routes
+    keep threads to run on. asgi.py serves streams as coroutines, uncapped."""
+
+    def __init__(self, limit=None):
+        if limit is None:
+            limit = int(os.environ.get('STREAM_MAX_CLIENTS', '8'))
+        self.limit = limit
+        self.open = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.open >= self.limit:
+                return False
+            self.open += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.open -= 1
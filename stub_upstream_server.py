@@ -0,0 +1,243 @@
+"""Local stand-in for every upstream the app calls, for load tests.
+
+Answers Sina quotes and klines, Binance spot and futures, OKX, Jin10 and
+DeFiLlama with generated data shaped like the real responses, after a
+configurable latency and with a configurable failure rate. Run the app with
+UPSTREAM_OVERRIDE pointing here; upstream.get then sends every call to this
+server with the original host in the X-Upstream-Host header.
+
+    python stub_upstream_server.py --port 9100 --latency-ms 80 --failure-rate 0.05
+    UPSTREAM_OVERRIDE=http://127.0.0.1:9100 DEPTH_STREAM=0 LIQUIDATION_STREAM=0 python app.py
+"""
+import argparse
+import datetime
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import sina_parser
+from bench_stablecoins import make_payload as make_stablecoin_payload
+
+
+def base_price(code):
+    # Stable per-code price level between 1 and ~100k
+    return 10 ** (zlib.crc32(code.encode()) % 500 / 100)
+
+
+def live_price(code):
+    # Drifts slowly so successive polls see changes
+    return base_price(code) * (1 + 0.01 * ((time.time() / 7 + zlib.crc32(code.encode())) % 10 - 5) / 5)
+
+
+def sina_quotes(codes):
+    lines = []
+    for code in codes:
+        market = sina_parser.market_of(code)
+        if market is None:
+            lines.append(f'var hq_str_{code}="";')
+            continue
+        schema = sina_parser.SCHEMAS[market]
+        values = ['0'] * (max(schema.values()) + 1)
+        price = live_price(code)
+        fields = {'name': code, 'price': price, 'prev_close': base_price(code), 'open': base_price(code),
+                  'high': price * 1.01, 'low': price * 0.99, 'volume': 123456}
+        for field, index in schema.items():
+            value = fields[field]
+            values[index] = value if isinstance(value, str) else f"{value:.4f}"
+        lines.append(f'var hq_str_{code}="{",".join(values)}";')
+    return '\n'.join(lines).encode('gb18030')
+
+
+def daily_bars(n=1000):
+    today = datetime.date.today()
+    return [today - datetime.timedelta(days=n - 1 - i) for i in range(n)]
+
+
+KLINE_INTERVALS = {'1m': 60, '5m': 300, '1h': 3600, '1d': 86400}
+
+
+def ohlcv(code, n):
+    # A deterministic bar, the `n`th of its interval (days: the date's
+    # ordinal): a slow wave around the code's price level
+    price = base_price(code)
+    close = price * (1 + 0.1 * math.sin(n / 9) + 0.02 * math.sin(n * 1.7))
+    open_ = price * (1 + 0.1 * math.sin((n - 1) / 9) + 0.02 * math.sin((n - 1) * 1.7))
+    spread = price * 0.01 * (1 + n % 3)
+    return open_, max(open_, close) + spread, min(open_, close) - spread, close, 1000 + n % 97 * 10
+
+
+class StubUpstreams:
+    def __init__(self, host='127.0.0.1', port=9100, latency_ms=50, jitter_ms=0, failure_rate=0.0,
+                 failure_mode='status', seed=None):
+        self.host = host
+        self.port = port
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.failure_mode = failure_mode
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.failures = 0
+        self._stablecoins = make_stablecoin_payload(n_assets=60, n_chains=8)
+        self._server = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self._server.server_address[1]}"
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; with Nagle on, the
+            # body waits for the client's delayed ACK (~40 ms per response)
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                stub.requests += 1
+                delay = stub.latency_ms + stub.rng.uniform(-stub.jitter_ms, stub.jitter_ms)
+                time.sleep(max(delay, 0) / 1000)
+                if stub.rng.random() < stub.failure_rate:
+                    stub.failures += 1
+                    if stub.failure_mode == 'reset':
+                        self.close_connection = True
+                        return
+                    self._send(503, 'text/plain', b'stub failure')
+                    return
+                host = self.headers.get('X-Upstream-Host', '')
+                parts = urlsplit(self.path)
+                status, content_type, body = stub.route(host, unquote(parts.path), parse_qs(parts.query))
+                self._send(status, content_type, body)
+
+            def _send(self, status, content_type, body):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='stub-upstreams', daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def route(self, host, path, query):
+        q = {k: v[0] for k, v in query.items()}
+        now_ms = int(time.time() * 1000)
+
+        if host == 'hq.sinajs.cn' and path.startswith('/list='):
+            return 200, 'application/javascript; charset=GBK', sina_quotes(path[len('/list='):].split(','))
+
+        if host == 'api.binance.com':
+            if path == '/api/v3/ticker/24hr':
+                symbols = json.loads(q['symbols']) if 'symbols' in q else ['BTCUSDT', 'ETHUSDT', 'POLUSDT']
+                return self._json([{'symbol': s, 'lastPrice': f"{live_price(s):.4f}",
+                                    'prevClosePrice': f"{base_price(s):.4f}"} for s in symbols])
+            if path == '/api/v3/ticker/price':
+                return self._json([{'symbol': s, 'price': f"{live_price(s):.4f}"}
+                                   for s in ('BTCUSDT', 'ETHUSDT', 'POLUSDT', 'MATICUSDT')])
+            if path == '/api/v3/depth':
+                limit = int(q.get('limit', 100))
+                mid = live_price('BTCUSDT')
+                return self._json({
+                    'lastUpdateId': now_ms,
+                    'bids': [[f"{mid - 0.1 * (i + 1):.2f}", f"{self.rng.uniform(0.001, 3):.5f}"] for i in range(limit)],
+                    'asks': [[f"{mid + 0.1 * (i + 1):.2f}", f"{self.rng.uniform(0.001, 3):.5f}"] for i in range(limit)],
+                })
+            if path == '/api/v3/klines':
+                symbol = q.get('symbol', 'BTCUSDT')
+                step = KLINE_INTERVALS[q.get('interval', '1d')]
+                limit = int(q.get('limit', 500))
+                last = int(time.time()) // step
+                first = -(-int(q['startTime']) // (step * 1000)) if 'startTime' in q else last - limit + 1
+                # Day n of the epoch is ordinal n + 719163
+                offset = 719163 if step == 86400 else 0
+                return self._json([[n * step * 1000] + [f"{v:.2f}" for v in ohlcv(symbol, n + offset)]
+                                   for n in range(first, min(last, first + limit - 1) + 1)])
+
+        if host == 'fapi.binance.com' and path == '/fapi/v1/allForceOrders':
+            symbol = q.get('symbol', 'BTCUSDT')
+            price = live_price(symbol)
+            return self._json([{'symbol': symbol, 'side': self.rng.choice(['BUY', 'SELL']), 'price': f"{price:.2f}",
+                                'origQty': f"{self.rng.uniform(0.01, 5):.3f}", 'time': now_ms - i * 1000}
+                               for i in range(int(q.get('limit', 5)))])
+
+        if host == 'www.okx.com':
+            return self._json({'code': '0', 'data': [{'floorPrice': f"{live_price('liberty-cats'):.2f}"}]})
+
+        if host == 'flash-api.jin10.com':
+            now = datetime.datetime.now()
+            return self._json({'status': 200, 'data': [
+                {'id': str(now_ms // 30000 - i), 'time': (now - datetime.timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S'),
+                 'data': {'content': f"Stub flash news item {now_ms // 30000 - i}"}}
+                for i in range(20)
+            ]})
+
+        if host == 'stablecoins.llama.fi':
+            return 200, 'application/json', self._stablecoins
+
+        if host == 'money.finance.sina.com.cn':
+            symbol = q.get('symbol', 'sh600519')
+            keys = ('day', 'open', 'high', 'low', 'close', 'volume')
+            datalen = int(q.get('datalen', 100))
+            scale = int(q.get('scale', 240))
+            if scale == 240:
+                return self._json([dict(zip(keys, [d.isoformat()] + [f"{v:.2f}" for v in ohlcv(symbol, d.toordinal())]))
+                                   for d in daily_bars(datalen)])
+            # Intraday: bar times in Beijing time, around the clock
+            step = scale * 60
+            last = int(time.time()) // step
+            china = datetime.timezone(datetime.timedelta(hours=8))
+            return self._json([dict(zip(keys, [datetime.datetime.fromtimestamp(n * step, china).strftime('%Y-%m-%d %H:%M:%S')]
+                                        + [f"{v:.2f}" for v in ohlcv(symbol, n)]))
+                               for n in range(last - datalen + 1, last + 1)])
+
+        if host.endswith('finance.sina.com.cn') and 'jsonp' in path:
+            # var _X=([{"date":..,"open":..,..,"volume":..}]); the US endpoint uses d/o/h/l/c/v
+            symbol = q.get('symbol', 'X')
+            keys = ('d', 'o', 'h', 'l', 'c', 'v') if 'US_MinKService' in path else ('date', 'open', 'high', 'low', 'close', 'volume')
+            rows = ','.join(json.dumps(dict(zip(keys, [d.isoformat()] + [f"{v:.2f}" for v in ohlcv(symbol, d.toordinal())])),
+                                       separators=(',', ':')) for d in daily_bars())
+            return 200, 'application/javascript', f"var _{symbol}=([{rows}]);".encode()
+
+        return 404, 'text/plain', f"no stub for {host}{path}".encode()
+
+    def _json(self, value):
+        return 200, 'application/json', json.dumps(value).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--port', type=int, default=9100)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--failure-mode', choices=['status', 'reset'], default='status')
+    args = parser.parse_args()
+
+    stub = StubUpstreams(port=args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                         failure_rate=args.failure_rate, failure_mode=args.failure_mode).start()
+    print(f"Stub upstreams on {stub.url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+import asyncio
+import socket
+import tempfile
+
+import httpx
+import requests
+
+# First: sets the environment upstream reads at import time
+from conftest import start_stub
+
+import async_upstream
+import upstream
+from breaker import HALF_OPEN, OPEN
+from collector import Collector
+
+
+def test_async_get(stub):
+    async def run():
+        r = await async_upstream.get('https://api.binance.com/api/v3/ticker/price')
+        assert isinstance(r, requests.Response) and r.status_code == 200
+        assert {t['symbol'] for t in r.json()} >= {'BTCUSDT'}
+        r = await async_upstream.get('https://example.invalid/nothing')
+        assert r.status_code == 404
+        await async_upstream.aclose()
+    asyncio.run(run())
+
+
+def test_connection_errors_are_requests_errors():
+    async def run():
+        try:
+            await async_upstream.get('http://127.0.0.1:9/', retries=0)
+            assert False
+        except requests.ConnectionError:
+            pass
+        await async_upstream.aclose()
+    saved = async_upstream.upstream.UPSTREAM_OVERRIDE
+    async_upstream.upstream.UPSTREAM_OVERRIDE = None
+    try:
+        asyncio.run(run())
+    finally:
+        async_upstream.upstream.UPSTREAM_OVERRIDE = saved
+
+
+def test_cancelled_trial_releases_breaker():
+    # Accepts connections (the kernel does) but never answers
+    stalled = socket.socket()
+    stalled.bind(('127.0.0.1', 0))
+    stalled.listen()
+    url = f"http://localhost:{stalled.getsockname()[1]}/"
+    breaker = upstream.breakers.get('localhost')
+    breaker.state, breaker.opened_at = OPEN, 0      # cooled down: the next call is the trial
+
+    async def run():
+        try:
+            await asyncio.wait_for(async_upstream.get(url, retries=0, timeout=5), 0.2)
+            assert False
+        except asyncio.TimeoutError:
+            pass
+        await async_upstream.aclose()
+    saved = async_upstream.upstream.UPSTREAM_OVERRIDE
+    async_upstream.upstream.UPSTREAM_OVERRIDE = None
+    try:
+        asyncio.run(run())
+        # The trial is over without a verdict; the next call gets to try
+        assert breaker.state == HALF_OPEN
+        breaker.before()
+    finally:
+        async_upstream.upstream.UPSTREAM_OVERRIDE = saved
+        upstream.breakers._breakers.pop('localhost', None)
+        stalled.close()
+
+
+def test_arefresh():
+    async def slow():
+        await asyncio.sleep(0.1)
+        return {'v': 'late'}
+
+    async def run():
+        c = Collector()
+        c.register('fast', lambda: {'v': 'thread'}, interval=60, deadline=1)
+        c.register('slow', lambda: None, interval=60, deadline=0.02, afetch=slow)
+        assert (await c.arefresh('fast')).data == {'v': 'thread'}   # sync fetch, on a thread
+        c.publish('slow', {'v': 'old'})
+        assert (await c.arefresh('slow')).status == 'stale'         # missed the deadline...
+        await asyncio.sleep(0.15)
+        assert c._snapshots['slow'].data == {'v': 'late'}            # ...taken when it arrived
+    asyncio.run(run())
+
+
+def test_history_coalesced(stub):
+    import asgi
+    import cache
+    from history_store import HistoryStore
+
+    # Other tests load ETHUSDT too: start from an empty store and caches
+    asgi.wsgi.history_store = HistoryStore(tempfile.mkdtemp())
+    cache.clear_all()
+
+    async def run():
+        before = stub.requests
+        transport = httpx.ASGITransport(app=asgi.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            responses = await asyncio.gather(*[client.get('/api/history/ETHUSDT') for _ in range(20)])
+            assert {r.status_code for r in responses} == {200}
+            assert len({r.text for r in responses}) == 1
+            assert stub.requests - before == 1
+            r = await client.get('/api/history/ETHUSDT?from=nope')
+            assert r.status_code == 400
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    stub = start_stub()
+    test_async_get(stub)
+    test_connection_errors_are_requests_errors()
+    test_cancelled_trial_releases_breaker()
+    test_arefresh()
+    test_history_coalesced(stub)
+    stub.stop()
+    print("OK")
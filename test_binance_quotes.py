@@ -0,0 +1,85 @@
+import json
+
+import binance_quotes
+from binance_quotes import QuoteEngine
+
+LISTED = {
+    'BTCUSDT': ('95000.5', '94000.0'),
+    'ETHUSDT': ('3300.1', '3350.0'),
+    'MATICUSDT': ('0.41', '0.40'),
+}
+
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+
+def fake_binance(calls):
+    def get(url, params=None, **kwargs):
+        calls.append((url, params))
+        if url == binance_quotes.PRICE_URL:
+            return FakeResponse(200, [{'symbol': s, 'price': p} for s, (p, _) in LISTED.items()])
+        wanted = json.loads(params['symbols']) if params else list(LISTED)
+        if any(s not in LISTED for s in wanted):
+            return FakeResponse(400, {'code': -1121, 'msg': 'Invalid symbol.'})
+        return FakeResponse(200, [
+            {'symbol': s, 'lastPrice': LISTED[s][0], 'prevClosePrice': LISTED[s][1]} for s in wanted
+        ])
+    return get
+
+
+def test_batch_and_alias():
+    calls = []
+    original = binance_quotes.upstream.get
+    binance_quotes.upstream.get = fake_binance(calls)
+    try:
+        engine = QuoteEngine({'POLUSDT': ['MATICUSDT']})
+        codes = ['BTCUSDT', 'ETHUSDT', 'POLUSDT']
+
+        # First refresh: rejected batch, one symbol listing, retried batch
+        quotes = engine.fetch(codes)
+        assert quotes == {
+            'BTCUSDT': {'price': 95000.5, 'prev_close': 94000.0},
+            'ETHUSDT': {'price': 3300.1, 'prev_close': 3350.0},
+            'POLUSDT': {'price': 0.41, 'prev_close': 0.40},
+        }
+        assert len(calls) == 3
+
+        # The alias is remembered: one request from now on
+        calls.clear()
+        assert engine.fetch(codes) == quotes
+        assert len(calls) == 1
+        assert json.loads(calls[0][1]['symbols']) == ['BTCUSDT', 'ETHUSDT', 'MATICUSDT']
+    finally:
+        # upstream.get is shared with every other test in the process
+        binance_quotes.upstream.get = original
+
+
+def test_unlisted_symbol_dropped():
+    calls = []
+    original = binance_quotes.upstream.get
+    binance_quotes.upstream.get = fake_binance(calls)
+    try:
+        engine = QuoteEngine()
+        quotes = engine.fetch(['BTCUSDT', 'NOPEUSDT'])
+        assert set(quotes) == {'BTCUSDT'}
+        calls.clear()
+        engine.fetch(['BTCUSDT', 'NOPEUSDT'])
+        assert len(calls) == 1
+    finally:
+        binance_quotes.upstream.get = original
+
+
+if __name__ == "__main__":
+    test_batch_and_alias()
+    test_unlisted_symbol_dropped()
+    print("OK")
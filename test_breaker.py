@@ -0,0 +1,72 @@
+import time
+
+import requests
+
+import upstream
+from breaker import Breaker, CircuitOpen, CLOSED, OPEN, HALF_OPEN
+
+
+def test_breaker_states():
+    b = Breaker('example.invalid', threshold=2, cooldown=0.05)
+    b.before(); b.failure()
+    b.before(); b.failure()
+    assert b.state == OPEN
+    try:
+        b.before()
+        assert False, "should fail fast"
+    except CircuitOpen:
+        pass
+    time.sleep(0.06)
+    b.before()                      # the half-open trial
+    assert b.state == HALF_OPEN
+    try:
+        b.before()                  # everyone else still fails fast
+        assert False
+    except CircuitOpen:
+        pass
+    b.failure()                     # trial failed: open, longer cooldown
+    assert b.state == OPEN and b.cooldown == 0.1
+    time.sleep(0.11)
+    b.before(); b.success()
+    assert b.state == CLOSED and b.cooldown == 0.05
+
+
+def test_get_fails_fast_when_open():
+    calls = []
+
+    def unreachable(url, **kwargs):
+        calls.append(url)
+        raise requests.ConnectionError("unreachable")
+
+    original = upstream.session.get
+    upstream.session.get = unreachable
+    # A breaker of our own for fapi, whatever other tests did with it; theirs
+    # is put back afterwards
+    saved = upstream.breakers._breakers.pop('fapi.binance.com', None)
+    try:
+        url = "https://fapi.binance.com/fapi/v1/allForceOrders?symbol=BTCUSDT"
+        for _ in range(5):
+            try:
+                upstream.get(url)
+            except requests.ConnectionError:
+                pass
+        # fapi opens after 2 failures and allows no retries
+        assert len(calls) == 2
+        assert upstream.breakers.status()['fapi.binance.com']['state'] == OPEN
+        started = time.time()
+        try:
+            upstream.get(url)
+        except CircuitOpen:
+            pass
+        assert time.time() - started < 0.05
+    finally:
+        upstream.session.get = original
+        upstream.breakers._breakers.pop('fapi.binance.com', None)
+        if saved is not None:
+            upstream.breakers._breakers['fapi.binance.com'] = saved
+
+
+if __name__ == "__main__":
+    test_breaker_states()
+    test_get_fails_fast_when_open()
+    print("OK")
@@ -0,0 +1,117 @@
+import threading
+import time
+
+from cache import Cache, cached
+
+
+def test_ttl_and_stale_while_revalidate():
+    calls = []
+    refreshed = threading.Event()
+
+    def loader():
+        calls.append(time.time())
+        if len(calls) == 2:
+            refreshed.set()
+        return len(calls)
+
+    c = Cache('test-swr', ttl=0.05, stale_ttl=10)
+    assert c.get('k', loader) == 1          # miss, loaded inline
+    assert c.get('k', loader) == 1          # fresh hit
+    time.sleep(0.06)
+    assert c.get('k', loader) == 1          # stale: old value served at once...
+    assert c.get('k', loader) == 1          # ...with only one refresh started
+    assert refreshed.wait(2)
+    time.sleep(0.01)
+    assert c.get('k', loader) == 2
+    assert len(calls) == 2
+    stats = c.stats()
+    assert (stats['misses'], stats['stale_hits'], stats['refreshes']) == (1, 2, 1)
+
+
+def test_lru_eviction_and_accept():
+    c = Cache('test-lru', ttl=60, max_size=2)
+    c.get('a', lambda: 'A')
+    c.get('b', lambda: 'B')
+    c.get('a', lambda: 'x')                 # touch a, b is now oldest
+    c.get('c', lambda: 'C')
+    assert c.get('b', lambda: 'B2') == 'B2'  # b was evicted
+    assert c.stats()['evictions'] == 2
+
+    # Empty results are returned but not cached
+    @cached(ttl=60, name='test-accept')
+    def flaky(n):
+        return [] if n == 0 else [n]
+    assert flaky(0) == [] and flaky(0) == []
+    assert flaky(1) == [1] and flaky(1) == [1]
+    assert flaky.cache.stats()['misses'] == 3
+
+
+def test_single_flight():
+    calls = []
+    release = threading.Event()
+
+    def loader():
+        calls.append(1)
+        release.wait(2)
+        return 'v'
+
+    c = Cache('test-flight', ttl=60)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(c.get('k', loader))) for _ in range(10)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    release.set()
+    for t in threads:
+        t.join()
+    assert calls == [1] and results == ['v'] * 10
+    assert (c.stats()['misses'], c.stats()['coalesced']) == (1, 9)
+
+    # A loader exception reaches every waiter and is not cached
+    def failing():
+        time.sleep(0.05)
+        raise ValueError('down')
+    errors = []
+
+    def get():
+        try:
+            c.get('e', failing)
+        except ValueError as e:
+            errors.append(e)
+    threads = [threading.Thread(target=get) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(errors) == 3
+    assert c.get('e', lambda: 'ok') == 'ok'
+
+
+def test_error_ttl():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return {'error': 'throttled'} if len(calls) < 3 else {'dates': [1]}
+
+    c = Cache('test-negative', ttl=60, stale_ttl=60, accept=lambda r: 'error' not in r, error_ttl=0.05)
+    assert c.get('k', loader) == {'error': 'throttled'}
+    assert c.get('k', loader) == {'error': 'throttled'}     # served without a call
+    assert len(calls) == 1 and c.stats()['negative_hits'] == 1
+    time.sleep(0.06)
+    c.get('k', loader)                                        # expired: tried again
+    time.sleep(0.06)
+    assert c.get('k', loader) == {'dates': [1]}
+    assert len(calls) == 3
+
+    # A failure does not replace a good value that can still be served
+    c._store('k', {'error': 'throttled'})
+    assert c.get('k', loader) == {'dates': [1]}
+
+
+if __name__ == "__main__":
+    test_ttl_and_stale_while_revalidate()
+    test_lru_eviction_and_accept()
+    test_single_flight()
+    test_error_ttl()
+    print("OK")
@@ -0,0 +1,118 @@
+import threading
+import time
+
+from collector import Collector
+from fanout import FanOut
+
+
+def test_rejected_results_keep_the_last_good_value():
+    results = iter([{'price': 0, 'is_fallback': True}, {'price': 2}, {'price': 0, 'is_fallback': True}])
+    c = Collector(background=False)
+    c.register('nft', lambda: next(results), 60, deadline=1, accept=lambda r: not r.get('is_fallback'))
+
+    # Nothing better yet: the fallback is published
+    assert c.refresh('nft').data == {'price': 0, 'is_fallback': True}
+    assert c.refresh('nft').data == {'price': 2}
+    # ... but never over a real value, which is served as stale instead
+    snapshot = c.refresh('nft')
+    assert snapshot.data == {'price': 2} and snapshot.status == 'stale'
+
+
+def slow(value, seconds, release=None):
+    def fetch():
+        if release is not None:
+            release.wait(seconds)
+        else:
+            time.sleep(seconds)
+        return value
+    return fetch
+
+
+def test_fanout_deadlines():
+    pool = FanOut(4, 'test')
+
+    def broken():
+        raise ValueError('bad')
+
+    started = time.monotonic()
+    results = pool.run({'fast': (slow(1, 0), 1), 'slow': (slow(2, 0.3), 0.05), 'broken': (broken, 1)})
+    # Waited for the slowest deadline, not the sum of the calls
+    assert time.monotonic() - started < 0.25
+    assert results['fast'].status == 'ok' and results['fast'].data == 1
+    assert results['slow'].status == 'timeout' and results['slow'].data is None
+    assert results['broken'].status == 'error' and isinstance(results['broken'].error, ValueError)
+    # The late call still finishes on its future
+    assert results['slow'].future.result(1)[0] == 2
+    assert set(pool.timings) == {'fast', 'slow', 'broken'} and pool.timings['slow']['status'] == 'timeout'
+
+
+def test_partial_results_and_late_accept():
+    c = Collector(background=False)
+    values = {'fast': 0, 'slow': 0}
+    release = threading.Event()
+
+    def fast():
+        values['fast'] += 1
+        return {'n': values['fast']}
+
+    def slow_source():
+        values['slow'] += 1
+        n = values['slow']
+        if n > 1:
+            release.wait(2)
+        return {'n': n}
+
+    c.register('fast', fast, 60, deadline=1)
+    c.register('slow', slow_source, 60, deadline=0.05)
+    first = c.refresh_many(['fast', 'slow'])
+    assert first['fast'].status == 'ok' and first['slow'].data == {'n': 1}
+
+    # The slow source misses its deadline: the fast one is published, the
+    # slow one keeps its previous value, marked stale
+    started = time.monotonic()
+    second = c.refresh_many(['fast', 'slow'])
+    assert time.monotonic() - started < 0.5
+    assert second['fast'].data == {'n': 2} and second['fast'].status == 'ok'
+    assert second['slow'].data == {'n': 1} and second['slow'].status == 'stale'
+
+    # ... and takes the late value when it arrives
+    version = c.version
+    release.set()
+    assert c.wait(version, 2) > version
+    snapshot = c.snapshot('slow')
+    assert snapshot.data == {'n': 2} and snapshot.status == 'ok'
+
+
+def test_missing_source_has_no_snapshot():
+    release = threading.Event()
+    c = Collector(background=False)
+    c.register('slow', slow({'n': 1}, 2, release), 60, deadline=0.05)
+    assert c.refresh_many(['slow'])['slow'] is None
+    release.set()
+
+
+def test_versions_and_due_refreshes():
+    calls = []
+    c = Collector(background=False)
+    c.register('a', lambda: calls.append('a') or {'n': len(calls)}, 60, deadline=1)
+    c.register('b', lambda: calls.append('b') or {'n': len(calls)}, 60, deadline=1)
+
+    a, b = c.snapshots(['a', 'b'])
+    assert sorted(calls) == ['a', 'b'] and a.version != b.version and c.version == max(a.version, b.version)
+    # Within its interval a source is read, not fetched
+    assert c.snapshots(['a', 'b']) == [a, b] and len(calls) == 2
+    # Past it, only that source is fetched again, under a newer version
+    c._snapshots['a'].updated_at -= 61
+    again, same = c.snapshots(['a', 'b'])
+    assert calls[2:] == ['a'] and same is b and again.version > b.version
+    # Nothing new: wait() times out on the current version
+    assert c.wait(c.version, 0.01) == c.version
+
+
+if __name__ == '__main__':
+    test_rejected_results_keep_the_last_good_value()
+    test_fanout_deadlines()
+    test_partial_results_and_late_accept()
+    test_missing_source_has_no_snapshot()
+    test_versions_and_due_refreshes()
+    print("OK")
@@ -0,0 +1,61 @@
+import time
+
+import upstream
+from depth_replay_server import ReplayServer, synthetic_session
+from orderbook import DepthStream, aggregate
+
+
+def test_depth_stream_replay():
+    # Replay 2000 generated diffs at 100x with two dropped events; the local
+    # book must resync and end up identical to the server's
+    snapshot, events = synthetic_session(2000)
+    server = ReplayServer(snapshot, events, speed=100, drop=[500, 1500], ws_port=0, http_port=0).start()
+    stream = DepthStream(server.ws_url, server.snapshot_url)
+    # The snapshot comes from the replay server, not the stub upstreams
+    # (conftest.py) every other upstream call of the session goes to
+    saved = upstream.UPSTREAM_OVERRIDE
+    upstream.UPSTREAM_OVERRIDE = None
+    stream.start()
+    try:
+        server.done.wait(30)
+        deadline = time.time() + 10
+        while time.time() < deadline and stream.book.last_update_id != server.book.last_update_id:
+            time.sleep(0.05)
+
+        assert stream.ready
+        assert stream.resyncs >= 2
+        assert stream.book.last_update_id == server.book.last_update_id
+        assert stream.book.bids.prices == server.book.bids.prices
+        assert stream.book.bids.amounts == server.book.bids.amounts
+        assert stream.book.asks.prices == server.book.asks.prices
+        assert stream.book.asks.amounts == server.book.asks.amounts
+
+        depth = stream.depth(10)
+        assert len(depth['bids']['price']) == 10 and len(depth['asks']['price']) == 10
+        assert depth['bids']['price'][0] > depth['bids']['price'][1]
+        assert depth['asks']['price'][0] < depth['asks']['price'][1]
+        assert depth['bids']['price'][0] < depth['asks']['price'][0]
+    finally:
+        stream.stop()
+        server.stop()
+        upstream.UPSTREAM_OVERRIDE = saved
+
+
+def test_aggregate():
+    depth = {
+        'bids': {'price': [100.5, 100.2, 99.9, 99.1], 'amount': [1.0, 2.0, 3.0, 4.0]},
+        'asks': {'price': [100.6, 100.9, 101.2, 102.0], 'amount': [1.0, 1.0, 2.0, 5.0]},
+    }
+    view = aggregate(depth, bucket=1, levels=2)
+    assert view['bids'] == {'price': [100.0, 99.0], 'amount': [3.0, 7.0], 'cum': [3.0, 10.0]}
+    assert view['asks'] == {'price': [101.0, 102.0], 'amount': [2.0, 7.0], 'cum': [2.0, 9.0]}
+
+    raw = aggregate(depth, bucket=0, levels=3)
+    assert raw['bids']['price'] == [100.5, 100.2, 99.9]
+    assert raw['bids']['cum'] == [1.0, 3.0, 6.0]
+
+
+if __name__ == "__main__":
+    test_depth_stream_replay()
+    test_aggregate()
+    print("OK")
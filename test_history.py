@@ -0,0 +1,167 @@
+import datetime
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+
+import numpy as np
+
+from conftest import start_stub
+from downsample import lttb
+from history_store import RETENTION, HistoryStore, Series
+
+
+def test_lttb():
+    x = np.arange(10000, dtype=float)
+    y = np.sin(x / 300)
+    y[4321] = 50  # a spike every-nth sampling would likely drop
+    picked = lttb(x, y, 500)
+    assert len(picked) == 500 and picked[0] == 0 and picked[-1] == 9999
+    assert (np.diff(picked) > 0).all()
+    assert 4321 in picked
+    # The kept points trace the same curve
+    assert np.abs(np.interp(x, x[picked], y[picked]) - y)[np.abs(x - 4321) > 40].max() < 0.05
+
+    assert list(lttb(x[:10], y[:10], 20)) == list(range(10))
+    y[100:200:3] = np.nan
+    assert not np.isnan(y[lttb(x, y, 500)]).any()
+    try:
+        lttb(x, y, 2)
+        assert False
+    except ValueError:
+        pass
+
+
+def test_retention():
+    store = HistoryStore(tempfile.mkdtemp())
+    now = int(time.time())
+    asked = []
+
+    def provider(since):
+        asked.append(since)
+        start = since if since is not None else now - 40 * 86400
+        return [(ts, {'close': 1.0}) for ts in range(start - start % 60, now, 3600)]
+
+    series = store.refresh('X', provider, resolution='1m')
+    assert asked == [None]
+    # Only the last 30 days of minute bars are kept
+    assert series.t[0] >= now - RETENTION['1m'] - 60 and len(series) == len(store.load('X', '1m'))
+    # ... in their own file, next to the daily series
+    assert not store.load('X') and os.path.exists(os.path.join(store.directory, 'X@1m.bin'))
+    series.refreshed_at = 0
+    store.refresh('X', provider, resolution='1m')
+    assert asked[1] == series.t[-1]
+
+
+def test_unwritable_directory(stub):
+    import app
+    # Below a file, so not even root can create it
+    blocker = tempfile.mktemp()
+    open(blocker, 'w').close()
+    saved_store, saved_rows = app.history_store, app.timed_history_rows
+    app.history_store = HistoryStore(os.path.join(blocker, 'history'))
+    app.cache.clear_all()
+    client = app.app.test_client()
+    try:
+        # Served from what was downloaded, and kept in memory until the next refresh
+        before = stub.requests
+        data = client.get('/api/history/ETHUSDT').get_json()
+        assert len(data['dates']) == 30 and stub.requests - before == 1
+        assert len(app.history_store.load('ETHUSDT')) == len(app.history_store.refresh('ETHUSDT', None))
+
+        def down(*args):
+            raise RuntimeError('upstream down')
+        app.timed_history_rows = down
+        data = client.get('/api/history/BTCUSDT').get_json()
+        assert data == {'error': 'upstream down', 'dates': [], 'prices': []}
+    finally:
+        app.history_store, app.timed_history_rows = saved_store, saved_rows
+        app.cache.clear_all()
+
+    # Serverless deploys keep history under /tmp
+    env = {k: v for k, v in os.environ.items() if k != 'HISTORY_DIR'}
+    out = subprocess.run([sys.executable, '-c', 'import history_store; print(history_store.HISTORY_DIR)'],
+                         env=dict(env, VERCEL='1'), capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert out.stdout.strip() == os.path.join(tempfile.gettempdir(), 'history')
+
+
+def test_intraday_routes(stub):
+    import app
+    client = app.app.test_client()
+    since = (datetime.date.today() - datetime.timedelta(days=30)).isoformat()
+
+    # The store keeps a year of 5m bars, fetched on first use as ~106 kline
+    # pages at once; the 30 days asked for are about 8,640 of them
+    before = stub.requests
+    data = client.get(f"/api/history/BTCUSDT?resolution=5m&from={since}&points=800").get_json()
+    assert stub.requests - before > 100
+    assert len(data['dates']) == 800 and data['downsampled_from'] > 8000
+    assert data['resolution'] == '5m' and data['dates'][0].startswith(since)
+    assert data['dates'] == sorted(data['dates']) and len(data['dates'][0]) == len('2026-01-01 00:00')
+    assert all(v is not None for v in data['prices'] + data['volume'])
+
+    # Cached per code, resolution, range and points
+    hits = app.history_bars.cache.stats()['hits']
+    client.get(f"/api/history/BTCUSDT?resolution=5m&from={since}&points=800")
+    assert app.history_bars.cache.stats()['hits'] == hits + 1
+    again = client.get(f"/api/history/BTCUSDT?resolution=5m&from={since}&points=300").get_json()
+    assert len(again['dates']) == 300 and app.history_bars.cache.stats()['hits'] == hits + 1
+
+    # A range that fits is returned as is
+    data = client.get(f"/api/history/BTCUSDT?resolution=1h&from={since}").get_json()
+    assert 24 * 30 <= len(data['dates']) <= 24 * 31 + 1 and 'downsampled_from' not in data
+
+    data = client.get("/api/history/sh688775?resolution=5m&limit=50").get_json()
+    assert len(data['dates']) == 50 and data['dates'][-1] <= time.strftime('%Y-%m-%d %H:%M', time.gmtime())
+
+    # Daily series keep their shape
+    data = client.get('/api/history/ETHUSDT').get_json()
+    assert len(data['dates']) == 30 and data['resolution'] == '1d'
+
+    assert client.get('/api/history/gb_crcl?resolution=5m').get_json()['error']
+    for bad in ('resolution=2m', 'points=2', 'points=x', 'limit=0', 'from=nope'):
+        r = client.get(f"/api/history/BTCUSDT?{bad}")
+        assert r.status_code == 400 and r.get_json()['error'], bad
+
+
+def test_new_bars_reach_cached_ranges(stub):
+    import app
+    client = app.app.test_client()
+    url = '/api/history/ETHUSDT?resolution=1h&limit=5'
+    before = client.get(url).get_json()
+
+    # A new bar lands in the store
+    series = app.history_store.load('ETHUSDT', '1h')
+    updated = Series(series.columns, array('q', series.t), {name: array('d', v) for name, v in series.values.items()},
+                     refreshed_at=time.time())
+    updated.merge([(series.t[-1] + 3600, dict(open=1.0, high=1.0, low=1.0, close=1.0, volume=1.0))])
+    app.history_store.save('ETHUSDT', updated, '1h')
+
+    # Once the served range goes stale, its one background refresh reads the
+    # store, not another cache
+    for entry in app.history_bars.cache._entries.values():
+        entry.stored_at -= 61
+    assert client.get(url).get_json() == before
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        data = client.get(url).get_json()
+        if data != before:
+            break
+        time.sleep(0.02)
+    assert data['prices'][-1] == 1.0 and data['dates'][:-1] == before['dates'][1:]
+
+
+if __name__ == '__main__':
+    stub = start_stub()
+    try:
+        test_lttb()
+        test_retention()
+        test_unwritable_directory(stub)
+        test_intraday_routes(stub)
+        test_new_bars_reach_cached_ranges(stub)
+    finally:
+        stub.stop()
+    print("OK")
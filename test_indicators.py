@@ -0,0 +1,166 @@
+import math
+import random
+import tempfile
+from array import array
+
+import numpy as np
+
+import indicators
+from conftest import start_stub
+from history_store import HistoryStore, Series
+
+random.seed(7)
+PRICES = [100.0]
+for _ in range(400):
+    PRICES.append(PRICES[-1] * (1 + random.gauss(0, 0.02)))
+X = np.array(PRICES)
+
+
+def close(a, b):
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    return bool(np.allclose(a, b, rtol=1e-9, atol=1e-9, equal_nan=True))
+
+
+def loop_ema(x, period, alpha=None):
+    alpha = alpha or 2 / (period + 1)
+    out = [math.nan] * len(x)
+    out[period - 1] = sum(x[:period]) / period
+    for i in range(period, len(x)):
+        out[i] = (1 - alpha) * out[i - 1] + alpha * x[i]
+    return out
+
+
+def loop_rsi(x, period):
+    out = [math.nan] * len(x)
+    gains = [max(b - a, 0) for a, b in zip(x, x[1:])]
+    losses = [max(a - b, 0) for a, b in zip(x, x[1:])]
+    avg_gain, avg_loss = sum(gains[:period]) / period, sum(losses[:period]) / period
+    out[period] = 100 - 100 / (1 + avg_gain / avg_loss)
+    for i in range(period, len(gains)):
+        avg_gain = (avg_gain * (period - 1) + gains[i]) / period
+        avg_loss = (avg_loss * (period - 1) + losses[i]) / period
+        out[i + 1] = 100 - 100 / (1 + avg_gain / avg_loss)
+    return out
+
+
+def test_against_loops():
+    for period in (2, 5, 20):
+        assert close(indicators.sma(X, period),
+                     [math.nan] * (period - 1) + [sum(PRICES[i - period + 1:i + 1]) / period for i in range(period - 1, len(X))])
+        assert close(indicators.ema(X, period), loop_ema(PRICES, period))
+        assert close(indicators.rsi(X, period), loop_rsi(PRICES, period))
+    # Long enough for the blocked evaluation to cross several blocks
+    long = np.concatenate([X] * 20)
+    assert close(indicators.ema(long, 2), loop_ema(list(long), 2))
+
+    bands = indicators.bollinger(X, 20)
+    i = 50
+    window = PRICES[i - 19:i + 1]
+    mean = sum(window) / 20
+    std = math.sqrt(sum((p - mean) ** 2 for p in window) / 20)
+    assert close(bands['upper'][i], mean + 2 * std) and close(bands['lower'][i], mean - 2 * std)
+
+    logs = [math.log(b / a) for a, b in zip(PRICES, PRICES[1:])]
+    window = logs[i - 20:i]
+    mean = sum(window) / 20
+    vol = math.sqrt(sum((r - mean) ** 2 for r in window) / 19) * math.sqrt(365)
+    assert close(indicators.volatility(X, 20, 365)[i], vol)
+    assert math.isnan(indicators.volatility(X, 20)[19])
+    assert close(indicators.returns(X)[1:], [b / a - 1 for a, b in zip(PRICES, PRICES[1:])])
+
+
+def test_short_and_gappy_series():
+    assert np.isnan(indicators.sma(X[:3], 5)).all() and np.isnan(indicators.rsi(X[:5], 14)).all()
+    gappy = np.array([np.nan, 1.0, np.nan, np.nan, 4.0, np.nan])
+    assert close(indicators.fill_gaps(gappy), [np.nan, 1, 1, 1, 4, 4])
+    assert indicators.to_list(np.array([np.nan, 1.5]), 0) == [None, 1.5]
+    flat = np.ones(30)
+    assert np.isnan(indicators.rsi(flat, 14)[14:]).all()
+    assert (indicators.rsi(np.arange(30.0), 14)[14:] == 100).all()
+
+
+def test_parse():
+    assert indicators.parse('rsi, sma:5,sma:5,returns') == (('returns', None), ('rsi', 14), ('sma', 5))
+    assert indicators.parse(None) == indicators.parse(indicators.DEFAULT_SET)
+    for bad in ('macd', 'sma:1', 'sma:x', 'ema:5000'):
+        try:
+            indicators.parse(bad)
+            assert False, bad
+        except ValueError:
+            pass
+
+
+def test_close_only_series_upgraded():
+    # Files written when only closes were stored get a full download once
+    store = HistoryStore(tempfile.mkdtemp())
+    old = Series(['close'], array('q', [0, 86400]), {'close': array('d', [1.0, 2.0])}, refreshed_at=1e12)
+    store.save('X', old)
+    asked = []
+
+    def provider(since):
+        asked.append(since)
+        return [(86400, {'open': 1.5, 'high': 2.5, 'low': 1.0, 'close': 2.0, 'volume': 10.0})]
+
+    series = store.refresh('X', provider)
+    assert asked == [None] and series.columns == ['open', 'high', 'low', 'close', 'volume']
+    assert list(series.values['close']) == [1.0, 2.0] and math.isnan(series.values['open'][0])
+    assert series.values['open'][1] == 1.5
+    assert store.refresh('X', provider) is series and asked == [None]
+
+
+def test_routes(stub):
+    import app
+    client = app.app.test_client()
+    history = client.get('/api/history/BTCUSDT').get_json()
+    assert len(history['dates']) == 30
+    for key in ('open', 'high', 'low', 'prices', 'volume'):
+        assert len(history[key]) == 30 and all(v is not None for v in history[key])
+    assert all(l <= min(o, c) and h >= max(o, c)
+               for o, h, l, c in zip(history['open'], history['high'], history['low'], history['prices']))
+
+    sina = client.get('/api/history/gb_crcl').get_json()
+    assert all(v is not None for v in sina['volume'])
+
+    r = client.get('/api/analytics/BTCUSDT?indicators=sma:20,bb:20,rsi')
+    assert r.status_code == 200
+    data = r.get_json()
+    assert data['dates'] == history['dates'] and data['close'] == history['prices']
+    # The windows reach back before the range, so every value is filled
+    assert all(v is not None for v in data['indicators']['sma:20'])
+    assert set(data['indicators']['bb:20']) == {'mid', 'upper', 'lower'}
+    assert set(data['indicators']) == {'sma:20', 'bb:20', 'rsi:14'}
+
+    stats = app.analytics_cache.stats()
+    client.get('/api/analytics/BTCUSDT?indicators=rsi,bb:20,sma:20')
+    assert app.analytics_cache.stats()['hits'] == stats['hits'] + 1
+
+    # A new bar misses; the previous entry is not used for it
+    series = app.history_store.load('BTCUSDT')
+    last = series.t[-1]
+    series.merge([(last + 86400, dict(open=1.0, high=1.0, low=1.0, close=1.0, volume=1.0))])
+    before = app.analytics_cache.stats()['misses']
+    data = client.get('/api/analytics/BTCUSDT?indicators=sma:20,bb:20,rsi').get_json()
+    assert app.analytics_cache.stats()['misses'] == before + 1 and data['close'][-1] == 1.0
+
+    # A last bar without a close is cached like any other
+    series.merge([(last + 2 * 86400, dict(open=1.0, high=1.0, low=1.0, close=float('nan'), volume=1.0))])
+    client.get('/api/analytics/BTCUSDT?indicators=rsi')
+    hits = app.analytics_cache.stats()['hits']
+    data = client.get('/api/analytics/BTCUSDT?indicators=rsi').get_json()
+    assert app.analytics_cache.stats()['hits'] == hits + 1 and data['close'][-1] is None
+
+    assert client.get('/api/analytics/BTCUSDT?indicators=macd').status_code == 400
+    assert client.get('/api/analytics/nope').get_json()['error']
+
+
+if __name__ == '__main__':
+    stub = start_stub()
+    try:
+        test_against_loops()
+        test_short_and_gappy_series()
+        test_parse()
+        test_close_only_series_upgraded()
+        test_routes(stub)
+    finally:
+        stub.stop()
+    print("OK")
@@ -0,0 +1,72 @@
+from liquidations import SIMULATION, LiquidationStore, RollingWindow, parse_force_order
+
+
+def event(symbol, side, usd, t_ms):
+    return {'symbol': symbol, 'side': side, 'price': 1.0, 'qty': usd, 'amount_usd': usd, 'time': t_ms}
+
+
+def test_rolling_window():
+    w = RollingWindow(60, 60)
+    w.add(1000, 5.0)
+    w.add(1030, 7.0)
+    assert w.totals(1030) == (12.0, 2)
+    assert w.totals(1060) == (7.0, 1)       # the first bucket dropped out
+    w.add(1000, 100.0)                       # older than the window: ignored
+    assert w.totals(1060) == (7.0, 1)
+    assert w.totals(5000) == (0.0, 0)
+
+
+def test_store_summary_and_ring():
+    store = LiquidationStore(ring_size=3)
+    now = 1_700_000_000
+    store.add(event('BTC', 'Long', 1000, (now - 30) * 1000))
+    store.add(event('BTC', 'Short', 500, (now - 120) * 1000))
+    store.add(event('ETH', 'Long', 200, (now - 7200) * 1000))
+    summary = store.summary(now)
+    btc = summary['symbols']['BTC']
+    assert btc['1m'] == {'long_usd': 1000, 'long_count': 1, 'short_usd': 0, 'short_count': 0}
+    assert btc['5m']['short_usd'] == 500
+    assert summary['total']['1h']['long_usd'] == 1000
+    assert summary['total']['24h']['long_usd'] == 1200
+
+    for i in range(5):
+        store.add(event('BTC', 'Long', 1, (now + i) * 1000))
+    assert len(store.symbols['BTC'].events) == 3
+    assert [e['time'] for e in store.recent(2)] == [(now + 4) * 1000, (now + 3) * 1000]
+
+    # Polled batches only add what is newer than the stored events
+    assert store.add_new([event('BTC', 'Long', 1, (now + 4) * 1000), event('BTC', 'Long', 1, (now + 9) * 1000)], 'rest') == 1
+
+
+def test_simulated_events_not_counted():
+    store = LiquidationStore()
+    now = 1_700_000_000
+    store.add(event('BTC', 'Long', 1000, (now - 10) * 1000), 'rest')
+    assert store.add_new([event('BTC', 'Short', 5000, (now - 5) * 1000), event('ETH', 'Long', 70, (now - 5) * 1000)],
+                         SIMULATION) == 2
+    # Listed...
+    assert len(store.recent()) == 3
+    # ... but the totals are the real events only, and say where those came from
+    summary = store.summary(now)
+    assert summary['source'] == 'rest'
+    assert summary['total']['1m'] == {'long_usd': 1000, 'long_count': 1, 'short_usd': 0, 'short_count': 0}
+    assert summary['symbols']['ETH']['24h']['long_count'] == 0
+
+    # Once fapi answers again, real events older than the made-up ones count
+    assert store.add_new([event('BTC', 'Short', 300, (now - 8) * 1000)], 'rest') == 1
+    assert store.summary(now)['symbols']['BTC']['1m']['short_usd'] == 300
+
+
+def test_parse_force_order():
+    row = parse_force_order({'e': 'forceOrder', 'E': 1, 'o': {
+        's': 'BTCUSDT', 'S': 'SELL', 'q': '0.014', 'p': '9910', 'ap': '9910', 'z': '0.014', 'T': 1568014460893}})
+    assert row['symbol'] == 'BTC' and row['side'] == 'Long'
+    assert abs(row['amount_usd'] - 138.74) < 1e-9
+
+
+if __name__ == "__main__":
+    test_rolling_window()
+    test_store_summary_and_ring()
+    test_simulated_events_not_counted()
+    test_parse_force_order()
+    print("OK")
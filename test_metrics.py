@@ -0,0 +1,25 @@
+from metrics import Counter, Histogram
+
+
+def test_counter_and_histogram_text():
+    c = Counter('demo_errors_total', 'Errors', ['host'])
+    c.inc('a "quoted" host')
+    c.inc('a "quoted" host', amount=2)
+    assert c.render()[2] == 'demo_errors_total{host="a \\"quoted\\" host"} 3'
+
+    h = Histogram('demo_seconds', 'Durations', ['source'], buckets=(0.1, 1))
+    h.observe(0.05, 'sina')
+    h.observe(0.5, 'sina')
+    h.observe(5, 'sina')
+    assert h.render()[2:] == [
+        'demo_seconds_bucket{source="sina",le="0.1"} 1',
+        'demo_seconds_bucket{source="sina",le="1"} 2',
+        'demo_seconds_bucket{source="sina",le="+Inf"} 3',
+        'demo_seconds_sum{source="sina"} 5.55',
+        'demo_seconds_count{source="sina"} 3',
+    ]
+
+
+if __name__ == "__main__":
+    test_counter_and_histogram_text()
+    print("OK")
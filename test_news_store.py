@@ -0,0 +1,55 @@
+import news
+from news import NewsStore
+
+
+def flash(item_id, content, time_str='2026-01-08 18:25:30'):
+    return {'id': item_id, 'time': time_str, 'data': {'content': content}}
+
+
+def test_ingest_only_new():
+    store = NewsStore(capacity=3)
+    assert store.ingest([flash('20260108182530000002', 'b'), flash('20260108182530000001', 'a')]) == 2
+    assert store.cursor == '20260108182530000002'
+    assert [i['title'] for i in store.latest()] == ['b', 'a']
+
+    parsed = []
+    original = news.parse_item
+    news.parse_item = lambda raw: parsed.append(raw['id']) or original(raw)
+    try:
+        # the next poll repeats what we have; only the new item is parsed
+        added = store.ingest([flash('20260108182530000003', 'c'), flash('20260108182530000002', 'b'),
+                              flash('20260108182530000001', 'a')])
+    finally:
+        news.parse_item = original
+    assert added == 1 and parsed == ['20260108182530000003']
+
+    store.ingest([flash('20260108182530000004', 'd'), flash('20260108182530000004', 'd')])
+    assert [i['title'] for i in store.latest()] == ['d', 'c', 'b']    # capacity 3, no duplicate
+
+
+def test_since():
+    store = NewsStore()
+    store.ingest([flash(str(i), str(i)) for i in range(10, 0, -1)])
+    items = store.latest()
+    assert [i['id'] for i in news.since(items, '7')] == ['10', '9', '8']
+    assert news.since(items, '10') == []
+    assert [i['id'] for i in news.since(items, '7', limit=2)] == ['10', '9']
+    # a cursor from a worker that is ahead of this one stays put
+    assert news.next_cursor(items, '12') == '12'
+    assert news.next_cursor(items, '5') == '10'
+    assert news.next_cursor([]) is None
+
+
+def test_parse_item():
+    item = news.parse_item(flash(42, '<b>Fed</b> holds<br/>rates', '2026-01-08 18:25:30'))
+    assert item['id'] == '42'
+    assert item['title'] == 'Fed holds rates'
+    assert item['time'] == '01-08 18:25'
+    assert item['url'] == 'https://www.jin10.com'
+
+
+if __name__ == "__main__":
+    test_ingest_only_new()
+    test_since()
+    test_parse_item()
+    print("OK")
@@ -0,0 +1,52 @@
+import os
+import tempfile
+
+import requests
+
+import recorder
+
+
+class FakeResponse:
+    def __init__(self, url, status_code, content, headers):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+
+
+def test_record_and_replay():
+    path = os.path.join(tempfile.mkdtemp(), 'upstream.jsonl.gz')
+    tape = recorder.Recorder(path)
+    url = "https://flash-api.jin10.com/get_flash_list"
+    for n in (1, 2):
+        tape.record(url, {'channel': 1, 't': 1000 + n}, 0.01,
+                    response=FakeResponse(url, 200, f'{{"n": {n}}}'.encode(), {'Content-Type': 'application/json'}))
+    gb = '贵州茅台'.encode('gb18030')
+    tape.record("https://hq.sinajs.cn/list=sh600519", None, 0.02,
+                response=FakeResponse("https://hq.sinajs.cn/list=sh600519", 200, gb, {}))
+    tape.record("https://fapi.binance.com/fapi/v1/time", None, 1.0, error=requests.ConnectTimeout("timed out"))
+    tape.close()
+
+    player = recorder.Player(path, speed=0)
+    # The cache-busting `t` parameter is not part of the key; records of a
+    # key come back in order and then start over
+    assert player.get(url, {'channel': 1, 't': 5}).json() == {'n': 1}
+    assert player.get(url, {'t': 6, 'channel': '1'}).json() == {'n': 2}
+    assert player.get(url, {'channel': 1}).json() == {'n': 1}
+    r = player.get("https://hq.sinajs.cn/list=sh600519")
+    assert r.content == gb and r.raw.read() == gb
+    try:
+        player.get("https://fapi.binance.com/fapi/v1/time")
+        assert False
+    except requests.Timeout:
+        pass
+    try:
+        player.get("https://example.com/unknown")
+        assert False
+    except requests.ConnectionError:
+        assert player.misses == 1
+
+
+if __name__ == "__main__":
+    test_record_and_replay()
+    print("OK")
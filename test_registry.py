@@ -0,0 +1,69 @@
+from conftest import start_stub
+
+from registry import Registry, Symbol, batches
+
+
+def test_batches():
+    codes = [f"c{i}" for i in range(7)]
+    assert list(batches(codes, 3)) == [['c0', 'c1', 'c2'], ['c3', 'c4', 'c5'], ['c6']]
+    assert list(batches([], 3)) == []
+    # 'c0,c1' is 5 characters, 'c0,c1,c2' 8
+    assert list(batches(codes, 10, max_chars=5)) == [['c0', 'c1'], ['c2', 'c3'], ['c4', 'c5'], ['c6']]
+    # A code longer than max_chars still goes out, on its own
+    assert list(batches(['a', 'toolong', 'b'], 10, max_chars=3)) == [['a'], ['toolong'], ['b']]
+
+
+def test_registry():
+    registry = Registry([
+        Symbol('A', 'a', 'sina', 'hk', '', None, None, False, ()),
+        Symbol('B', 'b', 'binance', 'crypto', '', 'binance', None, False, ()),
+        Symbol('C', 'c', 'binance', 'crypto', '', None, None, True, ('D',)),
+    ])
+    assert registry.codes('binance') == ['B', 'C'] and registry.codes('nope') == []
+    assert registry.aliases('binance') == {'C': ('D',)}
+    assert registry.markets == {'hk', 'crypto'}
+    assert [s.code for s in registry.visible] == ['A', 'B']
+
+
+def test_prices_route(stub):
+    import app
+    client = app.app.test_client()
+    r = client.get('/api/prices')
+    rows = r.get_json()
+    assert r.status_code == 200 and int(r.headers['X-Total-Count']) == len(rows) == len(app.symbols.visible)
+    assert [row['code'] for row in rows] == [s.code for s in app.symbols.visible]
+
+    # Pages follow each other
+    pages = [client.get(f"/api/prices?page={page}&page_size=4").get_json() for page in (1, 2, 3)]
+    assert [len(p) for p in pages] == [4, 4, len(rows) - 8]
+    assert sum(pages, []) == rows
+    assert client.get('/api/prices?page=99&page_size=4').get_json() == []
+
+    # Filters
+    r = client.get('/api/prices?source=binance')
+    assert [row['code'] for row in r.get_json()] == ['BTCUSDT', 'ETHUSDT'] and r.headers['X-Total-Count'] == '2'
+    assert {row['code'] for row in client.get('/api/prices?market=hk').get_json()} == {'hk03690', 'hk01024'}
+    assert client.get('/api/prices?source=sina&market=crypto').get_json() == []
+    assert [row['code'] for row in client.get('/api/prices?codes=gb_crcl,nope').get_json()] == ['gb_crcl']
+    assert [row['code'] for row in client.get('/api/prices?q=ETH').get_json()] == ['ETHUSDT']
+
+    for bad in ('page=x', 'page_size=', 'source=nope', 'market=nope'):
+        r = client.get(f"/api/prices?{bad}")
+        assert r.status_code == 400 and r.get_json()['error'], bad
+
+    # Whatever clients ask for, the pages cached per snapshot stay bounded
+    before = len(app.collector._views)
+    for i in range(300):
+        client.get(f"/api/prices?page={1000 + i}&page_size={20 + i}&source=binance")
+    assert len(app.collector._views) - before <= 2
+
+
+if __name__ == '__main__':
+    stub = start_stub()
+    try:
+        test_batches()
+        test_registry()
+        test_prices_route(stub)
+    finally:
+        stub.stop()
+    print("OK")
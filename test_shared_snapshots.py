@@ -0,0 +1,79 @@
+import shutil
+import tempfile
+import threading
+import time
+
+from collector import Collector
+from shared_snapshots import SharedSnapshots
+
+
+def worker(directory, calls, value, delay=0.0):
+    # One gunicorn worker's collector, refreshing on read
+    def fetch():
+        calls.append(value)
+        time.sleep(delay)
+        return {'value': value}
+    c = Collector(background=False, shared=SharedSnapshots(directory))
+    c.register('x', fetch, interval=60, deadline=2)
+    return c
+
+
+def test_one_fetch_for_all_workers():
+    directory = tempfile.mkdtemp()
+    try:
+        calls = []
+        workers = [worker(directory, calls, i, delay=0.1) for i in range(4)]
+        results = {}
+        threads = [threading.Thread(target=lambda i=i, c=c: results.__setitem__(i, c.get('x')))
+                   for i, c in enumerate(workers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # whoever got the lock first fetched; the others read its snapshot
+        assert len(calls) == 1
+        assert all(r == {'value': calls[0]} for r in results.values())
+
+        # later publishes reach the followers when they load the files
+        workers[0].publish('x', {'value': 'new'}, status='stale', updated_at=123)
+        workers[1]._load_shared(['x'])
+        s = workers[1]._snapshots['x']
+        assert s.data == {'value': 'new'} and s.status == 'stale' and s.updated_at == 123
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_old_files_are_not_served():
+    directory = tempfile.mkdtemp()
+    try:
+        calls = []
+        first = worker(directory, calls, 'old')
+        first.get('x')
+        # the file left by an earlier run is older than the interval
+        second = worker(directory, calls, 'new')
+        second._sources['x'].interval = 0.01
+        time.sleep(0.02)
+        assert second.get('x') == {'value': 'new'}
+        assert calls == ['old', 'new']
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_leader_takeover():
+    directory = tempfile.mkdtemp()
+    try:
+        a, b = SharedSnapshots(directory), SharedSnapshots(directory)
+        assert a.try_lead() and a.is_leader
+        assert not b.try_lead()
+        a._leader_file.close()          # the leader's process exits
+        a._leader_file = None
+        assert b.try_lead()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    test_one_fetch_for_all_workers()
+    test_old_files_are_not_served()
+    test_leader_takeover()
+    print("OK")
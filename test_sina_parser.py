@@ -0,0 +1,35 @@
+import sina_parser
+
+SAMPLE = (
+    'var hq_str_sh600519="贵州茅台,1420.00,1418.50,1431.20,1435.00,1415.10,1431.10,1431.20,2918393";\n'
+    'var hq_str_hk03690="MEITUAN-W,美团-W,98.900,99.350,100.200,97.800,99.150,-0.200,-0.201";\n'
+    'var hq_str_gb_crcl="Circle,83.23,-1.50,2026-01-08 09:30:00,-1.27,84.00,85.10,82.90,0,0,123456,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,84.50,0";\n'
+    'var hq_str_hf_GC="4454.9,,4456.3,4456.6,4470.0,4440.2,22:52:54,,4450.0,0,0,0,2026-01-08,纽约黄金";\n'
+    'var hq_str_fx_susdcny="22:52:54,6.9932,6.9950,6.9900,0";\n'
+    'var hq_str_sh000000="";\n'
+)
+
+
+def test_parse_markets():
+    quotes = sina_parser.parse(SAMPLE.encode('gb18030'))
+    assert set(quotes) == {'sh600519', 'hk03690', 'gb_crcl', 'hf_GC', 'fx_susdcny'}
+    assert (quotes['sh600519'].price, quotes['sh600519'].prev_close) == (1431.20, 1418.50)
+    assert quotes['sh600519'].name == '贵州茅台'
+    assert (quotes['hk03690'].price, quotes['hk03690'].prev_close) == (99.15, 99.35)
+    assert (quotes['gb_crcl'].price, quotes['gb_crcl'].prev_close) == (83.23, 84.50)
+    # Empty prev_close on futures falls back to the price
+    assert (quotes['hf_GC'].price, quotes['hf_GC'].prev_close) == (4454.9, 4454.9)
+    assert (quotes['fx_susdcny'].price, quotes['fx_susdcny'].prev_close) == (6.9932, 6.9900)
+    assert quotes['hf_GC'].market == 'futures'
+
+
+def test_short_lines_skipped():
+    # A US line without the prev_close field is not a usable quote
+    quotes = sina_parser.parse('var hq_str_gb_crcl="Circle,83.23,-1.50";\n')
+    assert quotes == {}
+
+
+if __name__ == "__main__":
+    test_parse_markets()
+    test_short_lines_skipped()
+    print("OK")
@@ -0,0 +1,108 @@
+import io
+import json
+
+import stablecoins
+from stablecoins import StablecoinFeed, iter_assets, summarize
+
+DOCUMENT = {
+    'peggedAssets': [
+        {'name': 'Tether', 'symbol': 'USDT', 'price': 1.001, 'chains': ['Ethereum', 'Tron'],
+         'circulating': {'peggedUSD': 110.0}, 'circulatingPrevDay': {'peggedUSD': 100.0},
+         'chainCirculating': {'Ethereum': {'current': {'peggedUSD': 60.0}}}},
+        {'name': 'USD Coin', 'symbol': 'USDC', 'circulating': {'peggedUSD': 50.0},
+         'circulatingPrevDay': {'peggedUSD': 50.0}},
+        {'name': 'Dai', 'symbol': 'DAI', 'circulating': {'peggedUSD': 40.0}},
+        {'name': 'New', 'symbol': 'NEW', 'circulating': None, 'circulatingPrevDay': None},
+    ],
+    'chains': [{'name': 'Ethereum'}],
+}
+BODY = json.dumps(DOCUMENT).encode()
+
+
+def test_iter_assets():
+    assets = list(iter_assets(io.BytesIO(BODY)))
+    assert assets[0] == {'symbol': 'USDT', 'name': 'Tether', 'circulating': 110.0, 'prev_day': 100.0, 'price': 1.001}
+    assert [a['symbol'] for a in assets] == ['USDT', 'USDC', 'DAI', 'NEW']
+    assert 'price' not in assets[1] and assets[2]['prev_day'] == 0 and assets[3]['circulating'] == 0
+    # Numbers come out as floats, not Decimals
+    assert all(type(a['circulating']) is float for a in assets[:3])
+
+    # Same records without ijson
+    saved = stablecoins.ijson
+    stablecoins.ijson = None
+    try:
+        assert list(iter_assets(io.BytesIO(BODY))) == assets
+    finally:
+        stablecoins.ijson = saved
+
+
+def test_summarize():
+    summary = summarize(iter_assets(io.BytesIO(BODY)))
+    usdt, usdc = summary['coins']
+    assert usdt['symbol'] == 'USDT' and usdt['price'] == 1.001 and usdc['price'] == 1.0
+    assert usdt['change_24h'] == 10.0 and abs(usdt['change_24h_pct'] - 10.0) < 1e-9
+    assert usdc['change_24h_pct'] == 0
+    assert summary['market_share'] == {'USDT': 110.0, 'USDC': 50.0, 'Others': 40.0}
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b'', headers=None):
+        self.status_code = status_code
+        self.raw = io.BytesIO(body)
+        self.headers = headers or {}
+        self.closed = False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+    def close(self):
+        self.closed = True
+
+
+def test_conditional_refresh():
+    sent = []
+    responses = [
+        FakeResponse(200, BODY, {'ETag': '"v1"', 'Last-Modified': 'Mon, 01 Jun 2026 00:00:00 GMT'}),
+        FakeResponse(304),
+        FakeResponse(500),
+        FakeResponse(200, BODY.replace(b'110.0', b'120.0'), {'ETag': '"v2"'}),
+    ]
+
+    def get(url, headers=None, **kwargs):
+        sent.append(headers)
+        return responses[len(sent) - 1]
+
+    original = stablecoins.upstream.get
+    stablecoins.upstream.get = get
+    try:
+        feed = StablecoinFeed()
+        first = feed.fetch()
+        assert sent[0] == {} and first['market_share']['USDT'] == 110.0
+
+        # Unchanged: the validators go back and the previous summary is reused
+        assert feed.fetch() is first
+        assert sent[1] == {'If-None-Match': '"v1"', 'If-Modified-Since': 'Mon, 01 Jun 2026 00:00:00 GMT'}
+        assert feed.not_modified == 1
+
+        # An error leaves the validators and the summary as they were
+        try:
+            feed.fetch()
+            assert False
+        except RuntimeError:
+            pass
+        assert feed.etag == '"v1"' and feed.result is first
+
+        changed = feed.fetch()
+        assert changed['market_share']['USDT'] == 120.0
+        assert feed.etag == '"v2"' and feed.last_modified is None
+        assert all(r.closed for r in responses)
+    finally:
+        stablecoins.upstream.get = original
+
+
+if __name__ == '__main__':
+    test_iter_assets()
+    test_summarize()
+    test_conditional_refresh()
+    print("OK")
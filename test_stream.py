@@ -0,0 +1,65 @@
+from conftest import start_stub
+
+from stream import StreamClient, StreamSlots
+
+
+def test_stream_slots(stub):
+    import app
+    app.stream_slots = StreamSlots(2)
+    client = app.app.test_client()
+    streams = [client.get('/api/stream', buffered=False) for _ in range(2)]
+    assert [r.status_code for r in streams] == [200, 200]
+    assert streams[0].mimetype == 'text/event-stream'
+
+    # Past the cap: 503, so the page polls instead of holding a thread
+    r = client.get('/api/stream')
+    assert r.status_code == 503 and r.headers['Retry-After'] and r.get_json()['error']
+    # Other routes still answer
+    assert client.get('/api/prices').status_code == 200
+
+    # A closed stream frees its slot, whether or not anything was sent
+    next(streams[1].response)
+    for r in reversed(streams):
+        r.close()
+    assert app.stream_slots.open == 0
+    r = client.get('/api/stream', buffered=False)
+    assert r.status_code == 200
+    r.close()
+
+
+def book(bids, asks):
+    return {side: {'price': [p for p, _ in levels], 'amount': [a for _, a in levels]}
+            for side, levels in (('bids', bids), ('asks', asks))}
+
+
+def test_depth_deltas(stub):
+    import app
+    first, second = StreamClient(), StreamClient()
+    app.collector.publish('depth', book([(100.0, 1.0), (99.0, 2.0)], [(101.0, 1.5), (102.0, 3.0)]))
+    message = app.stream_message(first, 'depth', [app.collector.get('depth')])
+    # The first message carries the whole book
+    assert message['reset'] and message['bids'] == [[100.0, 1.0], [99.0, 2.0]] and len(message['asks']) == 2
+    app.stream_message(second, 'depth', [app.collector.get('depth')])
+
+    # Then only the levels that changed, removed ones with amount 0
+    app.collector.publish('depth', book([(100.0, 1.0), (99.0, 2.5)], [(102.0, 3.0), (103.0, 1.0)]))
+    message = app.stream_message(first, 'depth', [app.collector.get('depth')])
+    assert not message['reset']
+    assert message['bids'] == [[99.0, 2.5]]
+    assert sorted(message['asks']) == [[101.0, 0], [103.0, 1.0]]
+    # Clients at the same version share one delta
+    assert app.stream_message(second, 'depth', [app.collector.get('depth')]) is message
+
+    # Nothing changed in the aggregated view: nothing to send
+    app.collector.publish('depth', book([(100.0, 1.0), (99.0, 2.5)], [(102.0, 3.0), (103.0, 1.0)]))
+    assert app.stream_message(first, 'depth', [app.collector.get('depth')]) is None
+
+
+if __name__ == '__main__':
+    stub = start_stub()
+    try:
+        test_stream_slots(stub)
+        test_depth_deltas(stub)
+    finally:
+        stub.stop()
+    print("OK")
@@ -0,0 +1,184 @@
+import os
+import random
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+import recorder
+from breaker import Breakers, CircuitOpen
+
+# Every upstream call goes through one shared Session: its adapter keeps a pool
+# of keep-alive connections per host, so polling the same handful of hosts
+# reuses TCP/TLS connections instead of handshaking on every request.
+session = requests.Session()
+session.headers.update({
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+})
+_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+session.mount('http://', _adapter)
+session.mount('https://', _adapter)
+
+# (connect, read) timeouts in seconds per host
+HOST_TIMEOUTS = {
+    'hq.sinajs.cn': (2, 5),
+    'api.binance.com': (2, 5),
+    'fapi.binance.com': (1, 2),
+    'www.okx.com': (2, 5),
+    'flash-api.jin10.com': (2, 5),
+    'stablecoins.llama.fi': (2, 10),
+    'money.finance.sina.com.cn': (2, 10),
+    'stock.finance.sina.com.cn': (2, 10),
+    'stock2.finance.sina.com.cn': (2, 10),
+    'vip.stock.finance.sina.com.cn': (2, 10),
+}
+DEFAULT_TIMEOUT = (3, 10)
+
+# Extra attempts after the first one; connection errors, timeouts and the
+# statuses below are retried.
+HOST_RETRIES = {
+    'fapi.binance.com': 0,
+}
+DEFAULT_RETRIES = 1
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Consecutive failed calls (connection errors, timeouts, the statuses above)
+# after which a host's circuit opens, and for how long calls to it then fail
+# fast with breaker.CircuitOpen before one trial call is let through.
+HOST_FAILURE_THRESHOLDS = {
+    'fapi.binance.com': 2,
+}
+HOST_COOLDOWNS = {
+    'fapi.binance.com': 60,
+}
+breakers = Breakers(HOST_FAILURE_THRESHOLDS, HOST_COOLDOWNS, threshold=3, cooldown=30)
+
+request_seconds = metrics.histogram('upstream_request_seconds', 'Duration of upstream HTTP calls', ['host'])
+request_errors = metrics.counter('upstream_errors_total', 'Failed upstream calls by kind: connection, timeout, status (>= 400), empty, circuit_open', ['host', 'kind'])
+response_bytes = metrics.counter('upstream_response_bytes_total', 'Upstream response body bytes', ['host'])
+
+# UPSTREAM_MODE=record|replay (recorder.py): None for live calls
+tape = recorder.from_env()
+
+# Send every call to this base URL instead, with the original host in the
+# X-Upstream-Host header (load tests against stub_upstream_server.py)
+UPSTREAM_OVERRIDE = os.environ.get('UPSTREAM_OVERRIDE')
+
+
+def _override(url, headers):
+    parts = urlsplit(url)
+    base = urlsplit(UPSTREAM_OVERRIDE)
+    headers = dict(headers or {}, **{'X-Upstream-Host': parts.hostname})
+    return urlunsplit((base.scheme, base.netloc, parts.path, parts.query, '')), headers
+
+
+def get(url, params=None, headers=None, timeout=None, retries=None, **kwargs):
+    if isinstance(tape, recorder.Player):
+        return tape.get(url, params)
+    host = urlsplit(url).hostname
+    if timeout is None:
+        timeout = HOST_TIMEOUTS.get(host, DEFAULT_TIMEOUT)
+    if retries is None:
+        retries = HOST_RETRIES.get(host, DEFAULT_RETRIES)
+
+    request_url = url
+    if UPSTREAM_OVERRIDE:
+        request_url, headers = _override(url, headers)
+
+    breaker = breakers.get(host)
+    for attempt in range(retries + 1):
+        last = attempt == retries
+        # Raises CircuitOpen while the host is known to be down
+        try:
+            breaker.before()
+        except CircuitOpen:
+            request_errors.inc(host, 'circuit_open')
+            raise
+        started = time.monotonic()
+        try:
+            r = session.get(request_url, params=params, headers=headers, timeout=timeout, **kwargs)
+            if tape is not None:
+                r = tape.record(url, params, time.monotonic() - started, response=r)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            elapsed = time.monotonic() - started
+            if tape is not None:
+                tape.record(url, params, elapsed, error=e)
+            request_seconds.observe(elapsed, host)
+            request_errors.inc(host, 'timeout' if isinstance(e, requests.Timeout) else 'connection')
+            breaker.failure()
+            if last:
+                raise
+        except Exception:
+            # Not the host's fault (bad URL, ...)
+            breaker.release()
+            raise
+        else:
+            request_seconds.observe(time.monotonic() - started, host)
+            # Streamed bodies are not read here; count what the server declared
+            size = r.headers.get('Content-Length') if kwargs.get('stream') else len(r.content)
+            if size:
+                response_bytes.inc(host, amount=int(size))
+            if r.status_code >= 400:
+                request_errors.inc(host, 'status')
+            if r.status_code not in RETRY_STATUSES:
+                breaker.success()
+                return r
+            breaker.failure()
+            if last:
+                return r
+        backoff(attempt)
+
+
+def guarded(host, fn, accept=None):
+    """Call `fn` (an upstream call made outside `get`, e.g. through a client
+    library) under `host`'s circuit breaker. An exception or a value `accept`
+    rejects counts as a failure."""
+    if isinstance(tape, recorder.Player):
+        # Such calls are not in the archive; replays stay offline
+        raise requests.ConnectionError(f"{host} calls are not recorded")
+    breaker = breakers.get(host)
+    try:
+        breaker.before()
+    except CircuitOpen:
+        request_errors.inc(host, 'circuit_open')
+        raise
+    started = time.monotonic()
+    try:
+        value = fn()
+    except Exception:
+        request_errors.inc(host, 'connection')
+        breaker.failure()
+        raise
+    finally:
+        request_seconds.observe(time.monotonic() - started, host)
+    if accept is None or accept(value):
+        breaker.success()
+    else:
+        request_errors.inc(host, 'empty')
+        breaker.failure()
+    return value
+
+
+def retry_call(fn, attempts=3, accept=None, base=0.5):
+    """Call `fn` until it returns a value `accept` likes, sleeping with jittered
+    backoff in between. Returns the last value (or raises the last error)."""
+    for attempt in range(attempts):
+        last = attempt == attempts - 1
+        try:
+            value = fn()
+        except Exception:
+            if last:
+                raise
+        else:
+            if accept is None or accept(value) or last:
+                return value
+        backoff(attempt, base=base)
+
+
+def backoff(attempt, base=0.2, cap=2.0):
+    # "Full jitter": spreads retries from many callers instead of having them
+    # hit a recovering host in lockstep
+    time.sleep(random.uniform(0, min(cap, base * 2 ** attempt)))